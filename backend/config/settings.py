@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -63,6 +64,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "django.contrib.sites", 
     'allauth',
     'allauth.account',
@@ -132,6 +134,10 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Параллельный писатель ждет блокировку, а не падает сразу с "database is locked"
+            'OPTIONS': {'timeout': 20},
+            # Тестовая база в файле, а не в памяти: потоки тестов на гонки видят одну базу
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
@@ -153,6 +159,54 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# === FORUM ===
+# Кеш трендовой ленты: сколько первых страниц держать и через сколько секунд пересобирать
+FORUM_TRENDING_CACHE_PAGES = 5
+FORUM_TRENDING_CACHE_TTL = 15 * 60
+# Сколько постов из очереди пересчета trending score забирать за одну пачку и сколько пачек за один запуск
+FORUM_TRENDING_FLUSH_BATCH = 500
+FORUM_TRENDING_FLUSH_MAX_BATCHES = 20
+# Окно схлопывания событий пересчета trending score, секунды
+FORUM_TRENDING_FLUSH_INTERVAL = 5.0
+# Счетчик просмотров с отложенной записью: как часто переносить просмотры из Redis в БД, секунды
+FORUM_VIEWS_FLUSH_INTERVAL = 30.0
+# Допустимые потери: сколько просмотров может копиться в Redis до досрочного сброса
+FORUM_VIEWS_MAX_PENDING = 5000
+# Повторный просмотр тем же пользователем/IP в течение окна не засчитывается
+FORUM_VIEWS_DEDUP = True
+FORUM_VIEWS_DEDUP_TTL = 24 * 60 * 60
+# Максимальная глубина ответов, которую отдает /posts/{id}/comment-tree/
+FORUM_COMMENT_TREE_MAX_DEPTH = 10
+# Очередь уведомлений: как часто, какими пачками и сколько пачек за запуск переносить события из Redis в БД
+FORUM_NOTIFICATIONS_FLUSH_INTERVAL = 2.0
+FORUM_NOTIFICATIONS_FLUSH_BATCH = 1000
+FORUM_NOTIFICATIONS_FLUSH_MAX_BATCHES = 20
+# Через сколько секунд счетчик непрочитанных в кеше сверяется с БД
+FORUM_UNREAD_COUNTER_TTL = 10 * 60
+# Срок хранения уведомлений: прочитанные старше N дней уходят в NotificationArchive
+FORUM_NOTIFICATIONS_RETENTION_DAYS = 90
+FORUM_NOTIFICATIONS_ARCHIVE = True
+FORUM_NOTIFICATIONS_PURGE_BATCH = 1000
+FORUM_NOTIFICATIONS_PURGE_MAX_BATCHES = 500
+# Postgres: на сколько месяцев вперед держать партиции архива
+FORUM_NOTIFICATIONS_PARTITIONS_AHEAD = 3
+# Живой канал /api/forum/live/ (SSE): интервал пинга и сколько постов можно слушать
+FORUM_LIVE_HEARTBEAT = 25.0
+FORUM_LIVE_MAX_POSTS = 50
+
+# Git-репозитории на диске (core.services.git_backend): корень для Repositories.fs_path,
+# сколько постоянных git cat-file держать на процесс и воркеров для параллельного чтения
+GIT_DATA_ROOT = os.environ.get('GIT_DATA_ROOT', '/git-data')
+GIT_BACKEND_POOL_SIZE = 32
+GIT_BACKEND_WORKERS = None
+# Загрузка истории в commits (core.services.commit_ingest): коммитов в пачке, TTL блокировки
+# репозитория (продлевается после каждой пачки) и через сколько секунд повторить задачу, если блокировка занята
+COMMIT_INGEST_BATCH = 1000
+COMMIT_INGEST_LOCK_TIMEOUT = 300
+COMMIT_INGEST_BUSY_RETRY_DELAY = 60
+# Страницы /api/repos/public/ в кеше: сбрасываются версией, TTL только добирает осиротевшие
+CORE_REPO_LIST_CACHE_TTL = 300
+
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://redis:6379/0')
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
@@ -166,6 +220,26 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': 900.0,
         'options': { 'expires': 600 }
     },
+    'flush-dirty-trending-scores': {
+        'task': 'forum.tasks.flush_dirty_trending_scores',
+        'schedule': FORUM_TRENDING_FLUSH_INTERVAL,
+        'options': { 'expires': FORUM_TRENDING_FLUSH_INTERVAL }
+    },
+    'flush-notifications': {
+        'task': 'forum.tasks.flush_notifications',
+        'schedule': FORUM_NOTIFICATIONS_FLUSH_INTERVAL,
+        'options': { 'expires': FORUM_NOTIFICATIONS_FLUSH_INTERVAL }
+    },
+    'flush-post-views': {
+        'task': 'forum.tasks.flush_post_views',
+        'schedule': FORUM_VIEWS_FLUSH_INTERVAL,
+        'options': { 'expires': FORUM_VIEWS_FLUSH_INTERVAL }
+    },
+    'purge-old-notifications-daily': {
+        'task': 'forum.tasks.purge_old_notifications',
+        'schedule': 86400.0,
+        'options': { 'expires': 3600 }
+    },
 }
 
 REST_FRAMEWORK = {
@@ -235,4 +309,14 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'http')
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
-]
\ No newline at end of file
+]
+
+# === TESTS ===
+# manage.py test гоняем без Redis и брокера: кеш в памяти, задачи Celery синхронно
+if len(sys.argv) > 1 and sys.argv[1] == 'test':
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+    CELERY_TASK_ALWAYS_EAGER = True
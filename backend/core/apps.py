@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'core'
+
+    def ready(self):
+        """Регистрируем сигналы при запуске приложения"""
+        import core.signals  # noqa
@@ -0,0 +1,105 @@
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Commits, Repositories
+from core.pagination import CommitHistoryPagination
+from core.services.commit_history import CommitHistory
+
+
+class Command(BaseCommand):
+    help = "Замеряет историю коммитов: глобальный список с OFFSET против курсора по (committed_at, id) в индексе ветки"
+
+    BENCH_NAME = 'commit_history_bench'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2_000_000, help="Коммитов в таблице")
+        parser.add_argument('--repos', type=int, default=50)
+        parser.add_argument('--branches', type=int, default=4, help="Веток в репозитории")
+        parser.add_argument('--depth', type=int, default=5000, help="Сколько коммитов пролистано до глубокой страницы")
+        parser.add_argument('--page-size', type=int, default=30)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--no-indexes', action='store_true', help="Не создавать индексы истории")
+        parser.add_argument('--keep', action='store_true', help="Не удалять сгенерированные коммиты")
+
+    def handle(self, *args, **options):
+        repos = Repositories.objects.bulk_create([
+            Repositories(name=f'{self.BENCH_NAME}_{i}', fs_path='', is_public=True, default_branch='main')
+            for i in range(options['repos'])
+        ])
+        repo_ids = [repo.pk for repo in repos]
+        try:
+            self.seed(repo_ids, options['rows'], options['branches'])
+            if not options['no_indexes']:
+                started = time.perf_counter()
+                CommitHistory.create_indexes()
+                self.stdout.write(f"Indexes created in {(time.perf_counter() - started) * 1000:.0f}ms")
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            repo_id, branch = repo_ids[0], 'main'
+            page_size, depth, repeat = options['page_size'], options['depth'], options['repeat']
+            self.timed('global   offset  page 1', lambda: self.offset_page(Commits.objects.order_by('-committed_at'), 0, page_size), repeat)
+            self.timed('global   offset  deep', lambda: self.offset_page(Commits.objects.order_by('-committed_at'), depth, page_size), repeat)
+            history = CommitHistory.for_repo(repo_id, branch)
+            self.timed('branch   offset  deep', lambda: self.offset_page(history, depth, page_size), repeat)
+            self.timed('branch   keyset  page 1', lambda: self.keyset_page(history, None, page_size), repeat)
+            anchor = history.values('committed_at', 'id')[depth - 1:depth].first()
+            if anchor:
+                cursor = CommitHistoryPagination().encode_cursor(anchor['committed_at'], anchor['id'])
+                self.timed('branch   keyset  deep', lambda: self.keyset_page(history, cursor, page_size), repeat)
+        finally:
+            if not options['keep']:
+                Commits.objects.filter(repo_id__in=repo_ids).delete()
+                Repositories.objects.filter(pk__in=repo_ids).delete()
+
+    def timed(self, label, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(f"{label:24} p50={statistics.median(timings):9.2f}ms max={max(timings):9.2f}ms")
+
+    @staticmethod
+    def offset_page(queryset, offset, page_size):
+        """Как работал CommitViewSet: COUNT(*) для PageNumberPagination и OFFSET"""
+        queryset.count()
+        return list(queryset[offset:offset + page_size])
+
+    @staticmethod
+    def keyset_page(queryset, cursor, page_size):
+        params = {'page_size': page_size}
+        if cursor:
+            params['cursor'] = cursor
+        request = Request(APIRequestFactory().get('/', params))
+        return CommitHistoryPagination().paginate_queryset(queryset, request)
+
+    def seed(self, repo_ids, total, branches):
+        """Коммиты вставляются сырыми пачками executemany: ORM на миллионах строк дольше самого замера"""
+        rng = random.Random(42)
+        start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        names = ['main'] + [f'feature/{i}' for i in range(1, branches)]
+        sql = (
+            f"INSERT INTO {Commits._meta.db_table} (repo_id, hash, message, branch, is_verified, committed_at) "
+            f"VALUES (%s, %s, %s, %s, %s, %s)"
+        )
+        started = time.perf_counter()
+        for offset in range(0, total, 10000):
+            rows = []
+            for i in range(offset, min(offset + 10000, total)):
+                # Основная ветка получает половину коммитов, как в живых репозиториях
+                branch = 'main' if rng.random() < 0.5 else rng.choice(names)
+                committed_at = start + timedelta(seconds=rng.randrange(0, 5 * 365 * 86400))
+                rows.append((rng.choice(repo_ids), f'{rng.getrandbits(160):040x}', 'bench', branch, False, committed_at))
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, rows)
+        self.stdout.write(
+            f"Seeded {total} commits in {len(repo_ids)} repos x {branches} branches, "
+            f"{time.perf_counter() - started:.1f}s"
+        )
@@ -0,0 +1,103 @@
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import git
+from django.core.management.base import BaseCommand
+
+from core.services.git_backend import GitBackend, GitRepoReader
+
+
+class Command(BaseCommand):
+    help = "Сравнивает чтение репозитория через GitPython и через git plumbing (GitBackend)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', default=[], help="Готовый репозиторий (можно несколько)")
+        parser.add_argument('--commits', type=int, default=5000, help="Коммитов в сгенерированном репозитории")
+        parser.add_argument('--dirs', type=int, default=50, help="Каталогов в сгенерированном репозитории")
+        parser.add_argument('--copies', type=int, default=4, help="Сколько репозиториев читать параллельно")
+        parser.add_argument('--log-count', type=int, default=1000, help="Коммитов в листинге истории")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        workdir = None
+        paths = options['path']
+        if not paths:
+            workdir = tempfile.mkdtemp(prefix='git_backend_bench_')
+            paths = [self.seed(f'{workdir}/repo{i}', options['commits'], options['dirs']) for i in range(options['copies'])]
+        try:
+            self.compare(paths[0], options)
+            self.compare_fan_out(paths, options)
+        finally:
+            GitBackend.shutdown()
+            if workdir:
+                shutil.rmtree(workdir)
+
+    def timed(self, label, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(f"{label:28} p50={statistics.median(timings):9.2f}ms max={max(timings):9.2f}ms")
+
+    def compare(self, path, options):
+        repo = git.Repo(path)
+        reader = GitRepoReader(path)
+        log_count, repeat = options['log_count'], options['repeat']
+        head = repo.head.commit.tree
+        dirs = [entry.path for entry in head.trees]
+        files = [blob.path for tree in head.trees for blob in tree.blobs][:500]
+        self.stdout.write(f"{path}: {len(dirs)} dirs, {len(files)} files read, {log_count} commits listed")
+
+        def gitpython_log():
+            for commit in repo.iter_commits('HEAD', max_count=log_count):
+                commit.hexsha, commit.message, commit.author.name, commit.committed_datetime
+
+        def gitpython_trees():
+            for name in dirs:
+                [entry.name for entry in head[name]]
+
+        def gitpython_blobs():
+            for name in files:
+                head[name].data_stream.read()
+
+        self.timed('log       gitpython', gitpython_log, repeat)
+        self.timed('log       plumbing', lambda: list(reader.commits(max_count=log_count)), repeat)
+        self.timed('trees     gitpython', gitpython_trees, repeat)
+        self.timed('trees     plumbing', lambda: reader.trees('HEAD', dirs), repeat)
+        self.timed('blobs     gitpython', gitpython_blobs, repeat)
+        self.timed('blobs     plumbing', lambda: reader.blobs(f'HEAD:{name}' for name in files), repeat)
+        reader.close()
+        repo.close()
+
+    def compare_fan_out(self, paths, options):
+        log_count, repeat = options['log_count'], options['repeat']
+
+        def sequential():
+            for path in paths:
+                list(GitRepoReader(path).commits(max_count=log_count))
+
+        # Первый вызов поднимает воркеры - не считаем его
+        GitBackend.fan_out('commits', paths, max_count=1)
+        self.timed(f'log x{len(paths)} sequential', sequential, repeat)
+        self.timed(f'log x{len(paths)} fan_out', lambda: GitBackend.fan_out('commits', paths, max_count=log_count), repeat)
+
+    def seed(self, path, commits, dirs):
+        """Синтетическая история через git fast-import: каждый коммит меняет несколько файлов"""
+        subprocess.run(['git', 'init', '-q', path], check=True)
+        lines = []
+        for i in range(1, commits + 1):
+            message = f'Change {i}\n\nTouches module {i % dirs}'.encode()
+            lines.append(b'commit refs/heads/main\n')
+            lines.append(f'committer Bench <bench@example.com> {1700000000 + i * 60} +0000\n'.encode())
+            lines.append(f'data {len(message)}\n'.encode() + message + b'\n')
+            for j in range(3 if i > 1 else dirs * 10):
+                n = (i * 7 + j) % (dirs * 10) if i > 1 else j
+                content = f'# module {n}\nVALUE = {i}\n'.encode() + b'x = 1\n' * (n % 50)
+                lines.append(f'M 644 inline pkg{n % dirs}/mod{n}.py\n'.encode())
+                lines.append(f'data {len(content)}\n'.encode() + content + b'\n')
+        subprocess.run(['git', '-C', path, 'fast-import', '--quiet'], input=b''.join(lines), check=True)
+        subprocess.run(['git', '-C', path, 'symbolic-ref', 'HEAD', 'refs/heads/main'], check=True)
+        return path
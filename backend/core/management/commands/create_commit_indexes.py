@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.services.commit_history import CommitHistory
+
+
+class Command(BaseCommand):
+    help = "Создает индексы истории коммитов на неуправляемой таблице commits"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sql', action='store_true', help="Только напечатать SQL (CONCURRENTLY для Postgres)")
+
+    def handle(self, *args, **options):
+        if options['sql']:
+            for sql in CommitHistory.index_sql(concurrently=True):
+                self.stdout.write(f"{sql};")
+            return
+        for sql in CommitHistory.create_indexes():
+            self.stdout.write(self.style.SUCCESS(sql))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Repositories
+from core.services.commit_ingest import CommitIngest, CommitIngestBusy
+from core.services.git_backend import GitBackendError
+
+
+class Command(BaseCommand):
+    help = "Загружает новые коммиты репозиториев с диска в таблицу commits и печатает пропускную способность"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repo', type=int, action='append', default=[], help="ID репозитория (можно несколько), по умолчанию все")
+        parser.add_argument('--branch', action='append', default=[], help="Ветка (можно несколько), по умолчанию все")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--reset', action='store_true', help="Не брать checkpoint и перечитать ветки целиком")
+
+    def handle(self, *args, **options):
+        repositories = Repositories.objects.order_by('pk')
+        if options['repo']:
+            repositories = repositories.filter(pk__in=options['repo'])
+            if not repositories.exists():
+                raise CommandError("Repositories not found")
+
+        for repository in repositories:
+            try:
+                stats = CommitIngest.ingest_repository(
+                    repository, branches=options['branch'] or None, batch_size=options['batch_size'],
+                    reset=options['reset'],
+                )
+            except CommitIngestBusy as e:
+                self.stdout.write(self.style.WARNING(f"repo {repository.pk}: {e}"))
+                continue
+            except GitBackendError as e:
+                self.stderr.write(f"repo {repository.pk}: {e}")
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"repo {repository.pk}: inserted {stats['inserted']}/{stats['scanned']} commits "
+                f"in {stats['batches']} batches, {stats['elapsed_ms']}ms ({stats['commits_per_sec']} commits/s)"
+            ))
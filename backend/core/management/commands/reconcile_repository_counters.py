@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.services.repo_counters import RepositoryCounters
+
+
+class Command(BaseCommand):
+    help = "Сверяет forks_count/open_issues_count репозиториев с реальными данными и чинит дрейф"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help="Только посчитать расхождения, ничего не писать")
+
+    def handle(self, *args, **options):
+        result = RepositoryCounters.reconcile(chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {result['checked']} repositories, fixed {result['fixed']}"
+            + (" (dry run)" if options['dry_run'] else "")
+        ))
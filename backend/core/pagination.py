@@ -0,0 +1,12 @@
+from forum.pagination import KeysetPagination
+
+
+class CommitHistoryPagination(KeysetPagination):
+    """
+    История коммитов: только курсор по (committed_at, id), без ?page=N.
+    OFFSET по истории на сотни тысяч коммитов читал бы все пролистанные строки.
+    """
+    keyset_fields = ('committed_at',)
+
+    def use_page_numbers(self, request, view=None):
+        return False
@@ -10,7 +10,20 @@ class RepositorySerializer(serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     class Meta:
         model = Repositories
-        fields = ['id', 'name', 'description', 'is_public', 'stars_count', 'owner', 'created_at']
+        fields = ['id', 'name', 'description', 'is_public', 'stars_count', 'forks_count', 'open_issues_count', 'owner', 'created_at']
+        # Счетчики ведет RepositoryCounters (сигналы и reconcile), не клиент
+        read_only_fields = ['stars_count', 'forks_count', 'open_issues_count']
+
+    def update(self, instance, validated_data):
+        """
+        Правка пишет только присланные поля: полный save() вернул бы прочитанные вместе
+        с репозиторием счетчики и затер бы сдвинутые тем временем через F()
+        """
+        serializers.raise_errors_on_nested_writes('update', self, validated_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
 
 class CommitSerializer(serializers.ModelSerializer):
     class Meta:
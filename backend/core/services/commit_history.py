@@ -0,0 +1,56 @@
+import logging
+from django.db import connection
+
+from core.models import Commits
+
+logger = logging.getLogger(__name__)
+
+
+class CommitHistory:
+    """
+    История коммитов репозитория и ветки.
+
+    Таблица commits неуправляемая (managed=False), миграции Django ее не трогают,
+    поэтому индексы под историю описаны здесь и создаются командой
+    create_commit_indexes (или SQL из create_commit_indexes --sql для DBA).
+    Оба индекса совпадают с порядком KeysetPagination (committed_at DESC, id DESC):
+    страница - чтение диапазона индекса без сортировки, на любой глубине.
+    """
+
+    INDEXES = (
+        ('commits_repo_branch_committed_idx', ('repo_id', 'branch', 'committed_at DESC', 'id DESC')),
+        ('commits_repo_committed_idx', ('repo_id', 'committed_at DESC', 'id DESC')),
+    )
+
+    @staticmethod
+    def for_repo(repo_id, branch=None):
+        queryset = Commits.objects.filter(repo_id=repo_id)
+        if branch is not None:
+            queryset = queryset.filter(branch=branch)
+        return queryset.order_by('-committed_at', '-id')
+
+    @classmethod
+    def index_sql(cls, concurrently=None):
+        """CREATE INDEX для всех индексов; CONCURRENTLY на Postgres - без блокировки записи"""
+        if concurrently is None:
+            concurrently = connection.vendor == 'postgresql'
+        table = Commits._meta.db_table
+        mode = 'CONCURRENTLY ' if concurrently else ''
+        return [
+            f"CREATE INDEX {mode}IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+            for name, columns in cls.INDEXES
+        ]
+
+    @classmethod
+    def create_indexes(cls):
+        """
+        Создает недостающие индексы. CONCURRENTLY нельзя внутри транзакции,
+        поэтому вызывать вне atomic (команда, а не миграция).
+        Returns: выполненные запросы
+        """
+        statements = cls.index_sql()
+        with connection.cursor() as cursor:
+            for sql in statements:
+                logger.info(f"Creating commit history index: {sql}")
+                cursor.execute(sql)
+        return statements
@@ -0,0 +1,221 @@
+import csv
+import io
+import logging
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Commits, Users
+from core.services.git_backend import GitBackend, GitBackendError
+from forum.services.redis_client import acquire_lock, get_redis, refresh_lock, release_lock
+
+logger = logging.getLogger(__name__)
+
+
+class CommitIngestBusy(Exception):
+    """Репозиторий загружает другой процесс (или блокировка потеряна посреди загрузки)"""
+
+
+class CommitIngest:
+    """
+    Инкрементальная загрузка истории репозитория с диска в таблицу commits.
+
+    Каждая ветка читается одним потоковым git log от вершины до последнего
+    загруженного коммита, старые коммиты первыми. Checkpoint ветки - самый свежий
+    ее коммит в commits (один шаг по индексу repo, branch, committed_at): он
+    хранится вместе с данными и не теряется при вытеснении кеша.
+    Коммиты пишутся пачками по COMMIT_INGEST_BATCH: на Postgres через COPY во
+    временную таблицу и INSERT ... WHERE NOT EXISTS, на других СУБД -
+    bulk_create(ignore_conflicts=True) без уже существующих хешей.
+    Пачка и ее checkpoint фиксируются одной транзакцией.
+
+    Повторный запуск идемпотентен: ветка без новых коммитов стоит одного запроса
+    и git for-each-ref. Если checkpoint не предок вершины (rebase, коммиты с
+    несогласованным временем), git log отдаст часть уже загруженной истории -
+    она отфильтруется как уже существующая.
+
+    Строка commits - пара (ветка, коммит): общая история веток хранится в каждой
+    ветке, зато история ветки - один диапазон индекса (repo, branch, committed_at).
+    """
+
+    LOCK_KEY = 'core:commit_ingest:lock:{repo_id}'
+
+    COLUMNS = ('repo_id', 'author_id', 'hash', 'message', 'branch', 'is_verified', 'committed_at', 'created_at')
+
+    # --- checkpoint и блокировка ---
+
+    @staticmethod
+    def checkpoint(repo_id, branch):
+        """Хеш самого свежего загруженного коммита ветки или None"""
+        return (
+            Commits.objects.filter(repo_id=repo_id, branch=branch)
+            .order_by('-committed_at', '-id').values_list('hash', flat=True).first()
+        )
+
+    @staticmethod
+    def lock_timeout():
+        return getattr(settings, 'COMMIT_INGEST_LOCK_TIMEOUT', 300)
+
+    @classmethod
+    def acquire(cls, repo_id):
+        """
+        Одна загрузка на репозиторий: без уникального индекса параллельные вставки задвоили бы строки.
+        Блокировка с токеном и коротким TTL, продлевается после каждой пачки: если воркер
+        убит и finally не выполнился, она истекает сама, и повторная доставка задачи продолжит загрузку.
+        Returns: токен или None, если блокировка занята
+        """
+        key, timeout = cls.LOCK_KEY.format(repo_id=repo_id), cls.lock_timeout()
+        r = get_redis()
+        if r is not None:
+            return acquire_lock(r, key, timeout)
+        token = uuid.uuid4().hex
+        return token if cache.add(key, token, timeout=timeout) else None
+
+    @classmethod
+    def refresh(cls, repo_id, token):
+        key, timeout = cls.LOCK_KEY.format(repo_id=repo_id), cls.lock_timeout()
+        r = get_redis()
+        if r is not None:
+            alive = refresh_lock(r, key, token, timeout)
+        else:
+            alive = cache.get(key) == token and cache.touch(key, timeout)
+        if not alive:
+            raise CommitIngestBusy(f"Commit ingest lock for repo {repo_id} was lost")
+
+    @classmethod
+    def release(cls, repo_id, token):
+        key = cls.LOCK_KEY.format(repo_id=repo_id)
+        r = get_redis()
+        if r is not None:
+            release_lock(r, key, token)
+        elif cache.get(key) == token:
+            cache.delete(key)
+
+    # --- загрузка ---
+
+    @classmethod
+    def ingest_repository(cls, repository, branches=None, batch_size=None, reset=False):
+        """
+        Загружает новые коммиты всех (или перечисленных) веток репозитория.
+        reset: не брать checkpoint, перечитать ветки целиком (новые строки все равно не задвоятся)
+        Returns: {'repo_id', 'branches': {ветка: вставлено}, 'scanned', 'inserted',
+                  'batches', 'elapsed_ms', 'commits_per_sec'}
+        Raises: CommitIngestBusy, если репозиторий уже загружается
+        """
+        batch_size = batch_size or getattr(settings, 'COMMIT_INGEST_BATCH', 1000)
+        token = cls.acquire(repository.pk)
+        if token is None:
+            raise CommitIngestBusy(f"Commit ingest for repo {repository.pk} is already running")
+
+        stats = {'repo_id': repository.pk, 'branches': {}, 'scanned': 0, 'inserted': 0, 'batches': 0}
+        started = time.monotonic()
+        try:
+            reader = GitBackend.reader(repository)
+            heads = reader.branches()
+            names = [name for name in (branches or heads) if name in heads]
+            # Основная ветка первой: ее история нужна раньше остальных
+            names.sort(key=lambda name: name != repository.default_branch)
+
+            authors = {}
+            # После каждой пачки блокировка продлевается; потерянная останавливает загрузку
+            on_batch = lambda: cls.refresh(repository.pk, token)  # noqa: E731
+            for branch in names:
+                before = stats['inserted']
+                cls.ingest_branch(
+                    reader, repository.pk, branch, heads[branch], batch_size, authors, stats, on_batch, full=reset,
+                )
+                stats['branches'][branch] = stats['inserted'] - before
+        finally:
+            cls.release(repository.pk, token)
+
+        elapsed = time.monotonic() - started
+        stats['elapsed_ms'] = int(elapsed * 1000)
+        stats['commits_per_sec'] = int(stats['scanned'] / elapsed) if elapsed else 0
+        return stats
+
+    @classmethod
+    def ingest_branch(cls, reader, repo_id, branch, tip, batch_size, authors, stats, on_batch=None, full=False):
+        since = None if full else cls.checkpoint(repo_id, branch)
+        if since == tip:
+            return
+        batch = []
+        try:
+            for commit in reader.commits(tip, since=since, reverse=True):
+                batch.append(commit)
+                if len(batch) >= batch_size:
+                    cls.write_batch(repo_id, branch, batch, authors, stats)
+                    batch = []
+                    if on_batch:
+                        on_batch()
+        except GitBackendError as e:
+            if since is None:
+                raise
+            # Checkpoint больше не существует (force push + gc): читаем ветку заново,
+            # уже загруженные коммиты отфильтруются
+            logger.warning(f"Commit ingest checkpoint {since} for repo {repo_id}/{branch} is gone: {e}")
+            return cls.ingest_branch(reader, repo_id, branch, tip, batch_size, authors, stats, on_batch, full=True)
+        if batch:
+            cls.write_batch(repo_id, branch, batch, authors, stats)
+
+    @classmethod
+    def resolve_authors(cls, commits, authors):
+        """Автор коммита - пользователь с тем же email; словарь authors копится на весь репозиторий"""
+        missing = {commit['author_email'] for commit in commits} - authors.keys()
+        if missing:
+            authors.update(dict.fromkeys(missing))
+            authors.update(Users.objects.filter(email__in=missing).values_list('email', 'id'))
+        return authors
+
+    @classmethod
+    def write_batch(cls, repo_id, branch, commits, authors, stats):
+        cls.resolve_authors(commits, authors)
+        now = timezone.now()
+        rows = [
+            (repo_id, authors[commit['author_email']], commit['hash'], commit['message'], branch,
+             False, commit['committed_at'], now)
+            for commit in commits
+        ]
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                inserted = cls._copy_rows(rows)
+            else:
+                inserted = cls._bulk_create_rows(repo_id, branch, rows)
+        stats['scanned'] += len(rows)
+        stats['inserted'] += inserted
+        stats['batches'] += 1
+
+    @classmethod
+    def _bulk_create_rows(cls, repo_id, branch, rows):
+        existing = set(
+            Commits.objects.filter(repo_id=repo_id, branch=branch, hash__in=[row[2] for row in rows])
+            .values_list('hash', flat=True)
+        )
+        new = [Commits(**dict(zip(cls.COLUMNS, row))) for row in rows if row[2] not in existing]
+        Commits.objects.bulk_create(new, ignore_conflicts=True)
+        return len(new)
+
+    @classmethod
+    def _copy_rows(cls, rows):
+        """COPY пачки во временную таблицу и перенос строк, которых еще нет в commits"""
+        columns = ', '.join(cls.COLUMNS)
+        buffer = io.StringIO()
+        # Строки в кавычках, None без кавычек - в CSV COPY это NULL, а пустое сообщение остается ''
+        csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS commits_ingest ("
+                "repo_id integer, author_id integer, hash varchar(40), message text, branch varchar(255), "
+                "is_verified boolean, committed_at timestamptz, created_at timestamptz"
+                ") ON COMMIT DELETE ROWS"
+            )
+            cursor.copy_expert(f"COPY commits_ingest ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(
+                f"INSERT INTO commits ({columns}) SELECT {columns} FROM commits_ingest s "
+                f"WHERE NOT EXISTS (SELECT 1 FROM commits c "
+                f"WHERE c.repo_id = s.repo_id AND c.branch = s.branch AND c.hash = s.hash)"
+            )
+            return cursor.rowcount
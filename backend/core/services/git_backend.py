@@ -0,0 +1,326 @@
+import logging
+import multiprocessing
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class GitBackendError(Exception):
+    """Ошибка чтения репозитория (нет репозитория, git завершился, битый ответ)"""
+
+
+class GitRepoReader:
+    """
+    Чтение одного репозитория через git plumbing без GitPython.
+
+    Объекты (блобы, деревья) читаются постоянным процессом git cat-file --batch:
+    запросы пачкой пишутся в stdin, ответы читаются по порядку - один процесс на
+    репозиторий вместо subprocess на каждую операцию. Имена объектов - любые
+    выражения git ("HEAD:src/app.py", "main^{tree}", sha).
+
+    История коммитов - потоковый git log: коммиты разбираются по мере чтения,
+    весь вывод в памяти не собирается.
+
+    Процесс cat-file однопоточный, поэтому запросы сериализуются блокировкой.
+    """
+
+    TREE_TYPES = {b'40000': 'tree', b'160000': 'commit'}
+
+    # Поля git log разделены \x1f, коммиты - \x1e
+    LOG_FORMAT = '%H%x1f%P%x1f%an%x1f%ae%x1f%ct%x1f%B%x1e'
+
+    def __init__(self, path):
+        self.path = path
+        self._cat_file = None
+        self._lock = threading.Lock()
+
+    # --- cat-file ---
+
+    def _process(self):
+        if self._cat_file is None or self._cat_file.poll() is not None:
+            if not os.path.isdir(self.path):
+                raise GitBackendError(f"Repository not found: {self.path}")
+            self._cat_file = subprocess.Popen(
+                ['git', '-C', self.path, 'cat-file', '--batch'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            )
+        return self._cat_file
+
+    def read_objects(self, names):
+        """
+        Содержимое объектов по именам.
+        Returns: [(sha, type, bytes) или None для отсутствующих] в порядке names
+
+        Запросы пишет отдельный поток, ответы читаются в этом: если писать пачку
+        и только потом читать, cat-file с крупными ответами упирается в полный
+        stdout, а мы - в полный stdin, и оба ждут друг друга вечно.
+        """
+        names = list(names)
+        result = []
+        with self._lock:
+            process = self._process()
+            write_errors = []
+
+            def write_requests():
+                try:
+                    for name in names:
+                        process.stdin.write(name.encode('utf-8') + b'\n')
+                    process.stdin.flush()
+                except (BrokenPipeError, OSError, ValueError) as e:
+                    write_errors.append(e)
+
+            writer = threading.Thread(target=write_requests, daemon=True)
+            writer.start()
+            try:
+                for _ in names:
+                    result.append(self._read_response(process.stdout))
+            except (GitBackendError, OSError, ValueError) as e:
+                # Процесс умер посреди пачки - следующий вызов поднимет новый;
+                # kill заодно разблокирует поток записи
+                self._close_process()
+                writer.join()
+                raise GitBackendError(f"git cat-file failed for {self.path}: {write_errors[0] if write_errors else e}")
+            writer.join()
+        return result
+
+    @staticmethod
+    def _read_response(stdout):
+        header = stdout.readline()
+        if not header:
+            raise GitBackendError("git cat-file closed the stream")
+        # "<имя> missing": имя может содержать пробелы, поэтому смотрим на окончание
+        if header.rstrip(b'\n').endswith((b' missing', b' ambiguous')):
+            return None
+        sha, kind, size = header.split()
+        data = stdout.read(int(size))
+        stdout.read(1)  # перевод строки после содержимого
+        return sha.decode(), kind.decode(), data
+
+    def blobs(self, names):
+        """{имя: bytes или None}; имена вида "HEAD:path/to/file" """
+        names = list(names)
+        return {
+            name: obj[2] if obj is not None and obj[1] == 'blob' else None
+            for name, obj in zip(names, self.read_objects(names))
+        }
+
+    @classmethod
+    def parse_tree(cls, data, prefix=''):
+        """Бинарный формат дерева: "<mode> <name>\\0<20 байт sha>" подряд"""
+        entries = []
+        pos = 0
+        while pos < len(data):
+            space = data.index(b' ', pos)
+            nul = data.index(b'\0', space)
+            mode = data[pos:space]
+            name = data[space + 1:nul].decode('utf-8', errors='replace')
+            entries.append({
+                'name': name,
+                'path': f'{prefix}{name}',
+                'type': cls.TREE_TYPES.get(mode, 'blob'),
+                'mode': mode.decode(),
+                'sha': data[nul + 1:nul + 21].hex(),
+            })
+            pos = nul + 21
+        return entries
+
+    def trees(self, rev='HEAD', paths=('',)):
+        """{путь: [записи дерева] или None, если такого каталога нет} - одной пачкой cat-file"""
+        paths = [path.strip('/') for path in paths]
+        objects = self.read_objects(f'{rev}:{path}' if path else f'{rev}^{{tree}}' for path in paths)
+        return {
+            path: self.parse_tree(obj[2], f'{path}/' if path else '') if obj is not None and obj[1] == 'tree' else None
+            for path, obj in zip(paths, objects)
+        }
+
+    def tree(self, rev='HEAD', path=''):
+        return self.trees(rev, [path])[path.strip('/')]
+
+    # --- git log ---
+
+    def commits(self, rev='HEAD', since=None, max_count=None, skip=0, first_parent=False, reverse=False):
+        """
+        Коммиты от rev вглубь истории, новые первыми (генератор).
+        since - не заходить в историю этого коммита (для инкрементальной загрузки).
+        reverse - старые первыми, родители раньше потомков (--topo-order).
+        Yields: {'hash', 'parents', 'author_name', 'author_email', 'committed_at', 'message'}
+        """
+        args = ['git', '-C', self.path, 'log', f'--format={self.LOG_FORMAT}', '--no-color']
+        if max_count is not None:
+            args.append(f'--max-count={max_count}')
+        if skip:
+            args.append(f'--skip={skip}')
+        if first_parent:
+            args.append('--first-parent')
+        if reverse:
+            args.extend(['--reverse', '--topo-order'])
+        args.append(rev)
+        if since:
+            args.append(f'^{since}')
+        args.append('--')
+
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            buffer = b''
+            while True:
+                chunk = process.stdout.read1(64 * 1024)
+                if not chunk:
+                    break
+                buffer += chunk
+                *records, buffer = buffer.split(b'\x1e')
+                for record in records:
+                    yield self._parse_commit(record)
+            if process.wait() != 0:
+                raise GitBackendError(
+                    f"git log failed for {self.path}: {process.stderr.read().decode(errors='replace').strip()}"
+                )
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+    @staticmethod
+    def _parse_commit(record):
+        sha, parents, name, email, timestamp, message = record.lstrip(b'\n').split(b'\x1f', 5)
+        return {
+            'hash': sha.decode(),
+            'parents': parents.decode().split(),
+            'author_name': name.decode('utf-8', errors='replace'),
+            'author_email': email.decode('utf-8', errors='replace'),
+            'committed_at': datetime.fromtimestamp(int(timestamp), tz=timezone.utc),
+            'message': message.decode('utf-8', errors='replace').rstrip('\n'),
+        }
+
+    def branches(self):
+        """{имя ветки: sha вершины}"""
+        output = subprocess.run(
+            ['git', '-C', self.path, 'for-each-ref', '--format=%(refname:short) %(objectname)', 'refs/heads/'],
+            capture_output=True,
+        )
+        if output.returncode != 0:
+            raise GitBackendError(f"git for-each-ref failed for {self.path}")
+        return dict(line.rsplit(' ', 1) for line in output.stdout.decode().splitlines())
+
+    # --- жизненный цикл ---
+
+    def _close_process(self):
+        if self._cat_file is not None:
+            if self._cat_file.poll() is None:
+                self._cat_file.kill()
+            self._cat_file.wait()
+            for stream in (self._cat_file.stdin, self._cat_file.stdout):
+                stream.close()
+            self._cat_file = None
+
+    def close(self):
+        with self._lock:
+            self._close_process()
+
+
+class GitReaderPool:
+    """
+    Ограниченный LRU читателей: не больше GIT_BACKEND_POOL_SIZE постоянных
+    cat-file процессов на процесс Django/Celery; самый давний закрывается.
+    """
+
+    def __init__(self, size=None):
+        self.size = size
+        self._readers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        size = self.size or getattr(settings, 'GIT_BACKEND_POOL_SIZE', 32)
+        evicted = []
+        with self._lock:
+            reader = self._readers.pop(path, None) or GitRepoReader(path)
+            self._readers[path] = reader
+            while len(self._readers) > size:
+                evicted.append(self._readers.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+        return reader
+
+    def close(self):
+        with self._lock:
+            readers, self._readers = list(self._readers.values()), OrderedDict()
+        for reader in readers:
+            reader.close()
+
+
+pool = GitReaderPool()
+
+
+def _call_reader(path, method, args, kwargs):
+    """Выполняется в процессе пула: у каждого воркера свой LRU cat-file процессов"""
+    try:
+        result = getattr(pool.get(path), method)(*args, **kwargs)
+        # Генераторы (commits) материализуем - через границу процесса передается только результат
+        return path, (list(result) if method == 'commits' else result), None
+    except GitBackendError as e:
+        return path, None, str(e)
+
+
+class GitBackend:
+    """
+    Точка входа для чтения репозиториев с диска (/git-data).
+
+    GitBackend.reader(repo) - читатель из пула процесса;
+    GitBackend.fan_out(...) - одна и та же операция по многим репозиториям
+    параллельно в ProcessPoolExecutor (разбор вывода git - CPU в Python, потоки
+    упирались бы в GIL).
+    """
+
+    _executor = None
+
+    @staticmethod
+    def repo_path(repository):
+        """Абсолютный путь репозитория: Repositories.fs_path относительно GIT_DATA_ROOT"""
+        fs_path = getattr(repository, 'fs_path', repository)
+        return os.path.join(getattr(settings, 'GIT_DATA_ROOT', '/git-data'), fs_path)
+
+    @classmethod
+    def reader(cls, repository):
+        return pool.get(cls.repo_path(repository))
+
+    @classmethod
+    def executor(cls):
+        if cls._executor is None:
+            cls._executor = ProcessPoolExecutor(max_workers=getattr(settings, 'GIT_BACKEND_WORKERS', None))
+        return cls._executor
+
+    @classmethod
+    def fan_out(cls, method, repositories, *args, **kwargs):
+        """
+        {путь: результат} для GitRepoReader.<method>(*args, **kwargs) по всем репозиториям.
+        Ошибки отдельных репозиториев логируются, их результат - None.
+        """
+        paths = [cls.repo_path(repository) for repository in repositories]
+        workers = getattr(settings, 'GIT_BACKEND_WORKERS', None) or os.cpu_count() or 1
+        # Воркер Celery (prefork) - демон и не может заводить дочерние процессы;
+        # на одном ядре или для одного репозитория пул только добавил бы пересылку результатов
+        if multiprocessing.current_process().daemon or workers < 2 or len(paths) < 2:
+            outcomes = [_call_reader(path, method, args, kwargs) for path in paths]
+        else:
+            futures = [cls.executor().submit(_call_reader, path, method, args, kwargs) for path in paths]
+            outcomes = [future.result() for future in futures]
+        results = {}
+        for path, result, error in outcomes:
+            if error:
+                logger.warning(f"Git backend {method} failed for {path}: {error}")
+            results[path] = result
+        return results
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown()
+            cls._executor = None
+        pool.close()
@@ -1,36 +1,250 @@
+import fnmatch
 import logging
-import git
+import subprocess
 
 logger = logging.getLogger(__name__)
 
 class GitParser:
+    # Бюджеты диффа для LLM: на файл и на весь коммит
+    MAX_FILE_BYTES = 64 * 1024
+    MAX_FILE_LINES = 2000
+    MAX_TOTAL_BYTES = 512 * 1024
+    MAX_TOTAL_LINES = 20000
+    MAX_FILES = 200
+
+    # Сгенерированные и вендорные файлы: смысла для сообщения коммита в них нет, а весят они больше всего
+    GENERATED_PATTERNS = (
+        'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'Pipfile.lock',
+        'Cargo.lock', 'composer.lock', 'Gemfile.lock', 'go.sum',
+        '*.min.js', '*.min.css', '*.map', '*.pb.go', '*_pb2.py',
+        'vendor/*', 'node_modules/*', 'dist/*', 'build/*',
+    )
+    GENERATED_MARKERS = (b'@generated', b'DO NOT EDIT', b'auto-generated', b'autogenerated')
+    # Маркер ищется в первых MARKER_SCAN_LINES строках диффа. Минифицированный файл - тот, у которого
+    # среди первых MARKER_SCAN_LINES строк хунков не меньше MINIFIED_LONG_LINE_RATIO длиннее MINIFIED_LINE_BYTES:
+    # одна длинная строка (data URI, SQL-дамп в тесте) файл не исключает
+    MARKER_SCAN_LINES = 20
+    MINIFIED_LINE_BYTES = 1000
+    MINIFIED_LONG_LINE_RATIO = 0.3
+
     @staticmethod
     def get_staged_files_diff(repo_path: str):
         """
         Возвращает список измененных файлов (staged) с их диффами.
         Нужно для сценария "CommitGen", когда пользователь еще не закоммитил.
+        Диффы уже ограничены бюджетами iter_staged_diffs.
+        """
+        return [
+            {"filename": item["filename"], "diff": item["diff"]}
+            for item in GitParser.iter_staged_diffs(repo_path)
+        ]
+
+    @staticmethod
+    def is_generated_path(path: str) -> bool:
+        name = path.rsplit('/', 1)[-1]
+        for pattern in GitParser.GENERATED_PATTERNS:
+            if pattern.endswith('/*'):
+                # Каталог на любой глубине: vendor/..., web/vendor/...
+                directory = pattern[:-1]
+                if path.startswith(directory) or f'/{directory}' in path:
+                    return True
+            elif fnmatch.fnmatch(name, pattern):
+                return True
+        return False
+
+    @staticmethod
+    def staged_numstat(repo_path: str):
+        """
+        Список staged-файлов без патчей: [(path, old_path, added, deleted)],
+        added/deleted = None для бинарных файлов.
         """
+        output = subprocess.run(
+            ['git', '-C', repo_path, 'diff', '--cached', '-M', '--numstat', '-z', '--no-color'],
+            capture_output=True, check=True,
+        ).stdout
+        entries = []
+        fields = output.split(b'\0')
+        i = 0
+        while i < len(fields) - 1:
+            added, deleted, path = fields[i].split(b'\t', 2)
+            old_path = None
+            if not path:
+                # Переименование: "added\tdeleted\t\0old\0new\0"
+                old_path, path = fields[i + 1], fields[i + 2]
+                i += 3
+            else:
+                i += 1
+            binary = added == b'-'
+            entries.append((
+                path.decode('utf-8', errors='replace'),
+                old_path.decode('utf-8', errors='replace') if old_path else None,
+                None if binary else int(added),
+                None if binary else int(deleted),
+            ))
+        return entries
+
+    @staticmethod
+    def iter_staged_diffs(repo_path: str, stats: dict = None, max_file_bytes: int = None, max_file_lines: int = None,
+                          max_total_bytes: int = None, max_total_lines: int = None, max_files: int = None):
+        """
+        Генератор диффов staged-файлов с ограниченной памятью.
+
+        Сначала git diff --numstat (без патчей) отсекает бинарные и сгенерированные файлы,
+        затем один процесс git diff --cached отдает патчи остальных потоком.
+        Патч файла читается до бюджета на файл (остаток пропускается, truncated=True),
+        при исчерпании общего бюджета процесс останавливается - дальше не читаем.
+
+        Yields: {"filename", "diff", "lines", "bytes", "truncated"}
+        stats (если передан) заполняется: files_total, files_yielded, skipped [{filename, reason}],
+        bytes, lines, truncated_files, stopped_early.
+        """
+        max_file_bytes = max_file_bytes or GitParser.MAX_FILE_BYTES
+        max_file_lines = max_file_lines or GitParser.MAX_FILE_LINES
+        max_total_bytes = max_total_bytes or GitParser.MAX_TOTAL_BYTES
+        max_total_lines = max_total_lines or GitParser.MAX_TOTAL_LINES
+        max_files = max_files or GitParser.MAX_FILES
+
+        stats = stats if stats is not None else {}
+        stats.update(files_total=0, files_yielded=0, skipped=[], bytes=0, lines=0, truncated_files=0, stopped_early=False)
+
         try:
-            repo = git.Repo(repo_path)
-            # Получаем diff того, что добавлено в index (git add), по сравнению с HEAD
-            diffs = repo.index.diff("HEAD", create_patch=True)
-            
-            files_data = []
-            for d in diffs:
-                # Декодируем байты в строку
-                diff_text = d.diff.decode('utf-8', errors='replace') if d.diff else ""
-                
-                # Добавляем в список только если есть изменения
-                if diff_text:
-                    files_data.append({
-                        "filename": d.a_path,
-                        "diff": diff_text
-                    })
-            
-            return files_data
-        except Exception as e:
+            entries = GitParser.staged_numstat(repo_path)
+        except (subprocess.CalledProcessError, OSError) as e:
             logger.error(f"Git parsing error: {e}")
-            return []
+            return
+        stats['files_total'] = len(entries)
+
+        selected = []
+        for path, old_path, added, deleted in entries:
+            if added is None:
+                stats['skipped'].append({"filename": path, "reason": "binary"})
+            elif GitParser.is_generated_path(path):
+                stats['skipped'].append({"filename": path, "reason": "generated"})
+            elif len(selected) >= max_files:
+                stats['skipped'].append({"filename": path, "reason": "file limit"})
+                stats['stopped_early'] = True
+            else:
+                selected.append((path, old_path))
+        if not selected:
+            return
+
+        # Пути - аргументами (их не больше max_files); --literal-pathspecs отключает glob-магию в именах
+        paths = [p for path, old_path in selected for p in (old_path, path) if p]
+        process = subprocess.Popen(
+            ['git', '--literal-pathspecs', '-C', repo_path, 'diff', '--cached', '-M', '--no-color', '--no-ext-diff',
+             '--', *paths],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        try:
+            yield from GitParser._read_patches(
+                process.stdout, selected, stats,
+                max_file_bytes, max_file_lines, max_total_bytes, max_total_lines,
+            )
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+
+    @staticmethod
+    def _read_patches(stream, selected, stats, max_file_bytes, max_file_lines, max_total_bytes, max_total_lines):
+        """Режет поток git diff на файлы (по заголовкам "diff --git") в порядке numstat"""
+        files = iter(selected)
+        current = None
+
+        def skip_generated(item):
+            # Уже прочитанные строки файла в отданный дифф не попадут - возвращаем их в общий бюджет
+            item['skip'] = True
+            item['chunks'] = []
+            stats['bytes'] -= item['bytes']
+            stats['lines'] -= item['lines']
+            stats['skipped'].append({"filename": item['filename'], "reason": "generated"})
+
+        def minified(item):
+            scanned = item['scan_lines']
+            return scanned > 0 and item['long_lines'] >= scanned * GitParser.MINIFIED_LONG_LINE_RATIO
+
+        def finish(item):
+            if item is None or item['skip']:
+                return None
+            if not item['scanned'] and minified(item):
+                # Дифф короче окна проверки: решаем по тем строкам, что есть
+                skip_generated(item)
+                return None
+            diff = b''.join(item['chunks']).decode('utf-8', errors='replace')
+            if item['truncated']:
+                diff += "\n... (Diff truncated)"
+                stats['truncated_files'] += 1
+            stats['files_yielded'] += 1
+            return {
+                "filename": item['filename'], "diff": diff,
+                "lines": item['lines'], "bytes": item['bytes'], "truncated": item['truncated'],
+            }
+
+        continuation = False
+        while True:
+            # readline с лимитом: минифицированная строка на мегабайты не попадет в память целиком
+            chunk = stream.readline(max_file_bytes + 1)
+            if not chunk:
+                break
+            new_line = not continuation
+            continuation = not chunk.endswith(b'\n')
+
+            if new_line and chunk.startswith(b'diff --git '):
+                result = finish(current)
+                if result:
+                    yield result
+                path, _ = next(files, (None, None))
+                current = {'filename': path, 'chunks': [], 'lines': 0, 'bytes': 0,
+                           'truncated': False, 'skip': path is None,
+                           'scanned': False, 'in_hunk': False, 'scan_lines': 0, 'long_lines': 0, 'line_bytes': 0}
+            if current is None or current['skip']:
+                continue
+
+            if not current['scanned']:
+                if new_line and current['scan_lines'] >= GitParser.MARKER_SCAN_LINES:
+                    # Окно проверки заполнено и его последняя строка дочитана
+                    current['scanned'] = True
+                    if minified(current):
+                        skip_generated(current)
+                        continue
+                elif any(marker in chunk for marker in GitParser.GENERATED_MARKERS):
+                    skip_generated(current)
+                    continue
+                elif new_line and chunk.startswith(b'@@'):
+                    # Заголовки файла и хунков короткие - считаем только строки содержимого
+                    current['in_hunk'] = True
+                elif current['in_hunk']:
+                    if new_line:
+                        current['scan_lines'] += 1
+                        current['line_bytes'] = 0
+                    # Строка длиннее лимита readline приходит несколькими кусками
+                    before = current['line_bytes']
+                    current['line_bytes'] += len(chunk)
+                    if before <= GitParser.MINIFIED_LINE_BYTES < current['line_bytes']:
+                        current['long_lines'] += 1
+            if current['truncated']:
+                continue
+
+            if current['bytes'] + len(chunk) > max_file_bytes or (new_line and current['lines'] >= max_file_lines):
+                current['truncated'] = True
+                continue
+            if stats['bytes'] + len(chunk) > max_total_bytes or (new_line and stats['lines'] >= max_total_lines):
+                # Общий бюджет исчерпан: отдаем накопленное и больше не читаем
+                current['truncated'] = True
+                stats['stopped_early'] = True
+                break
+
+            current['chunks'].append(chunk)
+            current['bytes'] += len(chunk)
+            stats['bytes'] += len(chunk)
+            if new_line:
+                current['lines'] += 1
+                stats['lines'] += 1
+
+        result = finish(current)
+        if result:
+            yield result
 
     @staticmethod
     def clean_diff(raw_diff: str, max_lines: int = 2000) -> str:
@@ -42,4 +256,4 @@ class GitParser:
         lines = raw_diff.split('\n')
         if len(lines) > max_lines:
             return '\n'.join(lines[:max_lines]) + "\n... (Diff truncated)"
-        return raw_diff
\ No newline at end of file
+        return raw_diff
@@ -0,0 +1,106 @@
+import logging
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+
+from core.models import Issues, PullRequests, Repositories
+from core.services.repo_list_cache import RepositoryListCache
+from forum.services.counters import count_subquery
+
+logger = logging.getLogger(__name__)
+
+
+class RepositoryCounters:
+    """
+    Денормализованные счетчики Repositories.
+
+    forks_count - репозитории с forked_from на этот, open_issues_count - открытые
+    Issues и PullRequests. Сигналы (core.signals) сдвигают их атомарным
+    UPDATE ... SET x = COALESCE(x, 0) + delta на переходах открыт/закрыт и
+    форк/не форк; reconcile() чинит дрейф от правок в обход ORM.
+
+    stars_count в схеме есть, а таблицы звезд нет: считать его не из чего,
+    reconcile только заменяет NULL на 0.
+    """
+
+    # NULL в is_closed/status - открытые: так их показывал список до счетчиков
+    OPEN_ISSUES = ~Q(is_closed=True)
+    OPEN_PULL_REQUESTS = ~Q(is_merged=True) & ~Q(status__in=('closed', 'merged'))
+
+    @staticmethod
+    def add(repo_id, **deltas):
+        """add(repo_id, forks_count=1) - атомарный сдвиг счетчиков и сброс кеша списка"""
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if repo_id is None or not deltas:
+            return
+        Repositories.objects.filter(pk=repo_id).update(**{
+            field: Coalesce(F(field), Value(0)) + delta for field, delta in deltas.items()
+        })
+        transaction.on_commit(RepositoryListCache.invalidate)
+
+    @classmethod
+    def is_open(cls, instance):
+        """Вклад строки Issues/PullRequests в open_issues_count, в Python - как OPEN_* в SQL"""
+        if isinstance(instance, Issues):
+            return not instance.is_closed
+        return not instance.is_merged and instance.status not in ('closed', 'merged')
+
+    @classmethod
+    def apply_transition(cls, field, before, after):
+        """
+        before/after - (repo_id, считается ли строка) до и после изменения, None -
+        строки не было. Сдвигает счетчик старого и нового репозитория.
+        """
+        if before == after:
+            return
+        if before and before[1]:
+            cls.add(before[0], **{field: -1})
+        if after and after[1]:
+            cls.add(after[0], **{field: 1})
+
+    @classmethod
+    def reconcile(cls, chunk_size=2000, dry_run=False):
+        """
+        Сверяет счетчики с реальными COUNT чанками по pk и исправляет расхождения.
+        Returns: {'checked', 'fixed'}
+        """
+        checked = fixed = 0
+        last_pk = 0
+
+        while True:
+            rows = list(
+                Repositories.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .annotate(
+                    actual_forks=count_subquery(Repositories, 'forked_from'),
+                    actual_issues=count_subquery(Issues, 'repo', cls.OPEN_ISSUES),
+                    actual_pulls=count_subquery(PullRequests, 'repo', cls.OPEN_PULL_REQUESTS),
+                )
+                .values_list('pk', 'stars_count', 'forks_count', 'open_issues_count',
+                             'actual_forks', 'actual_issues', 'actual_pulls')
+                [:chunk_size]
+            )
+            if not rows:
+                break
+
+            drifted = [
+                Repositories(pk=pk, stars_count=stars or 0, forks_count=forks_actual,
+                             open_issues_count=issues_actual + pulls_actual)
+                for pk, stars, forks, issues, forks_actual, issues_actual, pulls_actual in rows
+                if stars is None or forks != forks_actual or issues != issues_actual + pulls_actual
+            ]
+            if drifted and not dry_run:
+                with transaction.atomic():
+                    Repositories.objects.bulk_update(
+                        drifted, ['stars_count', 'forks_count', 'open_issues_count'], batch_size=500
+                    )
+                    transaction.on_commit(RepositoryListCache.invalidate)
+
+            checked += len(rows)
+            fixed += len(drifted)
+            last_pk = rows[-1][0]
+            if len(rows) < chunk_size:
+                break
+
+        logger.info(f"Repository counters reconciled: {fixed}/{checked} repos fixed" + (" (dry run)" if dry_run else ""))
+        return {'checked': checked, 'fixed': fixed}
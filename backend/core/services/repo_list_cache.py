@@ -0,0 +1,57 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+
+
+class RepositoryListCache:
+    """
+    Кеш страниц списка публичных репозиториев (в Redis через кеш Django).
+
+    Ключ страницы содержит номер версии списка: любое изменение репозитория,
+    его счетчиков или владельца увеличивает версию (INCR одного ключа), и все
+    старые страницы становятся недостижимы сразу, без поиска и удаления по маске.
+    Осиротевшие страницы доживают свой TTL (CORE_REPO_LIST_CACHE_TTL).
+    """
+
+    VERSION_KEY = 'core:repos:public:version'
+    PAGE_KEY = 'core:repos:public:v{version}:{digest}'
+
+    @staticmethod
+    def ttl():
+        return getattr(settings, 'CORE_REPO_LIST_CACHE_TTL', 300)
+
+    @classmethod
+    def version(cls):
+        version = cache.get(cls.VERSION_KEY)
+        if version is None:
+            cache.add(cls.VERSION_KEY, 1, timeout=None)
+            version = cache.get(cls.VERSION_KEY, 1)
+        return version
+
+    @classmethod
+    def invalidate(cls):
+        try:
+            cache.incr(cls.VERSION_KEY)
+        except ValueError:
+            # Версии еще нет - и закешированных страниц тоже
+            cache.add(cls.VERSION_KEY, 1, timeout=None)
+
+    @classmethod
+    def page_key(cls, request):
+        # Полный URL: страница, размер и хост попадают в ссылки next/previous ответа
+        digest = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        return cls.PAGE_KEY.format(version=cls.version(), digest=digest)
+
+    @classmethod
+    def get(cls, request):
+        """
+        Returns: (ключ, данные или None). Промах сохраняется по тому же ключу:
+        если версия выросла, пока страница читалась из БД, устаревшие данные
+        лягут под старую версию и не будут отданы.
+        """
+        key = cls.page_key(request)
+        return key, cache.get(key)
+
+    @classmethod
+    def set(cls, key, data):
+        cache.set(key, data, timeout=cls.ttl())
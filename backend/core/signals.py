@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .models import Issues, PullRequests, Repositories, Users
+from .services.repo_counters import RepositoryCounters
+from .services.repo_list_cache import RepositoryListCache
+
+
+def _stored(instance):
+    """Строка в БД до сохранения (None для новой): от нее считается переход счетчиков"""
+    if instance._state.adding or instance.pk is None:
+        return None
+    return type(instance).objects.filter(pk=instance.pk).first()
+
+
+def _open_state(instance):
+    return None if instance is None else (instance.repo_id, RepositoryCounters.is_open(instance))
+
+
+def _fork_state(instance):
+    return None if instance is None or instance.forked_from_id is None else (instance.forked_from_id, True)
+
+
+@receiver(pre_save, sender=Issues)
+@receiver(pre_save, sender=PullRequests)
+def remember_open_state(sender, instance, **kwargs):
+    instance._open_state_before = _open_state(_stored(instance))
+
+
+@receiver(post_save, sender=Issues)
+@receiver(post_save, sender=PullRequests)
+def update_open_issues_on_save(sender, instance, **kwargs):
+    """Открытие, закрытие, мерж или перенос в другой репозиторий сдвигают open_issues_count"""
+    RepositoryCounters.apply_transition(
+        'open_issues_count', getattr(instance, '_open_state_before', None), _open_state(instance)
+    )
+
+
+@receiver(post_delete, sender=Issues)
+@receiver(post_delete, sender=PullRequests)
+def update_open_issues_on_delete(sender, instance, **kwargs):
+    RepositoryCounters.apply_transition('open_issues_count', _open_state(instance), None)
+
+
+@receiver(pre_save, sender=Repositories)
+def remember_fork_state(sender, instance, **kwargs):
+    instance._fork_state_before = _fork_state(_stored(instance))
+
+
+@receiver(post_save, sender=Repositories)
+def update_forks_on_save(sender, instance, **kwargs):
+    """forks_count оригинала; любое изменение репозитория сбрасывает кеш списка"""
+    RepositoryCounters.apply_transition(
+        'forks_count', getattr(instance, '_fork_state_before', None), _fork_state(instance)
+    )
+    transaction.on_commit(RepositoryListCache.invalidate)
+
+
+@receiver(post_delete, sender=Repositories)
+def update_forks_on_delete(sender, instance, **kwargs):
+    RepositoryCounters.apply_transition('forks_count', _fork_state(instance), None)
+    transaction.on_commit(RepositoryListCache.invalidate)
+
+
+@receiver(post_save, sender=Users)
+def invalidate_repo_list_on_owner_save(sender, instance, **kwargs):
+    """В списке репозиториев вложен владелец (username, avatar_url)"""
+    transaction.on_commit(RepositoryListCache.invalidate)
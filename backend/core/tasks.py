@@ -0,0 +1,47 @@
+from celery import shared_task
+from django.conf import settings
+from django.db import OperationalError
+from .models import Repositories
+from .services.commit_ingest import CommitIngest, CommitIngestBusy
+from .services.git_backend import GitBackendError
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, acks_late=True, max_retries=5, default_retry_delay=60)
+def ingest_repository_commits(self, repo_id, branches=None):
+    """
+    Загружает новые коммиты репозитория с диска в таблицу commits (CommitIngest).
+
+    acks_late: если воркер упал посреди загрузки, брокер отдаст задачу снова,
+    и она продолжит с checkpoint последней записанной пачки. Пока блокировка
+    репозитория занята (или не истекла после падения), задача откладывается, а не пропускается.
+
+    Args:
+        repo_id: ID репозитория
+        branches: список веток, по умолчанию все
+    """
+    try:
+        repository = Repositories.objects.get(pk=repo_id)
+    except Repositories.DoesNotExist:
+        logger.error(f"Repository {repo_id} not found")
+        return f"Error: Repository {repo_id} not found"
+
+    try:
+        stats = CommitIngest.ingest_repository(repository, branches=branches)
+    except CommitIngestBusy as e:
+        logger.info(f"Commit ingest for repo {repo_id} is busy, retrying: {e}")
+        raise self.retry(exc=e, countdown=getattr(settings, 'COMMIT_INGEST_BUSY_RETRY_DELAY', 60))
+    except (OperationalError, GitBackendError) as e:
+        logger.warning(f"Commit ingest for repo {repo_id} failed, retrying: {e}")
+        raise self.retry(exc=e)
+    except Exception as e:
+        logger.error(f"Error ingesting commits for repo {repo_id}: {str(e)}")
+        raise
+
+    logger.info(
+        f"Ingested {stats['inserted']}/{stats['scanned']} commits for repo {repo_id} "
+        f"in {stats['batches']} batches, {stats['elapsed_ms']}ms ({stats['commits_per_sec']} commits/s)"
+    )
+    return f"Success: {stats['inserted']} commits ingested"
@@ -0,0 +1,485 @@
+import io
+import os
+import subprocess
+import tempfile
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from celery.exceptions import Retry
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .models import Commits, Issues, Organizations, PullRequests, Repositories, Users
+from .services.commit_ingest import CommitIngest, CommitIngestBusy
+from .services.git_backend import GitBackend, GitBackendError, GitRepoReader
+from .services.git_utils import GitParser
+from .services.repo_counters import RepositoryCounters
+from .services.repo_list_cache import RepositoryListCache
+from .tasks import ingest_repository_commits
+from .views import RepositoryViewSet
+
+
+class TempGitRepo:
+    """Временный git-репозиторий на диске для тестов сервисов, читающих git"""
+
+    def __init__(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = self._dir.name
+        self.git('init', '-q', '-b', 'main')
+        self.git('config', 'user.name', 'Test')
+        self.git('config', 'user.email', 'test@example.com')
+
+    def git(self, *args):
+        return subprocess.run(['git', '-C', self.path, *args], capture_output=True, check=True).stdout
+
+    def write(self, name, content):
+        path = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content.encode() if isinstance(content, str) else content)
+
+    def stage(self, files):
+        for name, content in files.items():
+            self.write(name, content)
+        self.git('add', '-A')
+
+    def commit(self, files, message='commit'):
+        self.stage(files)
+        self.git('commit', '-q', '-m', message)
+        return self.git('rev-parse', 'HEAD').decode().strip()
+
+    def cleanup(self):
+        self._dir.cleanup()
+
+
+class CoreTestCase(TestCase):
+    """
+    Таблицы core неуправляемые (managed=False): миграции их не создают, поэтому
+    в тестовой базе они создаются здесь - до транзакции класса, один раз на прогон.
+    """
+
+    MODELS = (Users, Organizations, Repositories, Commits, Issues, PullRequests)
+
+    @classmethod
+    def setUpClass(cls):
+        existing = set(connection.introspection.table_names())
+        with connection.schema_editor() as editor:
+            for model in cls.MODELS:
+                if model._meta.db_table not in existing:
+                    editor.create_model(model)
+        super().setUpClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def make_user(self, username, **kwargs):
+        return Users.objects.create(
+            username=username, email=kwargs.pop('email', f'{username}@example.com'), password_hash='x', **kwargs
+        )
+
+    def make_repo(self, owner, name='repo', **kwargs):
+        return Repositories.objects.create(owner=owner, name=name, fs_path=kwargs.pop('fs_path', name), **kwargs)
+
+
+def numbered(count, prefix='line'):
+    return ''.join(f'{prefix} {i}\n' for i in range(count))
+
+
+class GitParserTests(SimpleTestCase):
+    def setUp(self):
+        self.repo = TempGitRepo()
+        self.addCleanup(self.repo.cleanup)
+
+    def diffs(self, **limits):
+        stats = {}
+        return {item['filename']: item for item in GitParser.iter_staged_diffs(self.repo.path, stats, **limits)}, stats
+
+    def skipped(self, stats):
+        return {item['filename']: item['reason'] for item in stats['skipped']}
+
+    def test_rename_is_reported_under_new_name(self):
+        self.repo.commit({'old.py': numbered(30)})
+        self.repo.git('mv', 'old.py', 'new.py')
+        self.repo.stage({'new.py': numbered(30) + 'added\n'})
+
+        diffs, stats = self.diffs()
+        self.assertEqual(list(diffs), ['new.py'])
+        self.assertIn('rename from old.py', diffs['new.py']['diff'])
+        self.assertIn('+added', diffs['new.py']['diff'])
+        self.assertEqual(stats['files_yielded'], 1)
+
+    def test_binary_lockfile_and_generated_files_are_skipped(self):
+        self.repo.stage({
+            'app.py': 'print("hi")\n',
+            'logo.png': b'\x89PNG\r\n\x1a\n\x00\x00binary',
+            'package-lock.json': '{"lockfileVersion": 3}\n',
+            'web/vendor/lib.js': 'var x = 1;\n',
+            'bundle.js': 'var a=1;' * 200 + '\n',
+            'schema_gen.py': '# @generated by protoc\nx = 1\n',
+        })
+
+        diffs, stats = self.diffs()
+        self.assertEqual(list(diffs), ['app.py'])
+        self.assertEqual(self.skipped(stats), {
+            'logo.png': 'binary',
+            'package-lock.json': 'generated',
+            'web/vendor/lib.js': 'generated',
+            'bundle.js': 'generated',
+            'schema_gen.py': 'generated',
+        })
+
+    def test_single_long_line_does_not_mark_file_generated(self):
+        self.repo.stage({
+            'fixtures.py': numbered(5) + 'DATA = "' + 'x' * 3000 + '"\n' + numbered(10, 'y'),
+            'app.min.css.txt': '/*! theme v1 */\n' + 'a{color:red}' * 200 + '\n',
+        })
+
+        diffs, stats = self.diffs()
+        self.assertEqual(list(diffs), ['fixtures.py'])
+        self.assertIn('x' * 3000, diffs['fixtures.py']['diff'])
+        self.assertEqual(self.skipped(stats), {'app.min.css.txt': 'generated'})
+        # Пропущенный файл не расходует общий бюджет
+        self.assertEqual(stats['bytes'], diffs['fixtures.py']['bytes'])
+
+    def test_file_over_budget_is_truncated(self):
+        self.repo.stage({'big.py': numbered(100), 'small.py': 'x = 1\n'})
+
+        diffs, stats = self.diffs(max_file_lines=20)
+        self.assertTrue(diffs['big.py']['truncated'])
+        self.assertEqual(diffs['big.py']['lines'], 20)
+        self.assertTrue(diffs['big.py']['diff'].endswith('... (Diff truncated)'))
+        self.assertFalse(diffs['small.py']['truncated'])
+        self.assertEqual((stats['truncated_files'], stats['stopped_early']), (1, False))
+
+    def test_total_budget_stops_reading(self):
+        self.repo.stage({f'f{i}.py': numbered(30) for i in range(5)})
+
+        diffs, stats = self.diffs(max_total_lines=70)
+        self.assertLess(len(diffs), 5)
+        self.assertLessEqual(stats['lines'], 70)
+        self.assertTrue(stats['stopped_early'])
+
+    def test_file_limit_skips_the_rest(self):
+        self.repo.stage({f'f{i}.py': 'x = 1\n' for i in range(3)})
+
+        diffs, stats = self.diffs(max_files=2)
+        self.assertEqual(len(diffs), 2)
+        self.assertEqual(list(self.skipped(stats).values()), ['file limit'])
+
+    def test_read_patches_keeps_long_line_out_of_memory(self):
+        long_line = b'+' + b'y' * 5000 + b'\n'
+        patch = (
+            b'diff --git a/a.txt b/a.txt\n--- a/a.txt\n+++ b/a.txt\n@@ -0,0 +1 @@\n' + b'+a\n' * 25 + long_line
+        )
+        stats = {'skipped': [], 'bytes': 0, 'lines': 0, 'truncated_files': 0, 'files_yielded': 0, 'stopped_early': False}
+
+        [item] = GitParser._read_patches(io.BytesIO(patch), [('a.txt', None)], stats, 1024, 1000, 10 ** 6, 10 ** 6)
+        self.assertTrue(item['truncated'])
+        self.assertLessEqual(item['bytes'], 1024)
+        self.assertNotIn('yyyy', item['diff'])
+
+
+class GitRepoReaderTests(SimpleTestCase):
+    def setUp(self):
+        self.repo = TempGitRepo()
+        self.addCleanup(self.repo.cleanup)
+        self.first = self.repo.commit({'README.md': 'hello\n', 'src/app.py': 'print(1)\n'}, message='init')
+        self.second = self.repo.commit({'src/app.py': 'print(2)\n'}, message='second\n\nbody')
+        self.reader = GitRepoReader(self.repo.path)
+        self.addCleanup(self.reader.close)
+
+    def test_blobs_by_revision_and_missing(self):
+        blobs = self.reader.blobs(['HEAD:src/app.py', f'{self.first}:src/app.py', 'HEAD:nope.txt', 'HEAD:src'])
+        self.assertEqual(blobs, {
+            'HEAD:src/app.py': b'print(2)\n',
+            f'{self.first}:src/app.py': b'print(1)\n',
+            'HEAD:nope.txt': None,
+            'HEAD:src': None,
+        })
+
+    def test_large_batch_does_not_block_on_pipes(self):
+        self.repo.commit({'big.bin': b'x' * 200_000})
+        name = 'HEAD:big.bin'
+        objects = self.reader.read_objects([name] * 50)
+        self.assertEqual({(kind, len(data)) for sha, kind, data in objects}, {('blob', 200_000)})
+
+    def test_trees_in_one_batch(self):
+        trees = self.reader.trees('HEAD', ['', 'src', 'missing'])
+        self.assertEqual([(e['path'], e['type']) for e in trees['']], [('README.md', 'blob'), ('src', 'tree')])
+        self.assertEqual([e['path'] for e in trees['src']], ['src/app.py'])
+        self.assertIsNone(trees['missing'])
+        self.assertEqual(self.reader.tree('HEAD', '/src/'), trees['src'])
+
+    def test_commits_history_and_incremental_range(self):
+        commits = list(self.reader.commits())
+        self.assertEqual([c['hash'] for c in commits], [self.second, self.first])
+        self.assertEqual(commits[0]['parents'], [self.first])
+        self.assertEqual(commits[0]['message'], 'second\n\nbody')
+        self.assertEqual(commits[0]['author_email'], 'test@example.com')
+
+        self.assertEqual([c['hash'] for c in self.reader.commits(since=self.first)], [self.second])
+        self.assertEqual([c['hash'] for c in self.reader.commits(reverse=True)], [self.first, self.second])
+        self.assertEqual([c['hash'] for c in self.reader.commits(max_count=1, skip=1)], [self.first])
+
+    def test_branches_and_errors(self):
+        self.repo.git('branch', 'feature', self.first)
+        self.assertEqual(self.reader.branches(), {'main': self.second, 'feature': self.first})
+
+        with self.assertRaises(GitBackendError):
+            list(self.reader.commits('no-such-branch'))
+        with self.assertRaises(GitBackendError):
+            GitRepoReader(self.repo.path + '-missing').blobs(['HEAD:README.md'])
+
+    @override_settings(GIT_BACKEND_WORKERS=1)
+    def test_fan_out_isolates_failing_repositories(self):
+        self.addCleanup(GitBackend.shutdown)
+        missing = self.repo.path + '-missing'
+        with self.assertLogs('core.services.git_backend', 'WARNING'):
+            results = GitBackend.fan_out('branches', [self.repo.path, missing])
+        self.assertEqual(results, {self.repo.path: {'main': self.second}, missing: None})
+
+
+class CommitIngestTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.git = TempGitRepo()
+        self.addCleanup(self.git.cleanup)
+        self.addCleanup(GitBackend.shutdown)
+        self.hashes = [self.git.commit({'file.txt': f'v{i}\n'}, message=f'c{i}') for i in range(3)]
+        self.author = self.make_user('test', email='test@example.com')
+        # Абсолютный fs_path: os.path.join отбрасывает GIT_DATA_ROOT
+        self.repository = self.make_repo(self.author, fs_path=self.git.path, default_branch='main')
+
+    def ingest(self, **kwargs):
+        return CommitIngest.ingest_repository(self.repository, batch_size=2, **kwargs)
+
+    def rows(self):
+        return list(Commits.objects.filter(repo=self.repository).order_by('committed_at', 'id')
+                    .values_list('hash', 'branch', 'author_id'))
+
+    def test_first_run_loads_history_oldest_first(self):
+        stats = self.ingest()
+        self.assertEqual((stats['scanned'], stats['inserted'], stats['batches']), (3, 3, 2))
+        self.assertEqual(stats['branches'], {'main': 3})
+        self.assertEqual(self.rows(), [(sha, 'main', self.author.pk) for sha in self.hashes])
+
+    def test_rerun_and_reset_insert_nothing(self):
+        self.ingest()
+        # Checkpoint берется из commits и переживает сброс кеша
+        cache.clear()
+        stats = self.ingest()
+        self.assertEqual((stats['scanned'], stats['inserted']), (0, 0))
+        self.assertEqual(CommitIngest.checkpoint(self.repository.pk, 'main'), self.hashes[-1])
+
+        stats = self.ingest(reset=True)
+        self.assertEqual((stats['scanned'], stats['inserted']), (3, 0))
+        self.assertEqual(len(self.rows()), 3)
+
+    def test_new_commits_and_branches_are_incremental(self):
+        self.ingest()
+        newer = self.git.commit({'file.txt': 'v3\n'})
+        self.git.git('branch', 'feature', self.hashes[0])
+
+        stats = self.ingest()
+        # Ветка feature новая: ее история пишется своими строками
+        self.assertEqual((stats['scanned'], stats['inserted']), (2, 2))
+        self.assertEqual(stats['branches'], {'main': 1, 'feature': 1})
+        self.assertIn((newer, 'main', self.author.pk), self.rows())
+
+    def test_busy_lock_is_retried_not_skipped(self):
+        token = CommitIngest.acquire(self.repository.pk)
+        with self.assertRaises(CommitIngestBusy):
+            self.ingest()
+
+        with mock.patch.object(ingest_repository_commits, 'retry', side_effect=Retry()) as retry:
+            with self.assertRaises(Retry):
+                ingest_repository_commits(self.repository.pk)
+        self.assertEqual(retry.call_args.kwargs['countdown'], 60)
+
+        # Чужой токен блокировку не снимает, свой - снимает
+        CommitIngest.release(self.repository.pk, 'stale')
+        with self.assertRaises(CommitIngestBusy):
+            self.ingest()
+        CommitIngest.release(self.repository.pk, token)
+        self.assertEqual(self.ingest()['inserted'], 3)
+
+    def test_lost_lock_stops_ingest_after_batch(self):
+        with mock.patch.object(CommitIngest, 'refresh', side_effect=CommitIngestBusy('lost')):
+            with self.assertRaises(CommitIngestBusy):
+                self.ingest()
+        # Первая пачка записана и отмечена в checkpoint, остальное догрузит следующий запуск
+        self.assertEqual(len(self.rows()), 2)
+        self.assertEqual(self.ingest()['inserted'], 1)
+
+
+class CommitHistoryApiTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        owner = self.make_user('owner')
+        self.repository = self.make_repo(owner, is_public=True, default_branch='main')
+        self.private = self.make_repo(owner, name='secret', is_public=False, default_branch='main')
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        # Пары коммитов с одинаковым временем: курсор должен различать их по id
+        self.commits = [
+            Commits.objects.create(repo=self.repository, hash=f'{i:040x}', message=f'c{i}', branch=branch,
+                                   committed_at=start + timedelta(minutes=i // 2))
+            for i in range(7) for branch in ('main', 'feature/x')
+        ]
+
+    def walk(self, url):
+        """Все страницы по ссылкам next; Returns: (хеши, число страниц)"""
+        hashes, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            hashes += [item['hash'] for item in response.data['results']]
+            url, pages = response.data['next'], pages + 1
+        return hashes, pages
+
+    def expected(self, branch):
+        rows = sorted((c for c in self.commits if c.branch == branch), key=lambda c: (c.committed_at, c.pk), reverse=True)
+        return [c.hash for c in rows]
+
+    def test_cursor_pages_cover_history_once(self):
+        hashes, pages = self.walk(f'/api/repos/{self.repository.pk}/commits/?page_size=3')
+        self.assertEqual(hashes, self.expected('main'))
+        self.assertEqual(pages, 3)
+
+    def test_branch_with_slash_in_path(self):
+        hashes, _ = self.walk(f'/api/repos/{self.repository.pk}/branches/feature/x/commits/?page_size=4')
+        self.assertEqual(hashes, self.expected('feature/x'))
+        hashes, _ = self.walk(f'/api/repos/{self.repository.pk}/commits/?branch=feature/x')
+        self.assertEqual(hashes, self.expected('feature/x'))
+
+    def test_private_repository_is_404_for_anonymous(self):
+        for url in (f'/api/repos/{self.private.pk}/commits/', f'/api/repos/{self.private.pk}/branches/main/commits/'):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.force_authenticate(User.objects.create_user(username='member'))
+        self.assertEqual(self.client.get(f'/api/repos/{self.private.pk}/commits/').status_code, 200)
+
+    def test_page_numbers_are_ignored(self):
+        response = self.client.get(f'/api/repos/{self.repository.pk}/commits/?page=2&page_size=3')
+        self.assertEqual([item['hash'] for item in response.data['results']], self.expected('main')[:3])
+
+
+class RepositoryCountersTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = self.make_user('owner')
+        self.repo = self.make_repo(self.owner, name='origin')
+        self.other = self.make_repo(self.owner, name='other')
+
+    def counts(self, field):
+        return dict(Repositories.objects.values_list('name', field))
+
+    def test_issue_open_close_move_and_delete(self):
+        issue = Issues.objects.create(repo=self.repo, title='bug')
+        self.assertEqual(self.counts('open_issues_count'), {'origin': 1, 'other': None})
+
+        issue.is_closed = True
+        issue.save()
+        self.assertEqual(self.counts('open_issues_count')['origin'], 0)
+
+        issue.is_closed = False
+        issue.repo = self.other
+        issue.save()
+        self.assertEqual(self.counts('open_issues_count'), {'origin': 0, 'other': 1})
+
+        issue.delete()
+        self.assertEqual(self.counts('open_issues_count'), {'origin': 0, 'other': 0})
+
+    def test_pull_request_counts_until_merged(self):
+        pull = PullRequests.objects.create(repo=self.repo, title='fix', source_branch='fix', target_branch='main')
+        self.assertEqual(self.counts('open_issues_count')['origin'], 1)
+        pull.status, pull.is_merged = 'merged', True
+        pull.save()
+        self.assertEqual(self.counts('open_issues_count')['origin'], 0)
+
+    def test_fork_move_and_delete(self):
+        fork = self.make_repo(self.owner, name='fork', forked_from=self.repo)
+        self.assertEqual(self.counts('forks_count')['origin'], 1)
+
+        fork.forked_from = self.other
+        fork.save()
+        self.assertEqual((self.counts('forks_count')['origin'], self.counts('forks_count')['other']), (0, 1))
+
+        fork.delete()
+        self.assertEqual(self.counts('forks_count')['other'], 0)
+
+    def test_reconcile_repairs_drift(self):
+        Issues.objects.create(repo=self.repo, title='bug')
+        self.make_repo(self.owner, name='fork', forked_from=self.repo)
+        Repositories.objects.filter(pk=self.repo.pk).update(forks_count=7, open_issues_count=None)
+
+        self.assertEqual(RepositoryCounters.reconcile(chunk_size=2), {'checked': 3, 'fixed': 3})
+        repo = Repositories.objects.get(pk=self.repo.pk)
+        self.assertEqual((repo.stars_count, repo.forks_count, repo.open_issues_count), (0, 1, 1))
+        self.assertEqual(RepositoryCounters.reconcile()['fixed'], 0)
+
+
+    def test_api_edit_keeps_counters(self):
+        get_object = RepositoryViewSet.get_object
+
+        def load_then_open_issue(view):
+            # Issue открыли между чтением репозитория и его сохранением
+            repository = get_object(view)
+            Issues.objects.create(repo=self.repo, title='bug')
+            return repository
+
+        with mock.patch.object(RepositoryViewSet, 'get_object', load_then_open_issue):
+            response = APIClient().patch(
+                f'/api/repos/{self.repo.pk}/',
+                {'description': 'edited', 'stars_count': 999, 'forks_count': 999, 'open_issues_count': 77},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        repo = Repositories.objects.get(pk=self.repo.pk)
+        self.assertEqual(
+            (repo.description, repo.stars_count, repo.forks_count, repo.open_issues_count), ('edited', None, None, 1)
+        )
+
+
+class RepositoryListCacheTests(CoreTestCase):
+    url = '/api/repos/public/'
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.owner = self.make_user('owner')
+        self.repo = self.make_repo(self.owner, name='visible', is_public=True)
+
+    def names(self):
+        return [item['name'] for item in self.client.get(self.url).data['results']]
+
+    def test_pages_are_served_from_cache(self):
+        self.assertEqual(self.names(), ['visible'])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.names(), ['visible'])
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_changes_bump_the_version(self):
+        self.names()
+        changes = (
+            lambda: self.make_repo(self.owner, name='added', is_public=True),
+            lambda: Repositories.objects.filter(name='added').first().delete(),
+            lambda: Users.objects.filter(pk=self.owner.pk).first().save(),
+            lambda: RepositoryCounters.add(self.repo.pk, open_issues_count=1),
+        )
+        for change in changes:
+            version = RepositoryListCache.version()
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertGreater(RepositoryListCache.version(), version)
+
+        self.assertEqual(self.names(), ['visible'])
+        self.assertEqual(self.client.get(self.url).data['results'][0]['open_issues_count'], 1)
+
+    def test_invalidate_without_version(self):
+        RepositoryListCache.invalidate()
+        self.assertEqual(RepositoryListCache.version(), 1)
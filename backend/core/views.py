@@ -1,10 +1,15 @@
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from dj_rest_auth.views import LoginView
 from .models import Repositories, Commits
+from .pagination import CommitHistoryPagination
 from .serializers import RepositorySerializer, CommitSerializer
+from .services.commit_history import CommitHistory
+from .services.repo_list_cache import RepositoryListCache
 from .services.n8n_client import N8nClient
 
 # === CUSTOM AUTH VIEWS (Hardening) ===
@@ -22,16 +27,53 @@ class RepositoryViewSet(viewsets.ModelViewSet):
     Управление репозиториями пользователя.
     """
     permission_classes = [AllowAny] # Позже лучше сменить на IsAuthenticatedOrReadOnly
-    queryset = Repositories.objects.all().order_by('-created_at')
+    # Владелец вкладывается в ответ (UserSerializer) - JOIN вместо запроса на строку
+    queryset = Repositories.objects.select_related('owner').order_by('-created_at')
     serializer_class = RepositorySerializer
 
+    @action(detail=False, methods=['get'])
+    def public(self, request):
+        """
+        Список публичных репозиториев. Страницы кешируются целиком (RepositoryListCache)
+        до любого изменения репозиториев, их счетчиков или владельцев.
+        """
+        key, data = RepositoryListCache.get(request)
+        if data is None:
+            page = self.paginate_queryset(self.get_queryset().filter(is_public=True))
+            data = self.get_paginated_response(self.get_serializer(page, many=True).data).data
+            RepositoryListCache.set(key, data)
+        return Response(data)
+
+    @action(detail=True, methods=['get'])
+    def commits(self, request, pk=None):
+        """История ветки репозитория: ?branch=, по умолчанию default_branch"""
+        repository = self.get_object()
+        return self.commit_history(request, repository, request.query_params.get('branch') or repository.default_branch)
+
+    @action(detail=True, methods=['get'], url_path=r'branches/(?P<branch>.+)/commits')
+    def branch_commits(self, request, pk=None, branch=None):
+        """История ветки: /repos/{id}/branches/{branch}/commits/ (имя ветки может содержать /)"""
+        return self.commit_history(request, self.get_object(), branch)
+
+    def commit_history(self, request, repository, branch):
+        """Курсорная страница по (committed_at, id) - диапазон индекса (repo_id, branch, committed_at, id)"""
+        if not repository.is_public and not request.user.is_authenticated:
+            raise NotFound()
+        paginator = CommitHistoryPagination()
+        page = paginator.paginate_queryset(CommitHistory.for_repo(repository.pk, branch), request, view=self)
+        return paginator.get_paginated_response(CommitSerializer(page, many=True).data)
+
 class CommitViewSet(viewsets.ModelViewSet):
     """
     Управление коммитами.
+    Список - курсорная пагинация по (committed_at, id), ?repo= и ?branch= сужают
+    его до диапазона индекса истории.
     """
     permission_classes = [IsAuthenticated]
-    queryset = Commits.objects.all().order_by('-committed_at')
+    queryset = Commits.objects.all().order_by('-committed_at', '-id')
     serializer_class = CommitSerializer
+    pagination_class = CommitHistoryPagination
+    filterset_fields = ['repo', 'branch']
 
 # === AI TOOLS ENDPOINTS (Proxy to n8n) ===
 
@@ -0,0 +1,36 @@
+from rest_framework import filters
+
+from .services.code_search import CodeSearch
+from .services.search import PostSearch
+
+
+class PostSearchFilter(filters.SearchFilter):
+    """
+    ?search= для постов: полнотекстовый поиск с ранжированием на Postgres,
+    ILIKE по search_fields на остальных СУБД (см. PostSearch).
+    Явный ?ordering= по-прежнему перекрывает сортировку по релевантности.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        return PostSearch.search(queryset, text)
+
+
+class CodeSearchFilter(filters.BaseFilterBackend):
+    """
+    ?code= - поиск фрагмента кода в code_snippet с ранжированием по сходству триграмм
+    (см. CodeSearch). Явный ?ordering= перекрывает сортировку по рангу.
+    """
+    code_param = 'code'
+
+    def filter_queryset(self, request, queryset, view):
+        return CodeSearch.search(queryset, request.query_params.get(self.code_param, ''))
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.code_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Фрагмент кода для поиска в code_snippet',
+            'schema': {'type': 'string'},
+        }]
@@ -0,0 +1,98 @@
+import random
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from forum.models import ForumPost
+from forum.services.facets import PostFacets
+from forum.services.code_search import CodeSearch, CodeTrigramIndex
+
+SNIPPETS = (
+    'useEffect(() => {{ fetch{name}(); }}, [{name}]);',
+    'const [{name}, set{name}] = useState(null);',
+    'result = np.einsum("ij,jk->ik", {name}, weights)',
+    'df.groupby("{name}").agg({{"value": "sum"}})',
+    'async def {name}(request):\n    return await service.{name}()',
+    'SELECT * FROM {name} WHERE id = $1 FOR UPDATE;',
+    'git rebase -i HEAD~{num} && git push --force-with-lease',
+    'for (let i = 0; i < {name}.length; i++) {{ console.log({name}[i]); }}',
+    'fn {name}(&self) -> Result<(), Error> {{ Ok(()) }}',
+)
+
+
+class Command(BaseCommand):
+    help = "Сравнивает поиск по коду: ILIKE, pg_trgm (на Postgres) и триграммный индекс в памяти"
+
+    BENCH_USER = 'code_search_bench'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000, help="Сколько постов сгенерировать")
+        parser.add_argument('--repeat', type=int, default=20, help="Повторов на каждый запрос")
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--query', action='append', dest='queries',
+                            help="Фрагмент кода (можно несколько раз)")
+        parser.add_argument('--keep', action='store_true', help="Не удалять сгенерированные посты")
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or ['useEffect(', 'np.einsum', 'FOR UPDATE', 'force-with-lease']
+        user, created = User.objects.get_or_create(username=self.BENCH_USER)
+        try:
+            self.seed(user, options['posts'])
+
+            started = time.perf_counter()
+            CodeTrigramIndex.build()
+            self.stdout.write(f"In-memory trigram index built in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+            paths = [
+                ('ilike', lambda qs, text: qs.filter(code_snippet__icontains=text)),
+                ('py-index', CodeSearch.python_index),
+            ]
+            if CodeSearch.is_trigram_available():
+                paths.append(('pg_trgm', CodeSearch.trigram))
+            else:
+                self.stdout.write(self.style.WARNING("Not PostgreSQL: pg_trgm path is skipped"))
+
+            base = ForumPost.objects.select_related('author').order_by('-created_at')
+            for text in queries:
+                for name, search in paths:
+                    timings = []
+                    for _ in range(options['repeat']):
+                        started = time.perf_counter()
+                        list(search(base, text)[:options['page_size']])
+                        timings.append((time.perf_counter() - started) * 1000)
+                    timings.sort()
+                    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                    self.stdout.write(
+                        f"{text!r:22} {name:9} p50={statistics.median(timings):8.2f}ms p95={p95:8.2f}ms"
+                    )
+        finally:
+            if not options['keep']:
+                # Посты удаляются каскадом вместе с пользователем
+                if created:
+                    user.delete()
+                else:
+                    ForumPost.objects.filter(author=user).delete()
+                # Сигналы удаления вычитают посты из фасетов, а учтены ли они, зависит от того,
+                # где оборвался seed - сверяем с таблицей заново
+                PostFacets.rebuild()
+            CodeTrigramIndex.reset()
+
+    def seed(self, user, total):
+        rng = random.Random(42)
+        existing = ForumPost.objects.filter(author=user).count()
+        batch = []
+        for i in range(existing, total):
+            name = f'item{rng.randint(0, 5000)}'
+            code = '\n'.join(
+                template.format(name=name, num=rng.randint(1, 9)) for template in rng.sample(SNIPPETS, 3)
+            )
+            batch.append(ForumPost(author=user, title=f'Snippet {i}', description='bench', code_snippet=code))
+            if len(batch) >= 1000:
+                ForumPost.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            ForumPost.objects.bulk_create(batch)
+        # bulk_create не шлет сигналов - счетчики фасетов не знают о новых постах
+        PostFacets.rebuild()
+        self.stdout.write(f"Seeded {max(total - existing, 0)} posts ({total} total for the benchmark)")
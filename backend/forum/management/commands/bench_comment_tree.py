@@ -0,0 +1,75 @@
+import random
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+from forum.models import ForumComment, ForumPost
+from forum.services.comment_tree import CommentTree
+
+
+class Command(BaseCommand):
+    help = "Замеряет сборку дерева комментариев (рекурсивный CTE) против обхода replies по уровням"
+
+    BENCH_USER = 'comment_tree_bench'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, default=5000, help="Комментариев в обсуждении")
+        parser.add_argument('--roots', type=int, default=200, help="Веток верхнего уровня")
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--page-size', type=int, default=20, help="Веток на страницу")
+        parser.add_argument('--depth', type=int, default=None)
+
+    def handle(self, *args, **options):
+        user, created = User.objects.get_or_create(username=self.BENCH_USER)
+        post = ForumPost.objects.create(author=user, title='Comment tree bench', description='bench')
+        try:
+            self.seed(post, user, options['comments'], options['roots'])
+            depth = CommentTree.clamp_depth(options['depth'])
+            all_roots = list(CommentTree.roots(post.pk).order_by('created_at', 'pk').values_list('pk', flat=True))
+
+            for label, root_ids in (('page', all_roots[:options['page_size']]), ('whole', all_roots)):
+                for name, build in (('cte', CommentTree.build), ('per-level', self.build_per_level)):
+                    timings = []
+                    for _ in range(options['repeat']):
+                        with CaptureQueriesContext(connection) as ctx:
+                            started = time.perf_counter()
+                            build(root_ids, depth)
+                            timings.append((time.perf_counter() - started) * 1000)
+                    self.stdout.write(
+                        f"{label:5} {name:9} roots={len(root_ids):4} queries={len(ctx.captured_queries):3} "
+                        f"p50={statistics.median(timings):8.2f}ms max={max(timings):8.2f}ms"
+                    )
+                    reset_queries()
+        finally:
+            # Комментарии удаляются каскадом вместе с постом
+            post.delete()
+            if created:
+                user.delete()
+
+    @staticmethod
+    def build_per_level(root_ids, depth):
+        """Как собирает дерево клиент без CTE: запрос на каждый уровень вложенности"""
+        level = list(ForumComment.objects.filter(pk__in=root_ids).select_related('author'))
+        for _ in range(depth):
+            if not level:
+                break
+            level = list(ForumComment.objects.filter(parent__in=level).select_related('author'))
+
+    def seed(self, post, user, total, roots):
+        rng = random.Random(42)
+        ids = [c.pk for c in ForumComment.objects.bulk_create(
+            [ForumComment(post=post, author=user, content=f'root {i}') for i in range(roots)]
+        )]
+        created = len(ids)
+        while created < total:
+            batch = []
+            for _ in range(min(1000, total - created)):
+                # Свежие комментарии чаще получают ответы - ветки становятся глубокими
+                parent = ids[min(len(ids) - 1, int(len(ids) * rng.random() ** 0.3))]
+                batch.append(ForumComment(post=post, author=user, content='reply', parent_id=parent))
+            ids.extend(c.pk for c in ForumComment.objects.bulk_create(batch))
+            created += len(batch)
+        self.stdout.write(f"Seeded {created} comments in {roots} threads")
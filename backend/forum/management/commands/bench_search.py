@@ -0,0 +1,86 @@
+import random
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from forum.models import ForumPost
+from forum.services.facets import PostFacets
+from forum.services.search import PostSearch
+
+WORDS = (
+    'python django react hooks async await celery redis postgres index query cursor '
+    'migration docker nginx deploy token auth session cache queue worker thread '
+    'memory leak deadlock timeout retry webhook commit branch merge rebase diff '
+    'ошибка запрос индекс кеш поток очередь память сервер клиент'
+).split()
+
+
+class Command(BaseCommand):
+    help = "Сравнивает задержку полнотекстового поиска и ILIKE на сгенерированных постах"
+
+    BENCH_USER = 'search_bench'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000, help="Сколько постов сгенерировать")
+        parser.add_argument('--repeat', type=int, default=20, help="Повторов на каждый запрос")
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--query', action='append', dest='queries',
+                            help="Поисковый запрос (можно несколько раз)")
+        parser.add_argument('--keep', action='store_true', help="Не удалять сгенерированные посты")
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or ['deadlock', 'redis cache', 'celery retry timeout', 'индекс']
+        user, created = User.objects.get_or_create(username=self.BENCH_USER)
+        try:
+            self.seed(user, options['posts'])
+            paths = [('ilike', lambda qs, text: PostSearch.ilike(qs, text.split()))]
+            if PostSearch.is_full_text_available():
+                paths.append(('full-text', PostSearch.full_text))
+            else:
+                self.stdout.write(self.style.WARNING("Not PostgreSQL: only the ILIKE path is measured"))
+
+            base = ForumPost.objects.select_related('author').order_by('-created_at')
+            for text in queries:
+                for name, search in paths:
+                    timings = []
+                    for _ in range(options['repeat']):
+                        started = time.perf_counter()
+                        list(search(base, text)[:options['page_size']])
+                        timings.append((time.perf_counter() - started) * 1000)
+                    timings.sort()
+                    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                    self.stdout.write(
+                        f"{text!r:28} {name:10} p50={statistics.median(timings):8.2f}ms p95={p95:8.2f}ms"
+                    )
+        finally:
+            if not options['keep']:
+                # Посты удаляются каскадом вместе с пользователем
+                if created:
+                    user.delete()
+                else:
+                    ForumPost.objects.filter(author=user).delete()
+                # Сигналы удаления вычитают посты из фасетов, а учтены ли они, зависит от того,
+                # где оборвался seed - сверяем с таблицей заново
+                PostFacets.rebuild()
+
+    def seed(self, user, total):
+        rng = random.Random(42)
+        existing = ForumPost.objects.filter(author=user).count()
+        batch = []
+        for _ in range(existing, total):
+            batch.append(ForumPost(
+                author=user,
+                title=' '.join(rng.choices(WORDS, k=6)),
+                description=' '.join(rng.choices(WORDS, k=60)),
+                code_snippet=' '.join(rng.choices(WORDS, k=20)),
+                language=rng.choice(['Python', 'JavaScript', 'Go']),
+            ))
+            if len(batch) >= 1000:
+                ForumPost.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            ForumPost.objects.bulk_create(batch)
+        # bulk_create не шлет сигналов - счетчики фасетов не знают о новых постах
+        PostFacets.rebuild()
+        self.stdout.write(f"Seeded {max(total - existing, 0)} posts ({total} total for the benchmark)")
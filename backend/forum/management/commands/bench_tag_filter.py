@@ -0,0 +1,94 @@
+import random
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from taggit.models import Tag
+
+from forum.models import ForumPost
+from forum.services.facets import PostFacets
+from forum.services.tag_filter import TagFilter
+
+TAGS = [
+    'python', 'django', 'react', 'hooks', 'typescript', 'postgres', 'redis', 'celery',
+    'docker', 'nginx', 'git', 'rust', 'go', 'async', 'testing', 'performance',
+]
+
+
+class Command(BaseCommand):
+    help = "Сравнивает фильтр по 1-8 тегам: JOIN на каждый тег против одного GROUP BY/HAVING"
+
+    BENCH_USER = 'tag_filter_bench'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000, help="Сколько постов сгенерировать")
+        parser.add_argument('--tags-per-post', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=20, help="Повторов на каждый замер")
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--keep', action='store_true', help="Не удалять сгенерированные посты")
+
+    def handle(self, *args, **options):
+        user, created = User.objects.get_or_create(username=self.BENCH_USER)
+        try:
+            self.seed(user, options['posts'], options['tags_per_post'])
+            base = ForumPost.objects.select_related('author').order_by('-created_at')
+
+            def chained(qs, names):
+                # Прежняя реализация: отдельный JOIN через TaggedItem на каждый тег
+                for name in names:
+                    qs = qs.filter(tags__name__in=[name])
+                return qs
+
+            paths = [
+                ('join-per-tag', chained),
+                ('having (all)', lambda qs, names: TagFilter.apply(qs, names, TagFilter.ALL)),
+                ('any', lambda qs, names: TagFilter.apply(qs, names, TagFilter.ANY)),
+            ]
+            for count in range(1, 9):
+                names = TAGS[:count]
+                for name, apply in paths:
+                    timings = []
+                    for _ in range(options['repeat']):
+                        started = time.perf_counter()
+                        list(apply(base, names)[:options['page_size']])
+                        timings.append((time.perf_counter() - started) * 1000)
+                    timings.sort()
+                    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                    self.stdout.write(
+                        f"{count} tags {name:13} p50={statistics.median(timings):8.2f}ms p95={p95:8.2f}ms"
+                    )
+        finally:
+            if not options['keep']:
+                # Посты и их TaggedItem удаляются каскадом вместе с пользователем
+                if created:
+                    user.delete()
+                else:
+                    ForumPost.objects.filter(author=user).delete()
+                # Сигналы удаления вычитают посты из фасетов, а учтены ли они, зависит от того,
+                # где оборвался seed - сверяем с таблицей заново
+                PostFacets.rebuild()
+
+    def seed(self, user, total, tags_per_post):
+        existing = ForumPost.objects.filter(author=user).count()
+        if existing >= total:
+            return
+        rng = random.Random(42)
+        tags = {tag.name: tag for tag in Tag.objects.filter(name__in=TAGS)}
+        tags.update({tag.name: tag for tag in Tag.objects.bulk_create(
+            [Tag(name=name, slug=name) for name in TAGS if name not in tags]
+        )})
+        through = ForumPost.tags.through
+        for start in range(existing, total, 1000):
+            posts = ForumPost.objects.bulk_create([
+                ForumPost(author=user, title=f'Tagged {i}', description='bench')
+                for i in range(start, min(start + 1000, total))
+            ])
+            # Первые теги популярнее: пересечения из 1-8 тегов получаются разной плотности
+            through.objects.bulk_create([
+                through(content_object=post, tag=tags[name])
+                for post in posts
+                for name in set(rng.choices(TAGS, weights=range(len(TAGS), 0, -1), k=tags_per_post))
+            ])
+        # bulk_create не шлет сигналов - счетчики фасетов не знают о новых постах
+        PostFacets.rebuild()
+        self.stdout.write(f"Seeded {total - existing} posts ({total} total for the benchmark)")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from forum.services.notification_retention import NotificationArchivePartitions
+
+
+class Command(BaseCommand):
+    help = "Postgres: разбивает архив уведомлений на месячные партиции и поддерживает их"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=None, help="Сколько месяцев вперед создать партиции")
+        parser.add_argument('--drop-older-than', type=int, default=None, help="Удалить партиции старше N месяцев")
+
+    def handle(self, *args, **options):
+        if not NotificationArchivePartitions.supported():
+            self.stdout.write(self.style.WARNING("Partitioning needs PostgreSQL, nothing to do"))
+            return
+
+        if NotificationArchivePartitions.convert():
+            self.stdout.write(f"Converted {NotificationArchivePartitions.table()} to a partitioned table")
+        created = NotificationArchivePartitions.ensure(options['months_ahead'])
+        self.stdout.write(f"Partitions up to date: {', '.join(created)}")
+
+        if options['drop_older_than'] is not None:
+            dropped = NotificationArchivePartitions.drop_older_than(options['drop_older_than'])
+            self.stdout.write(f"Dropped {len(dropped)} partitions: {', '.join(dropped) or '-'}")
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from forum.services.notification_retention import NotificationRetention
+
+
+class Command(BaseCommand):
+    help = "Переносит прочитанные уведомления старше срока хранения в архив (или удаляет) пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Срок хранения, по умолчанию FORUM_NOTIFICATIONS_RETENTION_DAYS")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--max-batches', type=int, default=None)
+        parser.add_argument('--pause', type=float, default=0.0, help="Пауза между пачками, секунды")
+        parser.add_argument('--no-archive', action='store_true', help="Удалять без копии в NotificationArchive")
+
+    def handle(self, *args, **options):
+        result = NotificationRetention.purge(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            archive=False if options['no_archive'] else None,
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {result['moved']} notifications in {result['batches']} batches, {result['elapsed_ms']}ms"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from forum.services.facets import PostFacets
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счетчики фасетов (языки и теги постов) с нуля"
+
+    def handle(self, *args, **options):
+        total = PostFacets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} facet counters"))
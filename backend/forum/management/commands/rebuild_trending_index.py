@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from forum.services.trending_index import TrendingIndex
+
+
+class Command(BaseCommand):
+    help = "Пересобирает ZSET-рейтинги трендов в Redis из БД (холодный старт)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        total = TrendingIndex.rebuild(chunk_size=options['chunk_size'])
+        if total is None:
+            raise CommandError("CACHES['default'] is not a Redis cache, trending index is unavailable")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} posts"))
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:49
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    """Заполняет счетчики по текущим данным одним UPDATE с подзапросами"""
+    ForumPost = apps.get_model('forum', 'ForumPost')
+    PostVote = apps.get_model('forum', 'PostVote')
+    ForumComment = apps.get_model('forum', 'ForumComment')
+
+    # Замороженная копия forum.services.counters.count_subquery: миграция не импортирует
+    # сервисы - они работают с текущими моделями, а не с историческими из apps
+    def count_of(model, **filters):
+        subquery = (
+            model.objects.filter(post=OuterRef('pk'), **filters)
+            .order_by()
+            .values('post')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+    ForumPost.objects.update(
+        likes_count=count_of(PostVote, vote_type='like'),
+        comments_count=count_of(ForumComment),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0004_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forumpost',
+            name='comments_count',
+            field=models.IntegerField(default=0, help_text='Количество комментариев'),
+        ),
+        migrations.AddField(
+            model_name='forumpost',
+            name='likes_count',
+            field=models.IntegerField(default=0, help_text='Количество лайков'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
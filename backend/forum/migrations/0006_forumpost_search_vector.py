@@ -0,0 +1,62 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:10
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Триггер, индекс и заполнение - только для Postgres; на SQLite колонка остается пустой,
+# а поиск работает через ILIKE (forum.services.search.PostSearch)
+CREATE_SQL = """
+CREATE OR REPLACE FUNCTION forum_forumpost_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(NEW.code_snippet, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS forum_forumpost_search_vector_trigger ON forum_forumpost;
+CREATE TRIGGER forum_forumpost_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, code_snippet ON forum_forumpost
+    FOR EACH ROW EXECUTE PROCEDURE forum_forumpost_search_vector_update();
+
+UPDATE forum_forumpost SET search_vector =
+    setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(description, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(code_snippet, '')), 'C');
+
+CREATE INDEX IF NOT EXISTS forum_forumpost_search_vector_gin ON forum_forumpost USING gin (search_vector);
+"""
+
+DROP_SQL = """
+DROP INDEX IF EXISTS forum_forumpost_search_vector_gin;
+DROP TRIGGER IF EXISTS forum_forumpost_search_vector_trigger ON forum_forumpost;
+DROP FUNCTION IF EXISTS forum_forumpost_search_vector_update();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0005_forumpost_likes_count_comments_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forumpost',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:40
+
+from django.db import migrations
+
+# GIN-индекс по триграммам code_snippet: ILIKE '%fragment%' и word_similarity без полного скана.
+# Только для Postgres; CREATE EXTENSION требует прав владельца БД
+CREATE_SQL = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS forum_forumpost_code_snippet_trgm
+    ON forum_forumpost USING gin (code_snippet gin_trgm_ops);
+"""
+
+DROP_SQL = "DROP INDEX IF EXISTS forum_forumpost_code_snippet_trgm;"
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SQL)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0006_forumpost_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
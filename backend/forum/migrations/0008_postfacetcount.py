@@ -0,0 +1,63 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def backfill_facets(apps, schema_editor):
+    """Начальные счетчики по текущим данным - тот же расчет, что в PostFacets.rebuild"""
+    ForumPost = apps.get_model('forum', 'ForumPost')
+    PostFacetCount = apps.get_model('forum', 'PostFacetCount')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    rows = [
+        PostFacetCount(facet='language', value=language, count=total)
+        for language, total in ForumPost.objects.order_by().values_list('language').annotate(total=Count('pk'))
+    ]
+    content_type = ContentType.objects.filter(app_label='forum', model='forumpost').first()
+    if content_type is not None:
+        tagged = TaggedItem.objects.filter(content_type=content_type).order_by()
+        rows.extend(
+            PostFacetCount(facet='tag', value=name, count=total)
+            for name, total in tagged.values_list('tag__name').annotate(total=Count('object_id'))
+        )
+        post_language = ForumPost.objects.filter(pk=OuterRef('object_id')).values('language')[:1]
+        by_scope = (
+            tagged.annotate(language=Subquery(post_language))
+            .values_list('language', 'tag__name')
+            .annotate(total=Count('object_id'))
+        )
+        rows.extend(
+            PostFacetCount(facet='tag', scope=language, value=name, count=total)
+            for language, name, total in by_scope
+            if language is not None
+        )
+    PostFacetCount.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0007_forumpost_code_snippet_trgm'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('language', 'Language'), ('tag', 'Tag')], max_length=20)),
+                ('scope', models.CharField(blank=True, default='', max_length=50)),
+                ('value', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['facet', 'scope', '-count'], name='forum_postf_facet_234b70_idx')],
+                'unique_together': {('facet', 'scope', 'value')},
+            },
+        ),
+        migrations.RunPython(backfill_facets, migrations.RunPython.noop),
+    ]
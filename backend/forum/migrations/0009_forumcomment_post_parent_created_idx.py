@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0008_postfacetcount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forumcomment',
+            index=models.Index(fields=['post', 'parent', 'created_at'], name='forum_forum_post_id_70fd0e_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.2 on 2026-10-18 20:30
+
+import django.db.models.deletion
+import forum.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0011_notification_retention'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentBlob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('content', models.TextField()),
+                ('size', models.IntegerField(default=0, help_text='Длина текста в символах')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='forumpost',
+            name='forked_from',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='forks', to='forum.forumpost'),
+        ),
+        # Колонки не меняются, только класс поля в Django - без пересборки таблицы на SQLite
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='forumpost',
+                    name='code_snippet',
+                    field=forum.models.SharedTextField(blank=True, blob_field='code_blob', help_text='Кусок кода для обсуждения', null=True),
+                ),
+                migrations.AlterField(
+                    model_name='forumpost',
+                    name='description',
+                    field=forum.models.SharedTextField(blob_field='description_blob', help_text='Описание вопроса или темы'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='forumpost',
+            name='code_blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='forum.contentblob'),
+        ),
+        migrations.AddField(
+            model_name='forumpost',
+            name='description_blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='forum.contentblob'),
+        ),
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=models.Index(fields=['forked_from', '-created_at'], name='forum_post_forked_from_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-19 09:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_current_actors(apps, schema_editor):
+    """Непрочитанным агрегатам - их последнего actor; остальных участников прошлых пачек не восстановить"""
+    Notification = apps.get_model('forum', 'Notification')
+    NotificationActor = apps.get_model('forum', 'NotificationActor')
+    rows = Notification.objects.filter(is_read=False).values_list('pk', 'actor_id').iterator(chunk_size=2000)
+    batch = []
+    for notification_id, actor_id in rows:
+        batch.append(NotificationActor(notification_id=notification_id, user_id=actor_id))
+        if len(batch) >= 2000:
+            NotificationActor.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    NotificationActor.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0012_forumpost_forks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actor_links', to='forum.notification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('notification', 'user')},
+            },
+        ),
+        migrations.RunPython(link_current_actors, migrations.RunPython.noop),
+    ]
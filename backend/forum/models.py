@@ -1,9 +1,95 @@
 from django.db import models
+from django.db.models.query_utils import DeferredAttribute
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
 from taggit.managers import TaggableManager
 # from core.models import Repositories # Если захотим привязывать обсуждения к репозиториям
 
+
+def compute_trending_score(likes, comments, forks, created_at, now=None):
+    """
+    Формула trending score, общая для одиночного и массового пересчета.
+    now можно передать снаружи, чтобы весь батч считался от одной точки времени.
+    """
+    now = now or timezone.now()
+
+    # Вычисляем количество часов с момента создания
+    hours = (now - created_at).total_seconds() / 3600
+
+    # Избегаем деления на ноль/очень маленькое число (минимум 0.1 часа = 6 минут)
+    hours = max(hours, 0.1)
+
+    # Формула trending score
+    engagement = likes + (comments * 2) + (forks * 3)
+    return round(engagement / (hours ** 1.5), 2)
+
+
+class ContentBlob(models.Model):
+    """
+    Тексты постов с адресацией по содержимому (sha256): одинаковый текст хранится один раз.
+    На блоб ссылаются форки, пока их не отредактировали (см. SharedTextField).
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    content = models.TextField()
+    size = models.IntegerField(default=0, help_text="Длина текста в символах")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} chars)"
+
+
+class SharedTextDescriptor(DeferredAttribute):
+    """
+    Свой текст поста, а если колонка пуста - общий текст из ContentBlob.
+    Присваивание запоминается (ASSIGNED): явно заданный пустой текст - это правка,
+    а не "текст из блоба".
+    """
+
+    ASSIGNED = '_shared_text_assigned'
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if (
+            not value
+            and self.field.attname not in instance.__dict__.get(self.ASSIGNED, ())
+            and getattr(instance, f'{self.field.blob_field}_id') is not None
+        ):
+            return getattr(instance, self.field.blob_field).content
+        return value
+
+    def __set__(self, instance, value):
+        # Data-дескриптор: иначе значение из instance.__dict__ перекрыло бы __get__
+        instance.__dict__[self.field.attname] = value
+        instance.__dict__.setdefault(self.ASSIGNED, set()).add(self.field.attname)
+
+
+class SharedTextField(models.TextField):
+    """
+    Текстовое поле с копированием при записи: у неотредактированного форка колонка
+    пустая, а чтение отдает текст блоба blob_field. Своя колонка всегда хранится как есть:
+    поиск, триграммы и tsvector по-прежнему работают по тексту в строке поста.
+    """
+    descriptor_class = SharedTextDescriptor
+    # blob_field не влияет на колонку - смена класса поля не трогает схему
+    non_db_attrs = models.TextField.non_db_attrs + ('blob_field',)
+
+    def __init__(self, *args, blob_field=None, **kwargs):
+        self.blob_field = blob_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['blob_field'] = self.blob_field
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        # В колонку пишем только свой текст, а не подставленный из блоба
+        return model_instance.__dict__.get(self.attname)
+
+
 class ForumPost(models.Model):
     """
     Посты на форуме (вопросы, обсуждения).
@@ -11,14 +97,17 @@ class ForumPost(models.Model):
     """
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='forum_posts')
     title = models.CharField(max_length=200)
-    description = models.TextField(help_text="Описание вопроса или темы")
+    description = SharedTextField(blob_field='description_blob', help_text="Описание вопроса или темы")
 
     # Сниппет кода в посте (партнер предлагал это, оставим, полезно для IT форума)
-    code_snippet = models.TextField(blank=True, null=True, help_text="Кусок кода для обсуждения")
+    code_snippet = SharedTextField(blob_field='code_blob', blank=True, null=True, help_text="Кусок кода для обсуждения")
     language = models.CharField(max_length=50, default='text', help_text="Язык программирования")
 
     views = models.IntegerField(default=0)
     forks_count = models.IntegerField(default=0, help_text="Количество форков поста")
+    # Денормализованные счетчики, обновляются через F() в forum/signals.py
+    likes_count = models.IntegerField(default=0, help_text="Количество лайков")
+    comments_count = models.IntegerField(default=0, help_text="Количество комментариев")
     is_solved = models.BooleanField(default=False) # Галочка "Ответ найден"
 
     # Trending score для алгоритма трендов
@@ -27,13 +116,36 @@ class ForumPost(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Взвешенный tsvector (title - A, description - B, code_snippet - C) для полнотекстового поиска.
+    # На Postgres заполняется триггером и покрыт GIN-индексом (миграция 0006), на SQLite всегда пустой
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Форк: от какого поста и чей текст он разделяет, пока его не отредактировали
+    forked_from = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='forks', editable=False, db_index=False,
+    )
+    description_blob = models.ForeignKey(ContentBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='+', editable=False)
+    code_blob = models.ForeignKey(ContentBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='+', editable=False)
+
     tags = TaggableManager()
 
+    # (текстовое поле, FK на общий блоб) - см. SharedTextField
+    SHARED_CONTENT = (('description', 'description_blob'), ('code_snippet', 'code_blob'))
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # "Форки поста X" - свежие первыми
+            models.Index(fields=['forked_from', '-created_at'], name='forum_post_forked_from_idx'),
+        ]
         verbose_name = "Forum Post"
         verbose_name_plural = "Forum Posts"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Значения из конструктора (загрузка из БД, create) - не правка текста
+        self.__dict__.pop(SharedTextDescriptor.ASSIGNED, None)
+
     def __str__(self):
         return self.title
 
@@ -43,24 +155,9 @@ class ForumPost(models.Model):
         score = (likes + comments*2 + forks*3) / hours^1.5
 
         Алгоритм основан на engagement velocity - как быстро пост набирает активность.
+        Метрики берутся из денормализованных счетчиков, без COUNT-запросов.
         """
-        # Подсчет метрик
-        likes_count = self.votes.filter(vote_type='like').count()
-        comments_count = self.comments.count()
-        forks = self.forks_count
-
-        # Вычисляем количество часов с момента создания
-        time_diff = timezone.now() - self.created_at
-        hours = time_diff.total_seconds() / 3600
-
-        # Избегаем деления на ноль/очень маленькое число (минимум 0.1 часа = 6 минут)
-        hours = max(hours, 0.1)
-
-        # Формула trending score
-        engagement = likes_count + (comments_count * 2) + (forks * 3)
-        score = engagement / (hours ** 1.5)
-
-        return round(score, 2)
+        return compute_trending_score(self.likes_count, self.comments_count, self.forks_count, self.created_at)
 
     def save(self, *args, **kwargs):
         """
@@ -82,6 +179,10 @@ class ForumComment(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Страница веток верхнего уровня (parent IS NULL) для comment-tree
+            models.Index(fields=['post', 'parent', 'created_at']),
+        ]
 
     def __str__(self):
         return f'Comment by {self.author.username} on {self.post.title}'
@@ -115,6 +216,8 @@ class Notification(models.Model):
     actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='actions')
     verb = models.CharField(max_length=50)  # "liked", "forked", "replied"
     target_link = models.CharField(max_length=255, blank=True, null=True)
+    # Сколько пользователей сделали то же действие: "actor и еще actor_count - 1"
+    actor_count = models.IntegerField(default=1)
     is_read = models.BooleanField(default=False)
     timestamp = models.DateTimeField(auto_now_add=True)
 
@@ -122,7 +225,77 @@ class Notification(models.Model):
         ordering = ['-timestamp']
         indexes = [
             models.Index(fields=['recipient', 'is_read']),
+            # Поиск непрочитанного агрегата, в который складываются повторы
+            models.Index(fields=['recipient', 'verb', 'target_link']),
+            # Лента уведомлений пользователя: последние сверху без сортировки всей истории
+            models.Index(fields=['recipient', '-timestamp'], name='forum_notif_recipient_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"Notification for {self.recipient}: {self.actor} {self.verb}"
+
+
+class NotificationActor(models.Model):
+    """
+    Кто уже учтен в агрегате уведомления: actor_count считает разных пользователей,
+    в том числе когда повторы приходят в разных пачках очереди.
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='actor_links')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = ('notification', 'user')
+
+
+class NotificationArchive(models.Model):
+    """
+    Прочитанные уведомления старше FORUM_NOTIFICATIONS_RETENTION_DAYS, вынесенные
+    из горячей таблицы задачей purge_old_notifications (NotificationRetention).
+    id совпадает с id исходного уведомления, поэтому повторный перенос не дублирует строки.
+    На Postgres таблицу можно разбить на месячные партиции (partition_notification_archive)
+    и удалять старые месяцы DROP TABLE вместо DELETE.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications', db_constraint=False)
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', db_constraint=False)
+    verb = models.CharField(max_length=50)
+    target_link = models.CharField(max_length=255, blank=True, null=True)
+    actor_count = models.IntegerField(default=1)
+    timestamp = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['recipient', '-timestamp'], name='forum_notif_arch_rcpt_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived notification for {self.recipient_id}: {self.actor_id} {self.verb}"
+
+class PostFacetCount(models.Model):
+    """
+    Материализованные счетчики для фильтров ленты: сколько постов на язык и на тег.
+    scope - язык, внутри которого посчитаны теги ('' - по всем постам).
+    Поддерживаются инкрементально сигналами, полная пересборка - rebuild_forum_facets.
+    """
+    FACET_LANGUAGE = 'language'
+    FACET_TAG = 'tag'
+    FACETS = (
+        (FACET_LANGUAGE, 'Language'),
+        (FACET_TAG, 'Tag'),
+    )
+
+    facet = models.CharField(max_length=20, choices=FACETS)
+    scope = models.CharField(max_length=50, blank=True, default='')
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('facet', 'scope', 'value')
+        indexes = [
+            models.Index(fields=['facet', 'scope', '-count']),
         ]
 
     def __str__(self):
-        return f"Notification for {self.recipient}: {self.actor} {self.verb}"
\ No newline at end of file
+        return f"{self.facet}:{self.scope or '*'}:{self.value} = {self.count}"
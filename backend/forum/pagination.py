@@ -0,0 +1,268 @@
+import base64
+import bisect
+import json
+from collections import OrderedDict
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация по паре (поле сортировки, id).
+
+    Вместо COUNT(*) + OFFSET страница выбирается условием
+    WHERE (field, id) < (last_field, last_id), поэтому стоимость страницы
+    не зависит от глубины прокрутки. Курсор - непрозрачная base64-строка.
+
+    Ключ берется из текущей сортировки queryset (то есть из ?ordering=),
+    если поле есть в keyset_fields. Для остальных сортировок, а также при явном
+    ?page=N используется обычная PageNumberPagination (opt-in режим).
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_query_param = 'page'
+    keyset_fields = ('created_at',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.fallback = None
+
+    # --- выбор режима ---
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+            if size > 0:
+                return min(size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_keyset_ordering(self, queryset):
+        """Возвращает (field, descending) или None, если сортировка не поддерживает keyset"""
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        if not ordering or not isinstance(ordering[0], str):
+            return None
+        first = ordering[0]
+        field = first.lstrip('-')
+        if field not in self.keyset_fields:
+            return None
+        return field, first.startswith('-')
+
+    def use_page_numbers(self, request, view=None):
+        return self.page_query_param in request.query_params
+
+    def get_fallback_paginator(self):
+        paginator = PageNumberPagination()
+        paginator.page_size = self.page_size
+        paginator.page_size_query_param = self.page_size_query_param
+        paginator.max_page_size = self.max_page_size
+        return paginator
+
+    # --- курсор ---
+
+    def encode_cursor(self, value, pk, reverse=False):
+        payload = {'v': value, 'id': pk}
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, cls=_CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            payload = json.loads(raw)
+            field = model._meta.get_field(self.field)
+            value = field.to_python(payload['v'])
+            pk = model._meta.pk.to_python(payload['id'])
+            return value, pk, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_cursor_link(self, instance, reverse):
+        if isinstance(instance, dict):
+            value, pk = instance[self.field], instance['id']
+        else:
+            value, pk = getattr(instance, self.field), instance.pk
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(value, pk, reverse))
+
+    # --- пагинация ---
+
+    def paginate_queryset(self, queryset, request, view=None):
+        keyset = self.get_keyset_ordering(queryset)
+        if keyset is None or self.use_page_numbers(request, view):
+            self.fallback = self.get_fallback_paginator()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.field, self.descending = keyset
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = bool(cursor and cursor[2])
+
+        # Направление выборки: "вперед" по сортировке или "назад" для ссылки previous
+        descending = self.descending != reverse
+        sign = '-' if descending else ''
+        queryset = queryset.order_by(f'{sign}{self.field}', f'{sign}pk')
+
+        if cursor:
+            value, pk, _ = cursor
+            op = 'lt' if descending else 'gt'
+            # Избыточное field <= value - условие начала диапазона индекса: по одному OR
+            # планировщик читал бы индекс с начала и отбрасывал пролистанные строки
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{op}e': value}),
+                Q(**{f'{self.field}__{op}': value}) | Q(**{self.field: value, f'pk__{op}': pk}),
+            )
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = rows
+        return rows
+
+    def paginate_rows(self, rows, request, model, field, complete=False):
+        """
+        Пагинация готового списка словарей (например, из кеша), отсортированного
+        по (field, id) по убыванию. Возвращает None, если нужной страницы
+        в списке нет целиком и ее надо читать из БД.
+        complete=True означает, что в списке есть все строки, а не только верхушка.
+        """
+        self.request = request
+        self.field, self.descending = field, True
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, model)
+        if cursor and cursor[2]:
+            return None
+
+        start = 0
+        if cursor:
+            value, pk, _ = cursor
+            start = bisect.bisect_right(rows, (-value, -pk), key=lambda row: (-row[field], -row['id']))
+
+        end = start + page_size
+        if end >= len(rows) and not complete:
+            return None
+
+        self.page = rows[start:end]
+        self.has_next = end < len(rows)
+        self.has_previous = cursor is not None
+        return self.page
+
+    def paginate_with(self, request, model, field, fetch):
+        """
+        Пагинация через внешний источник ключей (например, ZSET в Redis),
+        порядок - (field, id) по убыванию.
+        fetch(cursor, page_size) -> (rows, has_more) или None, если источник недоступен;
+        cursor - (value, pk) или None для первой страницы.
+        """
+        self.request = request
+        self.field, self.descending = field, True
+        cursor = self.decode_cursor(request, model)
+        if cursor and cursor[2]:
+            return None
+
+        result = fetch(cursor[:2] if cursor else None, self.get_page_size(request))
+        if result is None:
+            return None
+        self.page, self.has_next = result
+        self.has_previous = cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if self.fallback:
+            return self.fallback.get_next_link()
+        if not self.has_next or not self.page:
+            return None
+        return self.get_cursor_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if self.fallback:
+            return self.fallback.get_previous_link()
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_cursor_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if self.fallback:
+            return self.fallback.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {
+                    'type': 'integer',
+                    'description': 'Только в режиме ?page=N',
+                },
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Курсор следующей/предыдущей страницы',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Номер страницы (включает режим PageNumberPagination)',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Размер страницы',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class _CursorEncoder(json.JSONEncoder):
+    def default(self, o):
+        if hasattr(o, 'isoformat'):
+            return o.isoformat()
+        return super().default(o)
+
+
+class PostFeedPagination(KeysetPagination):
+    """Лента постов: (created_at, id) и (trending_score, id)"""
+    keyset_fields = ('created_at', 'trending_score')
+
+
+class CommentPagination(KeysetPagination):
+    """Комментарии: (created_at, id)"""
+    keyset_fields = ('created_at',)
@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from .models import ForumPost, ForumComment, Notification, SavedForumPost
+from .services.search import PostSearch
+from .services.viewer_state import ViewerState
 
 class NotificationSerializer(serializers.ModelSerializer):
     actor_username = serializers.ReadOnlyField(source='actor.username')
@@ -7,7 +9,7 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Notification
-        fields = ['id', 'actor_username', 'avatar', 'verb', 'target_link', 'is_read', 'timestamp']
+        fields = ['id', 'actor_username', 'avatar', 'verb', 'target_link', 'actor_count', 'is_read', 'timestamp']
 
 class ForumCommentSerializer(serializers.ModelSerializer):
     author_username = serializers.ReadOnlyField(source='author.username')
@@ -16,20 +18,80 @@ class ForumCommentSerializer(serializers.ModelSerializer):
         model = ForumComment
         fields = ['id', 'author_username', 'content', 'created_at', 'parent']
 
+class ViewerStateListSerializer(serializers.ListSerializer):
+    """
+    Список, который перед сериализацией одним запросом достает is_liked/is_saved
+    для всех постов страницы и кладет их в контекст (его видят и вложенные сериализаторы).
+    """
+
+    def get_post_id(self, instance):
+        return instance.pk
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        if 'viewer_state' not in self._context:
+            user = ViewerState.get_user(self._context.get('request'))
+            self._context['viewer_state'] = ViewerState.for_posts(user, [self.get_post_id(item) for item in items])
+        return super().to_representation(items)
+
+
+class SavedPostListSerializer(ViewerStateListSerializer):
+    def get_post_id(self, instance):
+        return instance.post_id
+
+
 class ForumPostSerializer(serializers.ModelSerializer):
     author_username = serializers.ReadOnlyField(source='author.username')
-    comments_count = serializers.IntegerField(source='comments.count', read_only=True)
-    likes_count = serializers.SerializerMethodField()
+    tags = serializers.SerializerMethodField()
+    search_headline = serializers.SerializerMethodField()
+    is_liked = serializers.SerializerMethodField()
+    is_saved = serializers.SerializerMethodField()
 
     class Meta:
         model = ForumPost
         fields = ['id', 'author_username', 'title', 'description', 'code_snippet',
                   'language', 'views', 'forks_count', 'is_solved', 'created_at',
-                  'trending_score', 'comments_count', 'likes_count']
-        read_only_fields = ['views', 'created_at', 'trending_score']
+                  'trending_score', 'comments_count', 'likes_count', 'tags', 'search_headline',
+                  'is_liked', 'is_saved']
+        read_only_fields = ['views', 'forks_count', 'created_at', 'trending_score', 'comments_count', 'likes_count']
+        list_serializer_class = ViewerStateListSerializer
+
+    def update(self, instance, validated_data):
+        """
+        Правка пишет только присланные поля: полный save() вернул бы прочитанные вместе с постом
+        счетчики и затер бы лайки, комментарии, форки и просмотры, сдвинутые тем временем через F()
+        """
+        serializers.raise_errors_on_nested_writes('update', self, validated_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        fields = {'updated_at', *validated_data}
+        # Правка текста форка снимает ссылку на общий блоб (PostForks.detach_edited)
+        fields.update(blob_field for field, blob_field in ForumPost.SHARED_CONTENT if field in validated_data)
+        instance.save(update_fields=fields)
+        return instance
+
+    def get_tags(self, obj):
+        # .all() вместо .names(): берет prefetch_related('tags') из queryset, без запроса на пост
+        return [tag.name for tag in obj.tags.all()]
+
+    def get_search_headline(self, obj):
+        # Фрагмент описания с <mark>...</mark> вокруг найденных слов; есть только в выдаче полнотекстового поиска.
+        # Сам текст экранирован: фронтенд вставляет фрагмент как HTML
+        return PostSearch.render_headline(getattr(obj, 'search_headline', None))
+
+    def get_viewer_state(self, obj):
+        # Для списков состояние уже посчитано ViewerStateListSerializer, для одного поста - запрос здесь
+        state = self.context.get('viewer_state')
+        if state is None or obj.pk not in state:
+            state = ViewerState.for_posts(ViewerState.get_user(self.context.get('request')), [obj.pk])
+            self.context.setdefault('viewer_state', {}).update(state)
+        return state[obj.pk]
+
+    def get_is_liked(self, obj):
+        return self.get_viewer_state(obj)['is_liked']
 
-    def get_likes_count(self, obj):
-        return obj.votes.filter(vote_type='like').count()
+    def get_is_saved(self, obj):
+        return self.get_viewer_state(obj)['is_saved']
 
 
 class SavedForumPostSerializer(serializers.ModelSerializer):
@@ -41,4 +103,5 @@ class SavedForumPostSerializer(serializers.ModelSerializer):
     class Meta:
         model = SavedForumPost
         fields = ['id', 'post', 'post_id', 'saved_at']
-        read_only_fields = ['id', 'saved_at']
\ No newline at end of file
+        read_only_fields = ['id', 'saved_at']
+        list_serializer_class = SavedPostListSerializer
\ No newline at end of file
@@ -0,0 +1,182 @@
+import re
+import threading
+from collections import defaultdict
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, FloatField, Value, When
+
+from forum.models import ForumPost
+
+_WORD_RE = re.compile(r'[0-9a-zа-яё_]+')
+
+
+def word_trigrams(text):
+    """Триграммы слов как в pg_trgm: слово дополняется двумя пробелами слева и одним справа"""
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def raw_trigrams(text):
+    """Все подстроки длины 3, включая пунктуацию - для поиска подстроки вроде 'useEffect('"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class CodeTrigramIndex:
+    """
+    Инвертированный индекс по триграммам code_snippet в памяти процесса -
+    запасной путь поиска по коду без pg_trgm (SQLite в тестах и локально).
+
+    Строится лениво при первом поиске, дальше поддерживается сигналами ForumPost.
+    Индекс свой у каждого процесса, поэтому в проде с Postgres не используется.
+    """
+
+    _lock = threading.Lock()
+    _postings = None
+    _texts = None
+    _words = None
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._postings = cls._texts = cls._words = None
+
+    @classmethod
+    def is_built(cls):
+        return cls._postings is not None
+
+    @classmethod
+    def _add(cls, pk, snippet):
+        text = (snippet or '').lower()
+        cls._texts[pk] = text
+        cls._words[pk] = word_trigrams(text)
+        for gram in raw_trigrams(text):
+            cls._postings.setdefault(gram, set()).add(pk)
+
+    @classmethod
+    def _discard(cls, pk):
+        text = cls._texts.pop(pk, None)
+        cls._words.pop(pk, None)
+        if text is None:
+            return
+        for gram in raw_trigrams(text):
+            posting = cls._postings.get(gram)
+            if posting is not None:
+                posting.discard(pk)
+                if not posting:
+                    del cls._postings[gram]
+
+    @classmethod
+    def build(cls):
+        with cls._lock:
+            cls._postings, cls._texts, cls._words = {}, {}, {}
+            rows = ForumPost.objects.exclude(code_snippet__isnull=True).exclude(code_snippet='')
+            for pk, snippet in rows.values_list('pk', 'code_snippet').iterator(chunk_size=2000):
+                cls._add(pk, snippet)
+
+    @classmethod
+    def update_post(cls, post):
+        if not cls.is_built():
+            return
+        with cls._lock:
+            cls._discard(post.pk)
+            if post.code_snippet:
+                cls._add(post.pk, post.code_snippet)
+
+    @classmethod
+    def remove_post(cls, post_id):
+        if not cls.is_built():
+            return
+        with cls._lock:
+            cls._discard(post_id)
+
+    @classmethod
+    def lookup(cls, fragment, limit, among=None):
+        """
+        Посты, в коде которых есть fragment (без учета регистра): [(post_id, score), ...]
+        от лучших к худшим. score - доля триграмм слов запроса, найденных в сниппете
+        (приближение word_similarity из pg_trgm). among - множество допустимых id:
+        отсекается до ограничения limit.
+        """
+        if not cls.is_built():
+            cls.build()
+        needle = fragment.lower()
+        with cls._lock:
+            grams = raw_trigrams(needle)
+            if grams:
+                postings = sorted((cls._postings.get(gram, set()) for gram in grams), key=len)
+                candidates = set.intersection(*postings)
+            else:
+                # Меньше трех символов - триграмм нет, проверяем все сниппеты
+                candidates = cls._texts.keys()
+            if among is not None:
+                candidates = candidates & among
+            matches = [(pk, cls._words[pk]) for pk in candidates if needle in cls._texts[pk]]
+
+        query_grams = word_trigrams(needle)
+        scored = []
+        for pk, words in matches:
+            score = len(query_grams & words) / len(query_grams) if query_grams else 1.0
+            scored.append((pk, round(score, 4)))
+        scored.sort(key=lambda item: (item[1], item[0]), reverse=True)
+        return scored[:limit]
+
+
+class CodeSearch:
+    """
+    Поиск по code_snippet (?code=): подстрока без учета регистра, а не токены -
+    чтобы находились фрагменты вроде 'useEffect(' или 'np.einsum'.
+
+    На Postgres условие ILIKE '%fragment%' обслуживает GIN-индекс gin_trgm_ops
+    (миграция 0007), результаты сортируются по TrigramWordSimilarity:
+    совпадение целого идентификатора выше, чем кусок более длинного слова.
+
+    Без pg_trgm используется CodeTrigramIndex в памяти процесса с той же семантикой.
+    """
+
+    # Сколько совпадений ранжировать в запасном режиме (ранг передается в SQL через CASE)
+    FALLBACK_LIMIT = 1000
+
+    @staticmethod
+    def is_trigram_available():
+        return connection.vendor == 'postgresql'
+
+    @staticmethod
+    def trigram(queryset, fragment):
+        return (
+            queryset.filter(code_snippet__icontains=fragment)
+            .annotate(code_rank=TrigramWordSimilarity(fragment, 'code_snippet'))
+            .order_by('-code_rank', '-pk')
+        )
+
+    @classmethod
+    def python_index(cls, queryset, fragment):
+        # Фильтры ленты (язык, теги, ?search=) сужают кандидатов до ограничения FALLBACK_LIMIT,
+        # иначе совпадения из отфильтрованных постов вытеснялись бы остальными
+        among = set(queryset.values_list('pk', flat=True)) if queryset.query.has_filters() else None
+        matches = CodeTrigramIndex.lookup(fragment, cls.FALLBACK_LIMIT, among=among)
+        # Различных значений ранга обычно единицы: одна ветка CASE на значение, а не на пост
+        by_score = defaultdict(list)
+        for pk, score in matches:
+            by_score[score].append(pk)
+        rank = Case(
+            *[When(pk__in=pks, then=Value(score)) for score, pks in by_score.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        return (
+            queryset.filter(pk__in=[pk for pk, _ in matches])
+            .annotate(code_rank=rank)
+            .order_by('-code_rank', '-pk')
+        )
+
+    @classmethod
+    def search(cls, queryset, fragment):
+        fragment = fragment.strip()
+        if not fragment:
+            return queryset
+        if cls.is_trigram_available():
+            return cls.trigram(queryset, fragment)
+        return cls.python_index(queryset, fragment)
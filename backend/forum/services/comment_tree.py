@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework import serializers
+
+from forum.models import ForumComment
+
+
+class CommentTree:
+    """
+    Дерево обсуждения поста одним запросом.
+
+    Верхний уровень пагинируется как обычные комментарии (keyset по created_at),
+    а все ответы выбранных веток достаются рекурсивным CTE (WITH RECURSIVE
+    работает и в Postgres, и в SQLite) с ограничением глубины.
+    Строки приходят отсортированными по (depth, created_at, id), поэтому родитель
+    всегда раньше ответа и дерево собирается за один проход.
+
+    Узел на пределе глубины, у которого есть ответы, помечается more_replies=True -
+    клиент догружает ветку отдельно.
+    """
+
+    SQL = """
+        WITH RECURSIVE tree (id, depth) AS (
+            SELECT id, 0 FROM {comments} WHERE id IN ({roots})
+            UNION ALL
+            SELECT child.id, tree.depth + 1
+            FROM {comments} child
+            JOIN tree ON child.parent_id = tree.id
+            WHERE tree.depth < %s
+        )
+        SELECT c.id, c.post_id, c.parent_id, c.author_id, c.content, c.created_at, c.updated_at,
+               tree.depth, author.username AS author_username,
+               EXISTS (SELECT 1 FROM {comments} reply WHERE reply.parent_id = c.id) AS has_replies
+        FROM tree
+        JOIN {comments} c ON c.id = tree.id
+        JOIN {users} author ON author.id = c.author_id
+        ORDER BY tree.depth, c.created_at, c.id
+    """
+
+    @staticmethod
+    def max_depth():
+        return getattr(settings, 'FORUM_COMMENT_TREE_MAX_DEPTH', 10)
+
+    @classmethod
+    def clamp_depth(cls, depth):
+        """Глубина из ?depth=, не больше FORUM_COMMENT_TREE_MAX_DEPTH"""
+        try:
+            depth = int(depth)
+        except (TypeError, ValueError):
+            return cls.max_depth()
+        return max(0, min(depth, cls.max_depth()))
+
+    @staticmethod
+    def roots(post_id):
+        """Комментарии верхнего уровня - по ним идет пагинация"""
+        return ForumComment.objects.filter(post_id=post_id, parent__isnull=True).only('id', 'created_at')
+
+    @classmethod
+    def fetch(cls, root_ids, depth):
+        if not root_ids:
+            return []
+        sql = cls.SQL.format(
+            comments=ForumComment._meta.db_table,
+            users=User._meta.db_table,
+            roots=', '.join(['%s'] * len(root_ids)),
+        )
+        return list(ForumComment.objects.raw(sql, [*root_ids, depth]))
+
+    @classmethod
+    def build(cls, root_ids, depth=None):
+        """Вложенные ветки для root_ids в исходном порядке корней"""
+        depth = cls.max_depth() if depth is None else depth
+        # Часовой пояс фиксируем один раз: иначе DRF ищет его заново для каждой даты
+        created_at = serializers.DateTimeField(
+            default_timezone=timezone.get_current_timezone() if settings.USE_TZ else None
+        )
+        nodes = {}
+        for comment in cls.fetch(root_ids, depth):
+            node = {
+                'id': comment.id,
+                'author_username': comment.author_username,
+                'content': comment.content,
+                'created_at': created_at.to_representation(comment.created_at),
+                'parent': comment.parent_id,
+                'depth': comment.depth,
+                'replies': [],
+                'more_replies': bool(comment.has_replies) and comment.depth >= depth,
+            }
+            nodes[comment.id] = node
+            if comment.parent_id in nodes and comment.depth > 0:
+                nodes[comment.parent_id]['replies'].append(node)
+        return [nodes[pk] for pk in root_ids if pk in nodes]
@@ -0,0 +1,99 @@
+import logging
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from forum.models import ForumPost, ForumComment, PostVote
+from forum.services.live_events import LiveEvents
+
+logger = logging.getLogger(__name__)
+
+
+def count_subquery(model, field, condition=None, **filters):
+    """
+    Коррелированный COUNT строк model, у которых field ссылается на внешнюю строку
+    (0 вместо NULL), - чтобы не делать JOIN двух таблиц сразу.
+    Общий для сверки счетчиков постов и репозиториев (core.services.repo_counters).
+    """
+    queryset = model.objects.filter(**{field: OuterRef('pk')}, **filters)
+    if condition is not None:
+        queryset = queryset.filter(condition)
+    subquery = queryset.order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+
+class PostCounters:
+    """
+    Денормализованные счетчики ForumPost (likes_count, comments_count, forks_count).
+
+    Инкременты идут атомарным UPDATE ... SET x = x + 1, без чтения строки,
+    поэтому параллельные лайки не теряют обновления. reconcile() чинит дрейф
+    (ручные правки в БД, удаления в обход сигналов).
+    """
+
+    @staticmethod
+    def add(post_id, field, delta=1):
+        ForumPost.objects.filter(pk=post_id).update(**{field: F(field) + delta})
+        if not LiveEvents.enabled():
+            return
+        # Живому каналу - итоговое значение, а не дельта: пропущенное клиентом событие
+        # не сдвигает его счетчик навсегда. Читается только при включенном канале
+        value = ForumPost.objects.filter(pk=post_id).values_list(field, flat=True).first()
+        if value is not None:
+            LiveEvents.counters_changed(post_id, **{field: value})
+
+    @classmethod
+    def add_like(cls, post_id, delta=1):
+        cls.add(post_id, 'likes_count', delta)
+
+    @classmethod
+    def add_comment(cls, post_id, delta=1):
+        cls.add(post_id, 'comments_count', delta)
+
+    @classmethod
+    def add_fork(cls, post_id):
+        cls.add(post_id, 'forks_count')
+
+    @classmethod
+    def reconcile(cls, chunk_size=2000, dry_run=False):
+        """
+        Сверяет счетчики с реальными COUNT и исправляет расхождения.
+        Идет чанками по pk, на каждый чанк один агрегирующий SELECT.
+
+        Returns:
+            dict: checked, fixed
+        """
+        checked = fixed = 0
+        last_pk = 0
+
+        while True:
+            rows = list(
+                ForumPost.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .annotate(
+                    actual_likes=count_subquery(PostVote, 'post', vote_type='like'),
+                    actual_comments=count_subquery(ForumComment, 'post'),
+                )
+                .values_list('pk', 'likes_count', 'comments_count', 'actual_likes', 'actual_comments')
+                [:chunk_size]
+            )
+            if not rows:
+                break
+
+            drifted = [
+                ForumPost(pk=pk, likes_count=actual_likes, comments_count=actual_comments)
+                for pk, likes, comments, actual_likes, actual_comments in rows
+                if likes != actual_likes or comments != actual_comments
+            ]
+            if drifted and not dry_run:
+                with transaction.atomic():
+                    ForumPost.objects.bulk_update(drifted, ['likes_count', 'comments_count'], batch_size=500)
+
+            checked += len(rows)
+            fixed += len(drifted)
+            last_pk = rows[-1][0]
+            if len(rows) < chunk_size:
+                break
+
+        logger.info(f"Counters reconciled: {fixed}/{checked} posts fixed" + (" (dry run)" if dry_run else ""))
+        return {'checked': checked, 'fixed': fixed}
@@ -0,0 +1,132 @@
+import logging
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Greatest
+from taggit.models import TaggedItem
+
+from forum.models import ForumPost, PostFacetCount
+
+logger = logging.getLogger(__name__)
+
+
+class PostFacets:
+    """
+    Счетчики фасетов ленты (языки и теги) в таблице PostFacetCount.
+
+    Вместо GROUP BY по ForumPost/TaggedItem на каждый просмотр счетчики
+    двигаются на +-1 в сигналах: создание/удаление поста, смена языка,
+    добавление/снятие тега. Чтение - выборка по индексу (facet, scope, -count).
+
+    Теги считаются дважды: по всем постам (scope='') и внутри языка поста
+    (scope=language), чтобы сайдбар показывал теги для выбранного языка.
+    """
+
+    DEFAULT_LIMIT = 30
+
+    @staticmethod
+    def adjust(facet, value, delta, scope=''):
+        """
+        Атомарно сдвигает счетчик, создавая строку при первом попадании.
+        Ниже нуля не опускается: удаление поста, добавленного в обход сигналов
+        (bulk_create), не должно уводить счетчик в минус до следующего rebuild.
+        """
+        if not value or not delta:
+            return
+        rows = PostFacetCount.objects.filter(facet=facet, scope=scope, value=value)
+        if delta < 0:
+            rows.update(count=Greatest(F('count') + delta, 0))
+            return
+        if rows.update(count=F('count') + delta):
+            return
+        try:
+            with transaction.atomic():
+                PostFacetCount.objects.create(facet=facet, scope=scope, value=value, count=delta)
+        except IntegrityError:
+            # Строку успел создать параллельный запрос
+            rows.update(count=F('count') + delta)
+
+    @classmethod
+    def adjust_tag(cls, tag, language, delta):
+        cls.adjust(PostFacetCount.FACET_TAG, tag, delta)
+        cls.adjust(PostFacetCount.FACET_TAG, tag, delta, scope=language)
+
+    # --- события ---
+
+    @classmethod
+    def post_created(cls, post):
+        cls.adjust(PostFacetCount.FACET_LANGUAGE, post.language, 1)
+
+    @classmethod
+    def post_deleted(cls, post):
+        # Теги поста снимаются отдельными сигналами TaggedItem при каскадном удалении
+        cls.adjust(PostFacetCount.FACET_LANGUAGE, post.language, -1)
+
+    @classmethod
+    def language_changed(cls, post, old_language):
+        cls.adjust(PostFacetCount.FACET_LANGUAGE, old_language, -1)
+        cls.adjust(PostFacetCount.FACET_LANGUAGE, post.language, 1)
+        for tag in post.tags.names():
+            cls.adjust(PostFacetCount.FACET_TAG, tag, -1, scope=old_language)
+            cls.adjust(PostFacetCount.FACET_TAG, tag, 1, scope=post.language)
+
+    @classmethod
+    def tag_changed(cls, post_id, tag, delta):
+        language = ForumPost.objects.filter(pk=post_id).values_list('language', flat=True).first()
+        if language is None:
+            return
+        cls.adjust_tag(tag, language, delta)
+
+    # --- чтение ---
+
+    @classmethod
+    def get(cls, language=None, limit=DEFAULT_LIMIT):
+        """
+        {'languages': [{'value', 'count'}], 'tags': [...]}
+        Языки - всегда по всем постам, теги - внутри language, если он задан.
+        """
+        def top(facet, scope):
+            return list(
+                PostFacetCount.objects.filter(facet=facet, scope=scope, count__gt=0)
+                .order_by('-count', 'value')
+                .values('value', 'count')[:limit]
+            )
+
+        return {
+            'languages': top(PostFacetCount.FACET_LANGUAGE, ''),
+            'tags': top(PostFacetCount.FACET_TAG, language or ''),
+        }
+
+    # --- сверка ---
+
+    @classmethod
+    def rebuild(cls):
+        """Пересчитывает все счетчики с нуля (GROUP BY) и заменяет таблицу в одной транзакции"""
+        rows = [
+            PostFacetCount(facet=PostFacetCount.FACET_LANGUAGE, value=language, count=total)
+            for language, total in ForumPost.objects.order_by().values_list('language').annotate(total=Count('pk'))
+        ]
+
+        tagged = TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(ForumPost)).order_by()
+        by_tag = tagged.values_list('tag__name').annotate(total=Count('object_id'))
+        rows.extend(
+            PostFacetCount(facet=PostFacetCount.FACET_TAG, value=name, count=total) for name, total in by_tag
+        )
+
+        post_language = ForumPost.objects.filter(pk=OuterRef('object_id')).values('language')[:1]
+        by_scope = (
+            tagged.annotate(language=Subquery(post_language))
+            .values_list('language', 'tag__name')
+            .annotate(total=Count('object_id'))
+        )
+        rows.extend(
+            PostFacetCount(facet=PostFacetCount.FACET_TAG, scope=language, value=name, count=total)
+            for language, name, total in by_scope
+            if language is not None
+        )
+
+        with transaction.atomic():
+            PostFacetCount.objects.all().delete()
+            PostFacetCount.objects.bulk_create(rows, batch_size=1000)
+        logger.info(f"Rebuilt {len(rows)} facet counters")
+        return len(rows)
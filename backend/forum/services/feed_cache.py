@@ -0,0 +1,196 @@
+import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+
+from forum.models import ForumPost
+from forum.serializers import ForumPostSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class TrendingFeedCache:
+    """
+    Кеш первых N страниц трендовой ленты (?ordering=-trending_score) в Redis
+    (CACHES['default'], django-redis).
+
+    В кеше лежит верхушка ленты - уже сериализованные посты, отсортированные
+    по (trending_score, id) по убыванию. Любая страница внутри верхушки, в том числе
+    по курсору, отдается без запросов в Postgres.
+
+    - update_trending_scores -> rebuild() целиком;
+    - update_single_post_trending_score / правка поста -> patch_post() на месте;
+    - удаление поста -> remove_post().
+
+    Защита от stampede: у записи есть "мягкий" срок годности. Пересобирает ленту
+    только тот, кто взял блокировку (cache.add), остальные отдают устаревшую
+    версию или недолго ждут первую сборку.
+
+    Правку, которую нельзя применить (блокировка занята), отмечает отдельный
+    ключ STALE_KEY, а не перезапись ленты: иначе устаревшая копия затерла бы
+    только что пересобранную. Флаг снимается в начале сборки, поэтому правка,
+    пришедшая во время сборки, вызовет еще одну.
+    """
+
+    KEY = 'forum:trending:feed:v1'
+    LOCK_KEY = 'forum:trending:feed:lock'
+    STALE_KEY = 'forum:trending:feed:stale'
+    LOCK_TIMEOUT = 30
+    WAIT_TIMEOUT = 2.0
+    WAIT_STEP = 0.05
+
+    # Фильтры, при которых лента уже не "общая" и кеш неприменим
+    UNCACHEABLE_PARAMS = ('search', 'code', 'language', 'tags', 'page')
+
+    @staticmethod
+    def pages():
+        return getattr(settings, 'FORUM_TRENDING_CACHE_PAGES', 5)
+
+    @staticmethod
+    def soft_ttl():
+        return getattr(settings, 'FORUM_TRENDING_CACHE_TTL', 15 * 60)
+
+    @classmethod
+    def size(cls):
+        return cls.pages() * api_settings.PAGE_SIZE
+
+    @classmethod
+    def is_cacheable(cls, request):
+        params = request.query_params
+        if params.get('ordering') != '-trending_score':
+            return False
+        return not any(params.get(name) for name in cls.UNCACHEABLE_PARAMS)
+
+    # --- сборка ---
+
+    @classmethod
+    def _build_items(cls, limit):
+        posts = (
+            ForumPost.objects.select_related('author', 'description_blob', 'code_blob').prefetch_related('tags')
+            .order_by('-trending_score', '-pk')[:limit + 1]
+        )
+        return list(ForumPostSerializer(posts, many=True).data)
+
+    @classmethod
+    def _store(cls, items):
+        size = cls.size()
+        entry = {
+            'items': items[:size],
+            # В кеше вся таблица, если постов меньше, чем влезает в верхушку
+            'complete': len(items) <= size,
+            'expires_at': time.time() + cls.soft_ttl(),
+        }
+        # Жесткий TTL больше мягкого: устаревшая версия еще какое-то время служит подстраховкой
+        cache.set(cls.KEY, entry, timeout=cls.soft_ttl() * 2)
+        return entry
+
+    @classmethod
+    def rebuild(cls):
+        cache.delete(cls.STALE_KEY)
+        entry = cls._store(cls._build_items(cls.size()))
+        logger.info(f"Trending feed cache rebuilt: {len(entry['items'])} posts")
+        return entry
+
+    # --- чтение ---
+
+    @classmethod
+    def get(cls):
+        """Возвращает запись кеша, пересобирая ее не более чем одним запросом одновременно"""
+        cached = cache.get_many([cls.KEY, cls.STALE_KEY])
+        entry = cached.get(cls.KEY)
+        if entry is not None and entry['expires_at'] > time.time() and cls.STALE_KEY not in cached:
+            return entry
+
+        if cache.add(cls.LOCK_KEY, 1, timeout=cls.LOCK_TIMEOUT):
+            try:
+                return cls.rebuild()
+            finally:
+                cache.delete(cls.LOCK_KEY)
+
+        if entry is not None:
+            # Кто-то уже пересобирает - отдаем устаревшую версию
+            return entry
+
+        # Холодный старт: ждем, пока сборку закончит владелец блокировки
+        deadline = time.monotonic() + cls.WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(cls.WAIT_STEP)
+            entry = cache.get(cls.KEY)
+            if entry is not None:
+                return entry
+        return None
+
+    @classmethod
+    def get_page(cls, paginator, request):
+        """Страница из кеша или None, если ее нужно читать из БД"""
+        entry = cls.get()
+        if entry is None:
+            return None
+        return paginator.paginate_rows(
+            entry['items'], request, ForumPost, 'trending_score', complete=entry['complete']
+        )
+
+    # --- инкрементальные обновления ---
+
+    @classmethod
+    def _mutate(cls, apply):
+        """
+        Правит закешированную ленту под блокировкой. Если блокировка занята
+        (идет пересборка), саму запись не трогаем, а ставим флаг STALE_KEY.
+        apply(entry) возвращает новый список постов или None, если менять нечего.
+        """
+        entry = cache.get(cls.KEY)
+        if entry is None:
+            return
+        if not cache.add(cls.LOCK_KEY, 1, timeout=cls.LOCK_TIMEOUT):
+            cache.set(cls.STALE_KEY, 1, timeout=cls.soft_ttl() * 2)
+            return
+        try:
+            entry = cache.get(cls.KEY) or entry
+            items = apply(entry)
+            if items is None:
+                return
+            items.sort(key=lambda row: (row['trending_score'], row['id']), reverse=True)
+            if len(items) > cls.size():
+                entry['complete'] = False
+            entry['items'] = items[:cls.size()]
+            cache.set(cls.KEY, entry, timeout=cls.soft_ttl() * 2)
+        finally:
+            cache.delete(cls.LOCK_KEY)
+
+    @classmethod
+    def patch_post(cls, post):
+        """Обновляет пост в кеше; новый пост попадает туда, только если проходит в верхушку"""
+        cls.patch_posts([post])
+
+    @classmethod
+    def patch_posts(cls, posts):
+        """То же для пачки постов - одна правка записи кеша на всю пачку"""
+        fresh = [dict(row) for row in ForumPostSerializer(posts, many=True).data]
+        fresh_ids = {row['id'] for row in fresh}
+
+        def apply(entry):
+            items = entry['items']
+            rest = [row for row in items if row['id'] not in fresh_ids]
+            if entry['complete']:
+                return rest + fresh
+            # Если верхушка неполная, за последним закешированным постом могут быть другие,
+            # поэтому посты, которые не выше последнего, в кеше не держим
+            if not rest:
+                return rest if len(rest) != len(items) else None
+            floor = (rest[-1]['trending_score'], rest[-1]['id'])
+            added = [row for row in fresh if (row['trending_score'], row['id']) > floor]
+            if not added and len(rest) == len(items):
+                return None
+            return rest + added
+
+        cls._mutate(apply)
+
+    @classmethod
+    def remove_post(cls, post_id):
+        def apply(entry):
+            rest = [row for row in entry['items'] if row['id'] != post_id]
+            return rest if len(rest) != len(entry['items']) else None
+
+        cls._mutate(apply)
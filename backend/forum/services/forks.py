@@ -0,0 +1,89 @@
+import hashlib
+from django.db import transaction
+
+from forum.models import ContentBlob, ForumPost, SharedTextDescriptor
+from forum.services.counters import PostCounters
+from forum.services.notifications import PostNotifications
+from forum.services.trending_queue import TrendingUpdateQueue
+
+
+class PostForks:
+    """
+    Форк поста без копирования текста (copy-on-write).
+
+    Описание и сниппет оригинала один раз кладутся в ContentBlob по sha256
+    (INSERT ... ON CONFLICT DO NOTHING), а форк ссылается на блобы с пустыми
+    колонками. Тысяча форков популярного сниппета - одна копия текста.
+    Форк форка переиспользует те же блобы без хеширования.
+
+    Свой текст у форка появляется при редактировании (signals.detach_edited_fork_content).
+    Поиск и индексы кода видят только свой текст постов: неотредактированные форки
+    в них не дублируют оригинал.
+
+    forks_count оригинала растет атомарным UPDATE ... SET forks_count = forks_count + 1,
+    родословная хранится в forked_from (индекс forked_from, -created_at).
+    """
+
+    @staticmethod
+    def digest(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def shared_content(cls, post):
+        """
+        {'<blob>_id': sha256} для текстов поста и новые блобы {sha256: текст}.
+        Уже общий текст (колонка пустая, блоб есть) берется по ссылке, свой - хешируется.
+        """
+        refs, blobs = {}, {}
+        for field, blob_field in ForumPost.SHARED_CONTENT:
+            own = post.__dict__.get(field)
+            if own:
+                sha = cls.digest(own)
+                blobs[sha] = own
+            else:
+                sha = getattr(post, f'{blob_field}_id')
+            refs[f'{blob_field}_id'] = sha
+        return refs, blobs
+
+    @classmethod
+    def fork(cls, original, user):
+        refs, blobs = cls.shared_content(original)
+        with transaction.atomic():
+            if blobs:
+                ContentBlob.objects.bulk_create(
+                    [ContentBlob(sha256=sha, content=text, size=len(text)) for sha, text in blobs.items()],
+                    ignore_conflicts=True,
+                )
+            forked_post = ForumPost.objects.create(
+                author=user,
+                title=f"{original.title} (Fork)",
+                description='',
+                code_snippet=None,
+                language=original.language,
+                forked_from=original,
+                **refs,
+            )
+            PostCounters.add_fork(original.pk)
+
+        # UPDATE через queryset не шлет сигналов - пересчет score и уведомление ставим сами
+        transaction.on_commit(lambda: TrendingUpdateQueue.mark_dirty(original.pk))
+        transaction.on_commit(lambda: PostNotifications.post_forked(original.pk, original.author_id, user.pk))
+        return forked_post
+
+    @classmethod
+    def detach_edited(cls, post):
+        """
+        Копирование при записи: если текст форка присвоили (в том числе пустой или None),
+        ссылка на блоб снимается. Текст, совпадающий с блобом (сохранили без изменений),
+        остается общим.
+        """
+        assigned = post.__dict__.pop(SharedTextDescriptor.ASSIGNED, set())
+        for field, blob_field in ForumPost.SHARED_CONTENT:
+            sha = getattr(post, f'{blob_field}_id')
+            if sha is None or field not in assigned:
+                continue
+            own = post.__dict__.get(field)
+            if own and cls.digest(own) == sha:
+                post.__dict__[field] = None if ForumPost._meta.get_field(field).null else ''
+            else:
+                setattr(post, f'{blob_field}_id', None)
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from forum.services.redis_client import REDIS_ERRORS, get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class LiveEvents:
+    """
+    Публикация событий для живого канала (SSE, см. views.live_stream).
+
+    Событие уходит в Redis PUBLISH уже готовым SSE-кадром ("event: ...\\ndata: ...\\n\\n"),
+    поэтому процесс с подписчиками только пересылает байты - без JSON и форматирования
+    на каждое соединение.
+
+    Каналы:
+    - forum:live:user:<id> - уведомления пользователя (notification) и счетчик непрочитанных;
+    - forum:live:post:<id> - новые likes_count/comments_count/forks_count поста (counters).
+
+    Без Redis публикация молча пропускается: клиенты в этом случае опрашивают unread_count.
+    """
+
+    PREFIX = 'forum:live:'
+
+    @classmethod
+    def user_channel(cls, user_id):
+        return f'{cls.PREFIX}user:{user_id}'
+
+    @classmethod
+    def post_channel(cls, post_id):
+        return f'{cls.PREFIX}post:{post_id}'
+
+    @staticmethod
+    def enabled():
+        return get_redis() is not None
+
+    @staticmethod
+    def frame(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+    @classmethod
+    def publish(cls, messages):
+        """messages: [(channel, event, data), ...] - одним pipeline"""
+        r = get_redis()
+        if r is None or not messages:
+            return
+        try:
+            pipe = r.pipeline(transaction=False)
+            for channel, event, data in messages:
+                pipe.publish(channel, cls.frame(event, data))
+            pipe.execute()
+        except REDIS_ERRORS as e:
+            logger.warning(f"Live events publish failed: {e}")
+
+    @classmethod
+    def counters_changed(cls, post_id, **changes):
+        """
+        Изменение счетчиков поста: всегда абсолютные likes_count/comments_count/forks_count,
+        клиент заменяет свое значение. Публикуется после коммита, чтобы клиент не увидел откатившийся лайк.
+        """
+        data = {'post': post_id, **changes}
+        transaction.on_commit(lambda: cls.publish([(cls.post_channel(post_id), 'counters', data)]))
+
+    @classmethod
+    def notifications_changed(cls, notifications, unread):
+        """
+        Новые и обновленные агрегаты уведомлений.
+        unread: {recipient_id: число непрочитанных} - кладется в то же событие.
+        """
+        if not notifications or not cls.enabled():
+            return
+        usernames = dict(
+            User.objects.filter(pk__in={n.actor_id for n in notifications}).values_list('pk', 'username')
+        )
+        cls.publish([
+            (cls.user_channel(n.recipient_id), 'notification', {
+                'id': n.pk,
+                'actor_username': usernames.get(n.actor_id),
+                'verb': n.verb,
+                'target_link': n.target_link,
+                'actor_count': n.actor_count,
+                'is_read': n.is_read,
+                'timestamp': n.timestamp.isoformat(),
+                'unread': unread.get(n.recipient_id),
+            })
+            for n in notifications
+        ])
+
+
+class LiveHub:
+    """
+    Раздача опубликованных событий открытым SSE-соединениям одного процесса.
+
+    На процесс одна подписка Redis (PSUBSCRIBE forum:live:*) и одна задача-читатель,
+    а не подключение к Redis на каждого клиента. Соединение - это корутина и
+    asyncio.Queue в словаре канал -> очереди, поэтому простаивающие клиенты почти
+    ничего не стоят и их на процесс могут быть десятки тысяч.
+
+    Очередь ограничена: если клиент не успевает читать, новые кадры для него
+    отбрасываются, а не копятся в памяти.
+    """
+
+    QUEUE_SIZE = 100
+
+    def __init__(self):
+        self.listeners = defaultdict(set)
+        self._reader = None
+
+    def subscribe(self, channels):
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        for channel in channels:
+            self.listeners[channel].add(queue)
+        return queue
+
+    def unsubscribe(self, queue, channels):
+        for channel in channels:
+            queues = self.listeners.get(channel)
+            if queues is None:
+                continue
+            queues.discard(queue)
+            if not queues:
+                del self.listeners[channel]
+
+    def dispatch(self, channel, frame):
+        for queue in self.listeners.get(channel, ()):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                pass
+
+    @staticmethod
+    def redis_url():
+        """URL для redis.asyncio: FORUM_LIVE_REDIS_URL или Redis из CACHES['default']"""
+        url = getattr(settings, 'FORUM_LIVE_REDIS_URL', None)
+        if url:
+            return url
+        cache = settings.CACHES['default']
+        if cache['BACKEND'].startswith('django_redis'):
+            location = cache['LOCATION']
+            return location[0] if isinstance(location, (list, tuple)) else location
+        return None
+
+    def ensure_reader(self):
+        """Запускает задачу-читатель в текущем event loop, если она еще не работает"""
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.get_running_loop().create_task(self._read(self.redis_url()))
+
+    async def _read(self, url):
+        from redis import asyncio as aioredis
+
+        pattern = f'{LiveEvents.PREFIX}*'
+        while True:
+            client = aioredis.from_url(url)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(pattern)
+                async for message in pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        self.dispatch(message['channel'].decode(), message['data'])
+            except asyncio.CancelledError:
+                raise
+            except REDIS_ERRORS as e:
+                logger.warning(f"Live hub lost Redis subscription, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+
+hub = LiveHub()
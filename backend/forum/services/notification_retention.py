@@ -0,0 +1,215 @@
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from forum.models import Notification, NotificationArchive
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationRetention:
+    """
+    Срок хранения уведомлений: прочитанные старше FORUM_NOTIFICATIONS_RETENTION_DAYS
+    переносятся в NotificationArchive (или удаляются, если FORUM_NOTIFICATIONS_ARCHIVE=False).
+
+    Работа идет пачками по FORUM_NOTIFICATIONS_PURGE_BATCH строк, каждая пачка -
+    отдельная короткая транзакция: блокируются только строки пачки, а не таблица.
+    На Postgres строки выбираются FOR UPDATE SKIP LOCKED, поэтому параллельный
+    запуск или одновременный read не ждут друг друга.
+    Непрочитанные уведомления не трогаются независимо от возраста.
+    """
+
+    FIELDS = ('id', 'recipient_id', 'actor_id', 'verb', 'target_link', 'actor_count', 'timestamp')
+
+    @staticmethod
+    def cutoff(days=None):
+        days = getattr(settings, 'FORUM_NOTIFICATIONS_RETENTION_DAYS', 90) if days is None else days
+        return timezone.now() - timedelta(days=days)
+
+    @classmethod
+    def expired(cls, cutoff):
+        return Notification.objects.filter(is_read=True, timestamp__lt=cutoff)
+
+    @classmethod
+    def purge_batch(cls, cutoff, batch_size, archive=True):
+        """Одна пачка: выбрать, скопировать в архив, удалить. Returns: число перенесенных строк"""
+        with transaction.atomic():
+            rows = list(
+                cls.expired(cutoff)
+                .select_for_update(skip_locked=True)
+                .order_by('pk')
+                .values(*cls.FIELDS)[:batch_size]
+            )
+            if not rows:
+                return 0
+            if archive:
+                NotificationArchive.objects.bulk_create(
+                    [NotificationArchive(**row) for row in rows], ignore_conflicts=True
+                )
+            Notification.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        return len(rows)
+
+    @classmethod
+    def purge(cls, days=None, batch_size=None, archive=None, max_batches=None, pause=0.0):
+        """
+        Переносит все просроченные уведомления (или не больше max_batches пачек).
+        pause - секунды между пачками, чтобы не забирать IO у рабочих запросов.
+        Returns: {'moved', 'batches', 'elapsed_ms'}
+        """
+        batch_size = batch_size or getattr(settings, 'FORUM_NOTIFICATIONS_PURGE_BATCH', 1000)
+        archive = getattr(settings, 'FORUM_NOTIFICATIONS_ARCHIVE', True) if archive is None else archive
+        cutoff = cls.cutoff(days)
+
+        started = time.monotonic()
+        moved = batches = 0
+        while max_batches is None or batches < max_batches:
+            count = cls.purge_batch(cutoff, batch_size, archive=archive)
+            if not count:
+                break
+            moved += count
+            batches += 1
+            if pause:
+                time.sleep(pause)
+
+        if archive and moved:
+            NotificationArchivePartitions.ensure()
+        return {'moved': moved, 'batches': batches, 'elapsed_ms': int((time.monotonic() - started) * 1000)}
+
+
+class NotificationArchivePartitions:
+    """
+    Месячные партиции NotificationArchive на Postgres (PARTITION BY RANGE (timestamp)).
+
+    Горячая таблица Notification остается обычной: на ней FK, агрегация и
+    select_for_update, а размер ограничивает NotificationRetention. Партиционируется
+    архив - в него только дописывают, и старый месяц удаляется DROP TABLE
+    мгновенно, без DELETE и VACUUM.
+
+    Включается один раз командой partition_notification_archive; после этого
+    purge и команда заранее создают партиции на FORUM_NOTIFICATIONS_PARTITIONS_AHEAD месяцев.
+    На других СУБД все методы ничего не делают.
+    """
+
+    @staticmethod
+    def table():
+        return NotificationArchive._meta.db_table
+
+    @staticmethod
+    def supported():
+        return connection.vendor == 'postgresql'
+
+    @classmethod
+    def is_partitioned(cls):
+        if not cls.supported():
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+                [cls.table()],
+            )
+            return cursor.fetchone() is not None
+
+    @staticmethod
+    def month_start(value):
+        return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def next_month(value):
+        return value.replace(year=value.year + 1, month=1) if value.month == 12 else value.replace(month=value.month + 1)
+
+    @classmethod
+    def partition_name(cls, month):
+        return f"{cls.table()}_{month:%Y_%m}"
+
+    @classmethod
+    def create_partitions(cls, cursor, start, end):
+        """Партиции на каждый месяц в [start, end)"""
+        month = cls.month_start(start)
+        created = []
+        while month < end:
+            following = cls.next_month(month)
+            name = cls.partition_name(month)
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {cls.table()} "
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [month, following],
+            )
+            created.append(name)
+            month = following
+        return created
+
+    @classmethod
+    def horizon(cls, months_ahead=None):
+        """Начало месяца, до которого партиции должны уже существовать"""
+        months_ahead = getattr(settings, 'FORUM_NOTIFICATIONS_PARTITIONS_AHEAD', 3) if months_ahead is None else months_ahead
+        end = cls.month_start(timezone.now())
+        for _ in range(months_ahead + 1):
+            end = cls.next_month(end)
+        return end
+
+    @classmethod
+    def ensure(cls, months_ahead=None):
+        """Партиции от текущего месяца на months_ahead вперед. Returns: имена партиций"""
+        if not cls.is_partitioned():
+            return []
+        with connection.cursor() as cursor:
+            return cls.create_partitions(cursor, timezone.now(), cls.horizon(months_ahead))
+
+    @classmethod
+    def convert(cls):
+        """
+        Превращает обычную таблицу архива в партиционированную: новая таблица
+        с PRIMARY KEY (id, timestamp), партиции на весь диапазон данных, перенос строк.
+        Выполняется в одной транзакции; на время переноса архив заблокирован,
+        горячая таблица уведомлений - нет.
+        """
+        if not cls.supported() or cls.is_partitioned():
+            return False
+        table = cls.table()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+            cursor.execute(f"SELECT MIN(timestamp) FROM {table}")
+            oldest = cursor.fetchone()[0] or timezone.now()
+
+            cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+            cursor.execute(
+                f"CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)"
+            )
+            # Строки вне созданных месяцев (например, с часами из будущего) попадут сюда
+            cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+            cls.create_partitions(cursor, oldest, cls.horizon())
+
+            cursor.execute(f"INSERT INTO {table} SELECT * FROM {table}_unpartitioned")
+            cursor.execute(f"DROP TABLE {table}_unpartitioned")
+            # PK обязан включать ключ партиционирования; имена те же, что создал Django
+            cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, timestamp)")
+            cursor.execute(f"CREATE INDEX forum_notif_arch_rcpt_ts_idx ON {table} (recipient_id, timestamp DESC)")
+        logger.info(f"Partitioned {table} by month starting {oldest:%Y-%m}")
+        return True
+
+    @classmethod
+    def drop_older_than(cls, months):
+        """Удаляет месячные партиции архива целиком старше months месяцев. Returns: имена"""
+        if not cls.is_partitioned():
+            return []
+        boundary = cls.month_start(timezone.now())
+        for _ in range(months):
+            boundary = (boundary - timedelta(days=1)).replace(day=1)
+        prefix = f"{cls.table()}_"
+        dropped = []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = %s",
+                [cls.table()],
+            )
+            for (name,) in cursor.fetchall():
+                # Партиции названы по месяцу (_2026_01); _default не трогаем
+                if name.startswith(prefix) and name[len(prefix):] != 'default' and name[len(prefix):] < f"{boundary:%Y_%m}":
+                    cursor.execute(f"DROP TABLE {name}")
+                    dropped.append(name)
+        return dropped
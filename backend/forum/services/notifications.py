@@ -0,0 +1,242 @@
+import json
+import logging
+from collections import OrderedDict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from forum.models import Notification, NotificationActor
+from forum.services.live_events import LiveEvents
+from forum.services.redis_client import REDIS_ERRORS, get_redis
+from forum.services.unread_counter import UnreadCounter
+
+logger = logging.getLogger(__name__)
+
+
+class PostNotifications:
+    """
+    Уведомления авторам о действиях других пользователей (лайк, комментарий, ответ, форк).
+
+    Запрос не пишет в Notification: событие кладется в Redis LIST, а задача
+    flush_notifications раз в FORUM_NOTIFICATIONS_FLUSH_INTERVAL секунд забирает
+    пачку и пишет ее через bulk_create/bulk_update.
+
+    Повторы схлопываются: события с одинаковыми (recipient, verb, target_link)
+    складываются в один непрочитанный агрегат - actor становится последним
+    пользователем, actor_count растет ("alice и еще 41 лайкнули ваш пост").
+    После прочтения следующее событие начинает новый агрегат.
+    actor_count - число разных пользователей: уже учтенные хранятся в
+    NotificationActor, и повтор (лайк-анлайк-лайк, в той же или в следующей
+    пачке) счетчик не увеличивает.
+
+    Забранная пачка не теряется: drain переносит события в PROCESSING_KEY,
+    ack снимает их после записи, requeue возвращает в голову очереди при
+    исключении, а recover в начале следующего сброса - оставшиеся после
+    убитого воркера (повтор уже записанного события не увеличит actor_count).
+
+    Без Redis событие применяется сразу, той же логикой агрегации.
+    """
+
+    QUEUE_KEY = 'forum:notifications:queue'
+    PROCESSING_KEY = 'forum:notifications:processing'
+
+    # Голова очереди переезжает в обрабатываемые одним скриптом: между LTRIM и RPUSH события не пропадут
+    _CLAIM = (
+        "local items = redis.call('lrange', KEYS[1], 0, ARGV[1] - 1) "
+        "if #items > 0 then "
+        "redis.call('ltrim', KEYS[1], #items, -1) "
+        "redis.call('rpush', KEYS[2], unpack(items)) "
+        "end "
+        "return items"
+    )
+    # Пачка лежит в начале обрабатываемых, поэтому LREM находит каждое событие сразу
+    _ACK = "for i = 1, #ARGV do redis.call('lrem', KEYS[1], 1, ARGV[i]) end return #ARGV"
+    _REQUEUE = (
+        "for i = #ARGV, 1, -1 do "
+        "redis.call('lpush', KEYS[1], ARGV[i]) "
+        "redis.call('lrem', KEYS[2], 1, ARGV[i]) "
+        "end "
+        "return #ARGV"
+    )
+    _RECOVER = (
+        "local items = redis.call('lrange', KEYS[2], 0, -1) "
+        "for i = #items, 1, -1 do redis.call('lpush', KEYS[1], items[i]) end "
+        "redis.call('del', KEYS[2]) "
+        "return #items"
+    )
+
+    # --- события ---
+
+    @classmethod
+    def post_liked(cls, post_id, author_id, actor_id):
+        cls.enqueue(author_id, actor_id, 'liked', f"/post/{post_id}")
+
+    @classmethod
+    def post_commented(cls, post_id, author_id, actor_id):
+        cls.enqueue(author_id, actor_id, 'commented', f"/post/{post_id}")
+
+    @classmethod
+    def comment_replied(cls, post_id, comment_author_id, actor_id):
+        cls.enqueue(comment_author_id, actor_id, 'replied', f"/post/{post_id}")
+
+    @classmethod
+    def post_forked(cls, post_id, author_id, actor_id):
+        cls.enqueue(author_id, actor_id, 'forked', f"/post/{post_id}")
+
+    # --- очередь ---
+
+    @classmethod
+    def enqueue(cls, recipient_id, actor_id, verb, target_link):
+        # Не уведомляем о собственных действиях и об анонимных
+        if actor_id is None or recipient_id is None or actor_id == recipient_id:
+            return
+        event = {'recipient': recipient_id, 'actor': actor_id, 'verb': verb, 'target': target_link}
+
+        r = get_redis()
+        if r is not None:
+            try:
+                r.rpush(cls.QUEUE_KEY, json.dumps(event))
+                return
+            except REDIS_ERRORS as e:
+                logger.warning(f"Notification queue unavailable, writing directly: {e}")
+        cls.apply([event])
+
+    @classmethod
+    def drain(cls, batch_size):
+        """Атомарно переносит до batch_size событий из головы очереди в обрабатываемые. Returns: сырые события"""
+        r = get_redis()
+        if r is None:
+            return []
+        return r.eval(cls._CLAIM, 2, cls.QUEUE_KEY, cls.PROCESSING_KEY, batch_size)
+
+    @classmethod
+    def ack(cls, raw):
+        """Пачка записана: снимаем ее из обрабатываемых"""
+        r = get_redis()
+        if r is not None and raw:
+            r.eval(cls._ACK, 1, cls.PROCESSING_KEY, *raw)
+
+    @classmethod
+    def requeue(cls, raw):
+        """Запись упала: пачка возвращается в голову очереди в прежнем порядке"""
+        r = get_redis()
+        if r is not None and raw:
+            r.eval(cls._REQUEUE, 2, cls.QUEUE_KEY, cls.PROCESSING_KEY, *raw)
+
+    @classmethod
+    def recover(cls):
+        """Возвращает в очередь события, забранные воркером, который умер до ack/requeue"""
+        r = get_redis()
+        if r is None:
+            return 0
+        return r.eval(cls._RECOVER, 2, cls.QUEUE_KEY, cls.PROCESSING_KEY)
+
+    @classmethod
+    def flush(cls):
+        """Переносит очередь в БД пачками. Returns: (событий, новых строк, обновленных агрегатов)"""
+        batch_size = getattr(settings, 'FORUM_NOTIFICATIONS_FLUSH_BATCH', 1000)
+        max_batches = getattr(settings, 'FORUM_NOTIFICATIONS_FLUSH_MAX_BATCHES', 20)
+        events = created = updated = 0
+        recovered = cls.recover()
+        if recovered:
+            logger.warning(f"Requeued {recovered} notification events left by an interrupted flush")
+        # Ограничиваем число пачек, чтобы задача не растягивалась дольше своего окна
+        for _ in range(max_batches):
+            raw = cls.drain(batch_size)
+            if not raw:
+                break
+            try:
+                batch_created, batch_updated = cls.apply([json.loads(item) for item in raw])
+            except Exception:
+                cls.requeue(raw)
+                raise
+            cls.ack(raw)
+            events += len(raw)
+            created += batch_created
+            updated += batch_updated
+        return events, created, updated
+
+    # --- запись ---
+
+    @staticmethod
+    def _group(events):
+        """{(recipient, verb, target): [разные actor, последний действовавший - в конце]}"""
+        groups = OrderedDict()
+        for event in events:
+            key = (event['recipient'], event['verb'], event['target'])
+            actors = groups.setdefault(key, {})
+            actors.pop(event['actor'], None)
+            actors[event['actor']] = None
+        return OrderedDict((key, list(actors)) for key, actors in groups.items())
+
+    @classmethod
+    def apply(cls, events):
+        """Пишет пачку событий: агрегаты обновляются одним bulk_update, новые строки - bulk_create"""
+        groups = cls._group(events)
+        if not groups:
+            return 0, 0
+
+        lookup = Q()
+        for recipient, verb, target in groups:
+            lookup |= Q(recipient_id=recipient, verb=verb, target_link=target)
+
+        now = timezone.now()
+        with transaction.atomic():
+            existing = {}
+            rows = Notification.objects.select_for_update().filter(lookup, is_read=False).order_by('timestamp')
+            for notification in rows:
+                # Если непрочитанных агрегатов несколько, дописываем в самый свежий
+                existing[(notification.recipient_id, notification.verb, notification.target_link)] = notification
+
+            # Кто уже учтен в найденных агрегатах - одним запросом на пачку
+            seen = set()
+            if existing:
+                seen = set(
+                    NotificationActor.objects.filter(
+                        notification__in=existing.values(),
+                        user_id__in={actor for actors in groups.values() for actor in actors},
+                    ).values_list('notification_id', 'user_id')
+                )
+
+            to_update, to_create, links = [], [], []
+            for key, actors in groups.items():
+                notification = existing.get(key)
+                if notification is not None:
+                    new_actors = [actor for actor in actors if (notification.pk, actor) not in seen]
+                    if not new_actors:
+                        continue
+                    notification.actor_id = actors[-1]
+                    notification.actor_count += len(new_actors)
+                    notification.timestamp = now
+                    to_update.append(notification)
+                    links.extend(NotificationActor(notification=notification, user_id=actor) for actor in new_actors)
+                else:
+                    recipient, verb, target = key
+                    notification = Notification(
+                        recipient_id=recipient, actor_id=actors[-1], verb=verb,
+                        target_link=target, actor_count=len(actors),
+                    )
+                    to_create.append(notification)
+                    links.extend(NotificationActor(notification=notification, user_id=actor) for actor in actors)
+
+            Notification.objects.bulk_update(to_update, ['actor', 'actor_count', 'timestamp'])
+            Notification.objects.bulk_create(to_create)
+            # notification_id новых агрегатов bulk_create берет из уже сохраненных объектов
+            NotificationActor.objects.bulk_create(links, ignore_conflicts=True)
+            # Агрегаты и так непрочитанные, счетчик растет только от новых строк
+            for notification in to_create:
+                recipient_id = notification.recipient_id
+                transaction.on_commit(lambda recipient_id=recipient_id: UnreadCounter.add(recipient_id, 1))
+            transaction.on_commit(lambda: cls.push_live(to_create + to_update))
+        return len(to_create), len(to_update)
+
+    @staticmethod
+    def push_live(notifications):
+        """Отправляет новые и обновленные агрегаты открытым живым каналам получателей"""
+        if not LiveEvents.enabled():
+            return
+        unread = {n.recipient_id: None for n in notifications}
+        for recipient_id in unread:
+            unread[recipient_id] = UnreadCounter.get(recipient_id)
+        LiveEvents.notifications_changed(notifications, unread)
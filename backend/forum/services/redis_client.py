@@ -0,0 +1,45 @@
+import logging
+import uuid
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, при которых сервисы на Redis молча уходят на запасной путь через БД
+REDIS_ERRORS = (RedisError, OSError)
+
+
+def get_redis():
+    """
+    Сырой клиент Redis из CACHES['default'] (django-redis).
+    Возвращает None, если кеш не на Redis (например, LocMemCache в тестах):
+    структуры вроде ZSET/SET/HyperLogLog через API кеша Django недоступны.
+    """
+    from django_redis import get_redis_connection
+
+    try:
+        return get_redis_connection('default')
+    except NotImplementedError:
+        return None
+
+
+# Снять блокировку может только ее владелец: чужой токен (блокировка истекла
+# и ее взял другой процесс) оставляет ключ нетронутым
+_RELEASE_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+def acquire_lock(r, key, timeout):
+    """SET key token NX EX timeout. Returns: токен владельца или None, если блокировка занята"""
+    token = uuid.uuid4().hex
+    return token if r.set(key, token, nx=True, ex=timeout) else None
+
+
+def release_lock(r, key, token):
+    r.eval(_RELEASE_LOCK, 1, key, token)
+
+
+_REFRESH_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('expire', KEYS[1], ARGV[2]) end return 0"
+
+
+def refresh_lock(r, key, token, timeout):
+    """Продлевает свою блокировку. Returns: False, если она уже истекла или принадлежит другому"""
+    return bool(r.eval(_REFRESH_LOCK, 1, key, token, timeout))
@@ -0,0 +1,80 @@
+import logging
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Q
+from django.utils.html import escape
+
+logger = logging.getLogger(__name__)
+
+
+class PostSearch:
+    """
+    Поиск по постам форума.
+
+    На Postgres - полнотекстовый: websearch-запрос по взвешенному search_vector
+    (GIN-индекс, триггер из миграции 0006), сортировка по SearchRank
+    и подсвеченный фрагмент описания в search_headline.
+
+    На SQLite - прежнее поведение DRF SearchFilter: каждое слово ищется
+    через ILIKE '%term%' в title, description или code_snippet.
+    """
+
+    # Конфигурация должна совпадать с той, что использует триггер в миграции 0006.
+    # 'simple' без стемминга: посты смешивают русский, английский и код
+    CONFIG = 'simple'
+    FIELDS = ('title', 'description', 'code_snippet')
+    # ts_headline не экранирует текст описания: подсветку отмечают управляющие символы,
+    # а в <mark> они превращаются уже после экранирования (render_headline)
+    START_SEL = '\x02'
+    STOP_SEL = '\x03'
+    HEADLINE_OPTIONS = {
+        'start_sel': START_SEL,
+        'stop_sel': STOP_SEL,
+        'max_words': 30,
+        'min_words': 10,
+        'max_fragments': 2,
+    }
+
+    @staticmethod
+    def is_full_text_available():
+        return connection.vendor == 'postgresql'
+
+    @classmethod
+    def full_text(cls, queryset, text):
+        """Совпадения по search_vector, от более релевантных к менее"""
+        query = SearchQuery(text, config=cls.CONFIG, search_type='websearch')
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(
+                search_rank=SearchRank(F('search_vector'), query),
+                # ts_headline дорогой, но Postgres считает его уже после ORDER BY/LIMIT - только для страницы
+                search_headline=SearchHeadline('description', query, config=cls.CONFIG, **cls.HEADLINE_OPTIONS),
+            )
+            .order_by('-search_rank', '-pk')
+        )
+
+    @classmethod
+    def render_headline(cls, headline):
+        """Сырой фрагмент ts_headline -> безопасный HTML, где размечены только совпадения"""
+        if headline is None:
+            return None
+        return escape(headline).replace(cls.START_SEL, '<mark>').replace(cls.STOP_SEL, '</mark>')
+
+    @classmethod
+    def ilike(cls, queryset, terms):
+        """Каждое слово должно встретиться хотя бы в одном из полей (как в DRF SearchFilter)"""
+        for term in terms:
+            condition = Q()
+            for field in cls.FIELDS:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    @classmethod
+    def search(cls, queryset, text):
+        terms = text.replace(',', ' ').split()
+        if not terms:
+            return queryset
+        if cls.is_full_text_available():
+            return cls.full_text(queryset, ' '.join(terms))
+        return cls.ilike(queryset, terms)
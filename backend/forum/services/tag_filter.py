@@ -0,0 +1,52 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count
+from taggit.models import TaggedItem
+
+from forum.models import ForumPost
+
+
+class TagFilter:
+    """
+    Фильтр постов по набору тегов одним подзапросом, без JOIN на каждый тег.
+
+    mode='all' (AND): посты, у которых есть все теги -
+        SELECT object_id FROM taggit_taggeditem JOIN taggit_tag ...
+        WHERE content_type_id = ? AND name IN (...)
+        GROUP BY object_id HAVING COUNT(tag_id) = <число тегов>
+    mode='any' (OR): посты хотя бы с одним тегом - тот же подзапрос без HAVING.
+
+    Внешний запрос остается WHERE id IN (подзапрос) с прежней сортировкой,
+    поэтому keyset-пагинация по (created_at, id) работает как без фильтра.
+    """
+
+    ALL = 'all'
+    ANY = 'any'
+    MODES = (ALL, ANY)
+
+    @staticmethod
+    def normalize(names):
+        """Уникальные имена в исходном порядке - повторы сломали бы HAVING COUNT"""
+        return list(dict.fromkeys(names))
+
+    @classmethod
+    def post_ids(cls, names, mode=ALL):
+        """Подзапрос с id постов, подходящих под теги"""
+        names = cls.normalize(names)
+        tagged = TaggedItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(ForumPost),
+            tag__name__in=names,
+        ).order_by()
+        if mode == cls.ANY or len(names) == 1:
+            return tagged.values('object_id')
+        return (
+            tagged.values('object_id')
+            .annotate(matched=Count('tag'))
+            .filter(matched=len(names))
+            .values('object_id')
+        )
+
+    @classmethod
+    def apply(cls, queryset, names, mode=ALL):
+        if not names:
+            return queryset
+        return queryset.filter(pk__in=cls.post_ids(names, mode))
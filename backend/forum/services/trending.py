@@ -0,0 +1,92 @@
+import logging
+import time
+from django.db import transaction
+from django.utils import timezone
+
+from forum.models import ForumPost, compute_trending_score
+
+logger = logging.getLogger(__name__)
+
+
+class TrendingScoreEngine:
+    """
+    Массовый пересчет trending_score.
+
+    Вместо 3 запросов на каждый пост (два COUNT + save) идем по таблице чанками
+    по первичному ключу: один SELECT денормализованных счетчиков на чанк, расчет
+    формулы в памяти и один bulk_update только для изменившихся строк.
+    """
+
+    DEFAULT_CHUNK_SIZE = 2000
+
+    @staticmethod
+    def _fetch_chunk(queryset, last_pk, chunk_size):
+        return list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', 'created_at', 'forks_count', 'trending_score', 'likes_count', 'comments_count')
+            [:chunk_size]
+        )
+
+    @classmethod
+    def recompute(cls, post_ids=None, chunk_size=None):
+        """
+        Пересчитывает trending_score для всех постов (или только для post_ids).
+
+        Returns:
+            dict со сводкой: total, updated, elapsed_ms и список chunks
+            (rows, updated, fetch_ms, compute_ms, write_ms по каждому чанку).
+        """
+        chunk_size = chunk_size or cls.DEFAULT_CHUNK_SIZE
+        queryset = ForumPost.objects.all()
+        if post_ids is not None:
+            queryset = queryset.filter(pk__in=list(post_ids))
+
+        # Одна точка отсчета на весь прогон, чтобы скоры были сравнимы между чанками
+        now = timezone.now()
+        started = time.monotonic()
+        stats = {'total': 0, 'updated': 0, 'chunks': []}
+        last_pk = 0
+
+        while True:
+            t0 = time.monotonic()
+            rows = cls._fetch_chunk(queryset, last_pk, chunk_size)
+            if not rows:
+                break
+            t1 = time.monotonic()
+
+            changed = []
+            for pk, created_at, forks, old_score, likes, comments in rows:
+                new_score = compute_trending_score(likes, comments, forks, created_at, now)
+                # Обновляем только если score изменился (оптимизация)
+                if new_score != old_score:
+                    changed.append(ForumPost(pk=pk, trending_score=new_score))
+            t2 = time.monotonic()
+
+            if changed:
+                with transaction.atomic():
+                    ForumPost.objects.bulk_update(changed, ['trending_score'], batch_size=500)
+            t3 = time.monotonic()
+
+            chunk = {
+                'chunk': len(stats['chunks']) + 1,
+                'rows': len(rows),
+                'updated': len(changed),
+                'fetch_ms': round((t1 - t0) * 1000, 1),
+                'compute_ms': round((t2 - t1) * 1000, 1),
+                'write_ms': round((t3 - t2) * 1000, 1),
+            }
+            stats['chunks'].append(chunk)
+            stats['total'] += chunk['rows']
+            stats['updated'] += chunk['updated']
+            logger.info(
+                f"Trending chunk {chunk['chunk']}: {chunk['updated']}/{chunk['rows']} rows updated "
+                f"(fetch {chunk['fetch_ms']}ms, compute {chunk['compute_ms']}ms, write {chunk['write_ms']}ms)"
+            )
+
+            last_pk = rows[-1][0]
+            if len(rows) < chunk_size:
+                break
+
+        stats['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return stats
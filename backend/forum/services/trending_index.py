@@ -0,0 +1,268 @@
+import hashlib
+import logging
+from collections import defaultdict
+from django.contrib.contenttypes.models import ContentType
+from taggit.models import TaggedItem
+
+from forum.models import ForumPost
+from forum.services.redis_client import REDIS_ERRORS, get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class TrendingIndex:
+    """
+    Рейтинг трендов в Redis ZSET: score = trending_score, member = id поста.
+
+    Помимо общего рейтинга держим по ZSET на каждый язык и на каждый тег.
+    Лента с фильтрами (?language=, ?tags=) читается как ZREVRANGE по одному ключу
+    или по пересечению ключей (ZINTERSTORE; для tags_mode=any теги сначала
+    объединяются ZUNIONSTORE; результат кешируется на QUERY_TTL секунд),
+    а затем посты достаются из БД по первичному ключу.
+
+    id хранится с ведущими нулями: при равном score Redis сортирует members
+    лексикографически, и порядок совпадает с SQL (-trending_score, -id).
+
+    Полная пересборка пишет в новое "поколение" ключей и переключает указатель
+    одной командой, поэтому читатели никогда не видят наполовину собранный индекс.
+    """
+
+    PREFIX = 'forum:trending:z'
+    GEN_KEY = 'forum:trending:z:gen'
+    BUILDING_KEY = 'forum:trending:z:building'
+    SEQ_KEY = 'forum:trending:z:seq'
+    QUERY_TTL = 30
+    OLD_GEN_TTL = 60
+    BUILD_TTL = 60 * 60
+    SCAN_BATCH = 500
+
+    # --- ключи ---
+
+    @classmethod
+    def _key(cls, gen, *parts):
+        return ':'.join([cls.PREFIX, f'g{gen}', *parts])
+
+    @staticmethod
+    def _member(pk):
+        return f'{pk:012d}'
+
+    @classmethod
+    def _keys_for(cls, gen, language, tags):
+        keys = [cls._key(gen, 'all'), cls._key(gen, 'lang', language)]
+        keys.extend(cls._key(gen, 'tag', name) for name in tags)
+        return keys
+
+    @classmethod
+    def _filter_keys(cls, gen, language=None, tags=()):
+        keys = []
+        if language:
+            keys.append(cls._key(gen, 'lang', language))
+        keys.extend(cls._key(gen, 'tag', name) for name in tags)
+        return keys
+
+    @classmethod
+    def _generations(cls, r):
+        """Текущее поколение и то, что сейчас собирается (в него тоже пишем обновления)"""
+        return {int(gen) for gen in r.mget(cls.GEN_KEY, cls.BUILDING_KEY) if gen is not None}
+
+    @staticmethod
+    def _tags_for(post_ids):
+        """{post_id: [имена тегов]} одним запросом к TaggedItem"""
+        tags = defaultdict(list)
+        tagged = TaggedItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(ForumPost), object_id__in=post_ids
+        ).values_list('object_id', 'tag__name')
+        for object_id, name in tagged:
+            tags[object_id].append(name)
+        return tags
+
+    # --- запись ---
+
+    @classmethod
+    def _write_post(cls, r, gen, pk, score, keys):
+        member = cls._member(pk)
+        membership_key = cls._key(gen, 'm', str(pk))
+        stale = {key.decode() for key in r.smembers(membership_key)} - set(keys)
+
+        pipe = r.pipeline()
+        for key in stale:
+            pipe.zrem(key, member)
+        for key in keys:
+            pipe.zadd(key, {member: score})
+        pipe.delete(membership_key)
+        pipe.sadd(membership_key, *keys)
+        pipe.execute()
+
+    @classmethod
+    def update_post(cls, post, tags=None):
+        """Кладет пост во все рейтинги его языка и тегов и убирает из тех, куда он больше не относится"""
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            generations = cls._generations(r)
+            if not generations:
+                return
+            if tags is None:
+                tags = list(post.tags.names())
+            for gen in generations:
+                cls._write_post(r, gen, post.pk, post.trending_score, cls._keys_for(gen, post.language, tags))
+        except REDIS_ERRORS as e:
+            logger.warning(f"Trending index update failed for post {post.pk}: {e}")
+
+    @classmethod
+    def update_posts(cls, posts):
+        """Пачка постов: теги достаются одним запросом на всю пачку"""
+        if get_redis() is None or not posts:
+            return
+        tags = cls._tags_for([post.pk for post in posts])
+        for post in posts:
+            cls.update_post(post, tags=tags[post.pk])
+
+    @classmethod
+    def update_post_by_id(cls, post_id):
+        if get_redis() is None:
+            return
+        post = ForumPost.objects.filter(pk=post_id).first()
+        if post is not None:
+            cls.update_post(post)
+
+    @classmethod
+    def remove_post(cls, post_id):
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            member = cls._member(post_id)
+            for gen in cls._generations(r):
+                membership_key = cls._key(gen, 'm', str(post_id))
+                pipe = r.pipeline()
+                for key in r.smembers(membership_key):
+                    pipe.zrem(key, member)
+                pipe.delete(membership_key)
+                pipe.execute()
+        except REDIS_ERRORS as e:
+            logger.warning(f"Trending index removal failed for post {post_id}: {e}")
+
+    @classmethod
+    def rebuild(cls, chunk_size=2000):
+        """
+        Полностью пересобирает индекс из БД (холодный старт, периодическая сверка).
+        Returns: количество проиндексированных постов или None, если Redis недоступен.
+        """
+        r = get_redis()
+        if r is None:
+            return None
+
+        gen = r.incr(cls.SEQ_KEY)
+        r.set(cls.BUILDING_KEY, gen, ex=cls.BUILD_TTL)
+        total = 0
+        last_pk = 0
+
+        while True:
+            rows = list(
+                ForumPost.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'language', 'trending_score')[:chunk_size]
+            )
+            if not rows:
+                break
+
+            tags = cls._tags_for([row[0] for row in rows])
+            pipe = r.pipeline(transaction=False)
+            for pk, language, score in rows:
+                member = cls._member(pk)
+                keys = cls._keys_for(gen, language, tags[pk])
+                for key in keys:
+                    pipe.zadd(key, {member: score})
+                pipe.sadd(cls._key(gen, 'm', str(pk)), *keys)
+            pipe.execute()
+
+            total += len(rows)
+            last_pk = rows[-1][0]
+            if len(rows) < chunk_size:
+                break
+
+        previous = r.getset(cls.GEN_KEY, gen)
+        r.delete(cls.BUILDING_KEY)
+        if previous is not None and int(previous) != gen:
+            pipe = r.pipeline(transaction=False)
+            for key in r.scan_iter(match=cls._key(int(previous), '*'), count=1000):
+                pipe.expire(key, cls.OLD_GEN_TTL)
+            pipe.execute()
+
+        logger.info(f"Trending index rebuilt: generation {gen}, {total} posts")
+        return total
+
+    # --- чтение ---
+
+    @classmethod
+    def _stored(cls, r, gen, op, keys):
+        """ZINTERSTORE/ZUNIONSTORE во временный ключ, повторные запросы читают готовый ZSET"""
+        digest = hashlib.sha1('\0'.join([op, *sorted(keys)]).encode()).hexdigest()
+        dest = cls._key(gen, 'q', digest)
+        if not r.exists(dest):
+            pipe = r.pipeline()
+            if op == 'union':
+                pipe.zunionstore(dest, keys, aggregate='MAX')
+            else:
+                pipe.zinterstore(dest, keys, aggregate='MAX')
+            pipe.expire(dest, cls.QUERY_TTL)
+            pipe.execute()
+        return dest
+
+    @classmethod
+    def _source_key(cls, r, gen, language, tags, tags_mode='all'):
+        if tags_mode == 'any' and len(tags) > 1:
+            # Сначала объединение тегов, затем пересечение с языком
+            keys = cls._filter_keys(gen, language)
+            keys.append(cls._stored(r, gen, 'union', [cls._key(gen, 'tag', name) for name in tags]))
+        else:
+            keys = cls._filter_keys(gen, language, tags)
+        if not keys:
+            return cls._key(gen, 'all')
+        if len(keys) == 1:
+            return keys[0]
+        return cls._stored(r, gen, 'inter', keys)
+
+    @classmethod
+    def _start_after(cls, r, key, value, pk):
+        """Позиция первого элемента после курсора (value, pk) в порядке убывания"""
+        member = cls._member(pk)
+        if r.zscore(key, member) == value:
+            return r.zrevrank(key, member) + 1
+
+        # Пост из курсора сменил score или пропал: считаем позицию по score
+        # и пропускаем равные score с id не меньше курсора
+        start = r.zcount(key, f'({value!r}', '+inf')
+        while True:
+            batch = r.zrevrange(key, start, start + cls.SCAN_BATCH - 1, withscores=True)
+            for raw, score in batch:
+                if score != value or int(raw) < pk:
+                    return start
+                start += 1
+            if len(batch) < cls.SCAN_BATCH:
+                return start
+
+    @classmethod
+    def page(cls, language=None, tags=(), tags_mode='all', cursor=None, page_size=10):
+        """
+        Страница рейтинга: ([(post_id, score), ...], has_more)
+        или None, если индекс недоступен и нужно идти в БД.
+        """
+        r = get_redis()
+        if r is None:
+            return None
+        try:
+            gen = r.get(cls.GEN_KEY)
+            if gen is None:
+                return None
+            key = cls._source_key(r, int(gen), language, tags, tags_mode)
+            start = cls._start_after(r, key, *cursor) if cursor else 0
+            items = r.zrevrange(key, start, start + page_size, withscores=True)
+        except REDIS_ERRORS as e:
+            logger.warning(f"Trending index read failed: {e}")
+            return None
+
+        entries = [(int(raw), score) for raw, score in items[:page_size]]
+        return entries, len(items) > page_size
@@ -0,0 +1,119 @@
+import logging
+
+from forum.services.redis_client import REDIS_ERRORS, get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class TrendingUpdateQueue:
+    """
+    Схлопывание событий пересчета trending score.
+
+    Сигналы (лайк, снятие лайка, комментарий, удаление комментария) не ставят
+    по задаче Celery на каждое событие, а добавляют id поста в Redis SET.
+    Периодическая задача flush_dirty_trending_scores забирает накопившиеся id
+    и пересчитывает каждый пост один раз за окно, сколько бы событий по нему ни пришло.
+
+    Забранные id не теряются при ошибке: drain переносит их в PROCESSING_KEY,
+    ack снимает после пересчета, requeue возвращает в очередь при исключении,
+    а recover в начале следующего сброса - оставшиеся после убитого воркера.
+
+    Метрики в HASH: events - всего событий, marked - сколько из них реально
+    добавили пост в очередь, collapsed = events - marked, flushes/recomputed - работа задачи.
+    """
+
+    DIRTY_KEY = 'forum:trending:dirty'
+    PROCESSING_KEY = 'forum:trending:dirty:processing'
+    METRICS_KEY = 'forum:trending:dirty:metrics'
+
+    @classmethod
+    def mark_dirty(cls, post_id):
+        r = get_redis()
+        if r is not None:
+            try:
+                pipe = r.pipeline()
+                pipe.sadd(cls.DIRTY_KEY, post_id)
+                pipe.hincrby(cls.METRICS_KEY, 'events', 1)
+                added, _ = pipe.execute()
+                if added:
+                    r.hincrby(cls.METRICS_KEY, 'marked', 1)
+                return
+            except REDIS_ERRORS as e:
+                logger.warning(f"Trending dirty-set unavailable, scheduling post {post_id} directly: {e}")
+
+        # Без Redis - прежнее поведение: отдельная задача с задержкой 5 секунд
+        from forum.tasks import update_single_post_trending_score
+        update_single_post_trending_score.apply_async(args=[post_id], countdown=5)
+
+    # SPOP и SADD в обрабатываемые одной командой: между ними id не может пропасть
+    _CLAIM = (
+        "local ids = redis.call('spop', KEYS[1], ARGV[1]) "
+        "if #ids > 0 then redis.call('sadd', KEYS[2], unpack(ids)) end "
+        "return ids"
+    )
+
+    @classmethod
+    def drain(cls, batch_size):
+        """Атомарно забирает до batch_size id из очереди в обрабатываемые"""
+        r = get_redis()
+        if r is None:
+            return []
+        return [int(raw) for raw in r.eval(cls._CLAIM, 2, cls.DIRTY_KEY, cls.PROCESSING_KEY, batch_size)]
+
+    @classmethod
+    def ack(cls, post_ids):
+        """Пересчет прошел: id больше не нужны"""
+        r = get_redis()
+        if r is not None and post_ids:
+            r.srem(cls.PROCESSING_KEY, *post_ids)
+
+    @classmethod
+    def requeue(cls, post_ids):
+        """Пересчет упал: id возвращаются в очередь до следующего сброса"""
+        r = get_redis()
+        if r is None or not post_ids:
+            return
+        pipe = r.pipeline()
+        pipe.sadd(cls.DIRTY_KEY, *post_ids)
+        pipe.srem(cls.PROCESSING_KEY, *post_ids)
+        pipe.execute()
+
+    @classmethod
+    def recover(cls):
+        """
+        Возвращает в очередь id, забранные воркером, который умер до ack/requeue.
+        Параллельный сброс может в худшем случае пересчитать пост дважды - это безвредно.
+        """
+        r = get_redis()
+        if r is None:
+            return 0
+        pipe = r.pipeline()
+        pipe.scard(cls.PROCESSING_KEY)
+        pipe.sunionstore(cls.DIRTY_KEY, cls.DIRTY_KEY, cls.PROCESSING_KEY)
+        pipe.delete(cls.PROCESSING_KEY)
+        recovered, _, _ = pipe.execute()
+        return recovered
+
+    @classmethod
+    def record_flush(cls, recomputed):
+        r = get_redis()
+        if r is None:
+            return
+        pipe = r.pipeline()
+        pipe.hincrby(cls.METRICS_KEY, 'flushes', 1)
+        pipe.hincrby(cls.METRICS_KEY, 'recomputed', recomputed)
+        pipe.execute()
+
+    @classmethod
+    def get_metrics(cls):
+        r = get_redis()
+        if r is None:
+            return None
+        pipe = r.pipeline()
+        pipe.hgetall(cls.METRICS_KEY)
+        pipe.scard(cls.DIRTY_KEY)
+        raw, pending = pipe.execute()
+        metrics = {name: int(raw.get(name.encode(), 0)) for name in ('events', 'marked', 'flushes', 'recomputed')}
+        metrics['collapsed'] = metrics['events'] - metrics['marked']
+        metrics['pending'] = pending
+        return metrics
@@ -0,0 +1,60 @@
+import logging
+from django.conf import settings
+from django.core.cache import cache
+
+from forum.models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+class UnreadCounter:
+    """
+    Счетчик непрочитанных уведомлений пользователя в кеше (CACHES['default']).
+
+    unread_count читает число из кеша, а не делает COUNT(*) на каждый опрос.
+    Новые строки уведомлений увеличивают счетчик, read уменьшает,
+    mark_all_read обнуляет.
+
+    Сверка с БД - через TTL: ключ живет FORUM_UNREAD_COUNTER_TTL секунд,
+    после чего следующий опрос пересчитывает его одним COUNT. Изменение,
+    пришедшее в момент пересчета, может потеряться, но только до следующей сверки.
+    """
+
+    KEY = 'forum:notifications:unread:{user_id}'
+
+    @classmethod
+    def _key(cls, user_id):
+        return cls.KEY.format(user_id=user_id)
+
+    @staticmethod
+    def ttl():
+        return getattr(settings, 'FORUM_UNREAD_COUNTER_TTL', 10 * 60)
+
+    @classmethod
+    def get(cls, user_id):
+        count = cache.get(cls._key(user_id))
+        if count is None:
+            count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+            cache.add(cls._key(user_id), count, timeout=cls.ttl())
+        return count
+
+    @classmethod
+    def add(cls, user_id, delta):
+        """Сдвигает счетчик, если он закеширован; иначе его посчитает следующий get()"""
+        if not delta:
+            return
+        try:
+            count = cache.incr(cls._key(user_id), delta)
+        except ValueError:
+            return
+        if count < 0:
+            # Разошлись с БД - пусть пересчитается
+            cache.delete(cls._key(user_id))
+
+    @classmethod
+    def reset(cls, user_id, count=0):
+        cache.set(cls._key(user_id), count, timeout=cls.ttl())
+
+    @classmethod
+    def invalidate(cls, user_id):
+        cache.delete(cls._key(user_id))
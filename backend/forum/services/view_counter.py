@@ -0,0 +1,144 @@
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from redis.exceptions import ResponseError
+
+from forum.models import ForumPost
+from forum.services.redis_client import REDIS_ERRORS, acquire_lock, get_redis, release_lock
+
+logger = logging.getLogger(__name__)
+
+
+class PostViewCounter:
+    """
+    Счетчик просмотров ForumPost.views с отложенной записью (write-behind).
+
+    retrieve не трогает строку поста: просмотр - это HINCRBY в Redis HASH.
+    Задача flush_post_views раз в FORUM_VIEWS_FLUSH_INTERVAL секунд переносит
+    накопленное в Postgres пачками UPDATE ... SET views = views + CASE ...,
+    так что горячий пост не собирает очередь блокировок на своей строке.
+
+    Повторные просмотры одного зрителя (пользователь или IP) отсекаются точно:
+    ключ "пост:зритель" ставится SET NX EX FORUM_VIEWS_DEDUP_TTL, и TTL задается
+    только при создании - окно не сдвигается повторными просмотрами.
+    (HyperLogLog тут не годится: он оценивает число зрителей, а не отвечает,
+    был ли конкретный зритель, и на популярном посте терял бы новые просмотры.)
+
+    Сброс выполняется под блокировкой: досрочный и плановый запуск не применяют
+    одну пачку дважды.
+
+    Допустимые потери задаются FORUM_VIEWS_MAX_PENDING: сколько просмотров может
+    висеть в Redis; при превышении сброс запускается досрочно. Если задача упала
+    между UPDATE и очисткой ключа, пачка будет применена повторно (at-least-once).
+    """
+
+    PENDING_KEY = 'forum:views:pending'
+    FLUSHING_KEY = 'forum:views:flushing'
+    PENDING_TOTAL_KEY = 'forum:views:pending:total'
+    SEEN_KEY = 'forum:views:seen:{post_id}:{viewer}'
+    FLUSH_LOCK_KEY = 'forum:views:flush:lock'
+    # С запасом больше времени сброса: истекшая посреди сброса блокировка пустит второй прогон
+    FLUSH_LOCK_TIMEOUT = 300
+    UPDATE_CHUNK = 500
+
+    @staticmethod
+    def viewer_key(request):
+        if request.user.is_authenticated:
+            return f'u:{request.user.pk}'
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        ip = forwarded.split(',')[0].strip() if forwarded else request.META.get('REMOTE_ADDR', '')
+        return f'a:{ip}'
+
+    @classmethod
+    def record(cls, post_id, viewer_key=None):
+        """Учитывает просмотр. Возвращает True, если просмотр засчитан"""
+        r = get_redis()
+        if r is None:
+            # Без Redis (тесты, локальная разработка) - прямой атомарный UPDATE
+            ForumPost.objects.filter(pk=post_id).update(views=F('views') + 1)
+            return True
+
+        try:
+            if viewer_key and getattr(settings, 'FORUM_VIEWS_DEDUP', True):
+                is_new = r.set(
+                    cls.SEEN_KEY.format(post_id=post_id, viewer=viewer_key), 1,
+                    nx=True, ex=getattr(settings, 'FORUM_VIEWS_DEDUP_TTL', 24 * 60 * 60),
+                )
+                if not is_new:
+                    return False
+
+            pipe = r.pipeline()
+            pipe.hincrby(cls.PENDING_KEY, post_id, 1)
+            pipe.incr(cls.PENDING_TOTAL_KEY)
+            _, pending_total = pipe.execute()
+        except REDIS_ERRORS as e:
+            logger.warning(f"View counter unavailable, post {post_id} view dropped: {e}")
+            return False
+
+        max_pending = getattr(settings, 'FORUM_VIEWS_MAX_PENDING', 5000)
+        if pending_total % max_pending == 0:
+            from forum.tasks import flush_post_views
+            flush_post_views.delay()
+        return True
+
+    @classmethod
+    def pending(cls, post_id):
+        """Просмотры поста, еще не перенесенные в БД"""
+        r = get_redis()
+        if r is None:
+            return 0
+        try:
+            return int(r.hget(cls.PENDING_KEY, post_id) or 0)
+        except REDIS_ERRORS:
+            return 0
+
+    @classmethod
+    def flush(cls):
+        """
+        Переносит накопленные просмотры в БД.
+        Returns: (постов обновлено, просмотров перенесено)
+        """
+        r = get_redis()
+        if r is None:
+            return 0, 0
+
+        token = acquire_lock(r, cls.FLUSH_LOCK_KEY, cls.FLUSH_LOCK_TIMEOUT)
+        if token is None:
+            # Сброс уже идет; накопленное заберет он или следующий прогон
+            return 0, 0
+        try:
+            return cls._flush_locked(r)
+        finally:
+            release_lock(r, cls.FLUSH_LOCK_KEY, token)
+
+    @classmethod
+    def _flush_locked(cls, r):
+        # Незавершенную пачку от упавшего прогона досылаем первой
+        if not r.exists(cls.FLUSHING_KEY):
+            try:
+                r.rename(cls.PENDING_KEY, cls.FLUSHING_KEY)
+            except ResponseError:
+                # Нет накопленных просмотров
+                return 0, 0
+
+        counts = sorted((int(post_id), int(count)) for post_id, count in r.hgetall(cls.FLUSHING_KEY).items())
+        total = sum(count for _, count in counts)
+
+        with transaction.atomic():
+            for start in range(0, len(counts), cls.UPDATE_CHUNK):
+                chunk = counts[start:start + cls.UPDATE_CHUNK]
+                increment = Case(
+                    *[When(pk=post_id, then=Value(count)) for post_id, count in chunk],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+                ForumPost.objects.filter(pk__in=[post_id for post_id, _ in chunk]).update(
+                    views=F('views') + increment
+                )
+
+        pipe = r.pipeline()
+        pipe.delete(cls.FLUSHING_KEY)
+        pipe.decrby(cls.PENDING_TOTAL_KEY, total)
+        pipe.execute()
+        return len(counts), total
@@ -0,0 +1,121 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from forum.models import ForumPost, PostVote
+from forum.services.live_events import LiveEvents
+from forum.services.notifications import PostNotifications
+from forum.services.trending_queue import TrendingUpdateQueue
+
+
+class PostVotes:
+    """
+    Переключение лайка без гонок и лишних запросов.
+
+    Голос снимается DELETE ... RETURNING, ставится INSERT ... ON CONFLICT DO NOTHING,
+    а likes_count двигается UPDATE ... RETURNING на столько, сколько строк реально
+    удалено/вставлено. Повторный клик из параллельного запроса не падает на
+    unique_together и не сдвигает счетчик дважды.
+
+    На Postgres все это - один запрос с data-modifying CTE (один round-trip),
+    на остальных СУБД - те же команды подряд в одной транзакции, начиная с блокировки поста.
+
+    Сигналы PostVote при этом не срабатывают, поэтому уведомление, живое событие
+    и постановка поста в очередь пересчета trending score делаются здесь явно, после коммита.
+    """
+
+    POSTGRES_SQL = """
+        WITH post AS (
+            SELECT id FROM {posts} WHERE id = %(post)s
+        ), deleted AS (
+            DELETE FROM {votes} WHERE post_id = %(post)s AND user_id = %(user)s
+            RETURNING vote_type
+        ), inserted AS (
+            INSERT INTO {votes} (post_id, user_id, vote_type, created_at)
+            SELECT id, %(user)s, 'like', %(now)s FROM post
+            WHERE NOT EXISTS (SELECT 1 FROM deleted)
+            ON CONFLICT (user_id, post_id) DO NOTHING
+            RETURNING vote_type
+        )
+        UPDATE {posts}
+        SET likes_count = likes_count
+            + (SELECT COUNT(*) FROM inserted)
+            - (SELECT COUNT(*) FROM deleted WHERE vote_type = 'like')
+        WHERE id = %(post)s
+        RETURNING likes_count, author_id,
+            (SELECT COUNT(*) FROM inserted), (SELECT COUNT(*) FROM deleted)
+    """
+
+    @classmethod
+    def _tables(cls):
+        return {'posts': ForumPost._meta.db_table, 'votes': PostVote._meta.db_table}
+
+    @classmethod
+    def _toggle_postgres(cls, cursor, params):
+        cursor.execute(cls.POSTGRES_SQL.format(**cls._tables()), params)
+        return cursor.fetchone()
+
+    @classmethod
+    def _toggle_generic(cls, cursor, params):
+        tables = cls._tables()
+        # Первая команда транзакции - запись: она сразу берет блокировку строки поста (на SQLite -
+        # всей базы), и параллельные клики ждут ее, а не падают на повышении блокировки SELECT -> DELETE
+        cursor.execute(
+            f"UPDATE {tables['posts']} SET likes_count = likes_count WHERE id = %(post)s RETURNING author_id",
+            params,
+        )
+        if cursor.fetchone() is None:
+            return None
+
+        cursor.execute(
+            f"DELETE FROM {tables['votes']} WHERE post_id = %(post)s AND user_id = %(user)s RETURNING vote_type",
+            params,
+        )
+        deleted = [row[0] for row in cursor.fetchall()]
+        inserted = 0
+        if not deleted:
+            cursor.execute(
+                f"INSERT INTO {tables['votes']} (post_id, user_id, vote_type, created_at) "
+                f"VALUES (%(post)s, %(user)s, 'like', %(now)s) "
+                f"ON CONFLICT (user_id, post_id) DO NOTHING RETURNING id",
+                params,
+            )
+            inserted = len(cursor.fetchall())
+
+        params = {**params, 'delta': inserted - deleted.count('like')}
+        cursor.execute(
+            f"UPDATE {tables['posts']} SET likes_count = likes_count + %(delta)s "
+            f"WHERE id = %(post)s RETURNING likes_count, author_id",
+            params,
+        )
+        likes_count, author_id = cursor.fetchone()
+        return likes_count, author_id, inserted, len(deleted)
+
+    @classmethod
+    def toggle_like(cls, post_id, user_id):
+        """
+        Ставит лайк, если голоса нет, иначе снимает голос.
+        Returns: (liked, likes_count) или None, если поста нет.
+        liked - состояние после запроса; если параллельный запрос успел поставить
+        тот же лайк, liked=True, а счетчик не меняется.
+        """
+        params = {
+            'post': post_id,
+            'user': user_id,
+            'now': connection.ops.adapt_datetimefield_value(timezone.now()),
+        }
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    row = cls._toggle_postgres(cursor, params)
+                else:
+                    row = cls._toggle_generic(cursor, params)
+        if row is None:
+            return None
+
+        likes_count, author_id, inserted, deleted = row
+        if inserted or deleted:
+            transaction.on_commit(lambda: TrendingUpdateQueue.mark_dirty(post_id))
+            LiveEvents.counters_changed(post_id, likes_count=likes_count)
+        if inserted:
+            transaction.on_commit(lambda: PostNotifications.post_liked(post_id, author_id, user_id))
+        return bool(inserted) or not deleted, likes_count
@@ -1,37 +1,80 @@
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.contrib.contenttypes.models import ContentType
 from django.dispatch import receiver
-from .models import PostVote, ForumComment, Notification
-from .tasks import update_single_post_trending_score
+from taggit.models import TaggedItem
+from .models import ForumPost, PostVote, ForumComment
+from .services.code_search import CodeTrigramIndex
+from .services.counters import PostCounters
+from .services.facets import PostFacets
+from .services.forks import PostForks
+from .services.notifications import PostNotifications
+from .services.feed_cache import TrendingFeedCache
+from .services.trending_index import TrendingIndex
+from .services.trending_queue import TrendingUpdateQueue
+
+
+@receiver(post_save, sender=PostVote)
+def increment_likes_on_vote(sender, instance, created, **kwargs):
+    """
+    Атомарно увеличивает ForumPost.likes_count.
+    Регистрируется раньше задач пересчета score, чтобы они видели новое значение.
+    """
+    if created and instance.vote_type == 'like':
+        PostCounters.add_like(instance.post_id)
+
+
+@receiver(post_delete, sender=PostVote)
+def decrement_likes_on_vote_delete(sender, instance, **kwargs):
+    """Атомарно уменьшает ForumPost.likes_count при снятии лайка."""
+    if instance.vote_type == 'like':
+        PostCounters.add_like(instance.post_id, -1)
+
+
+@receiver(post_save, sender=ForumComment)
+def increment_comments_on_comment(sender, instance, created, **kwargs):
+    """Атомарно увеличивает ForumPost.comments_count."""
+    if created:
+        PostCounters.add_comment(instance.post_id)
+
+
+@receiver(post_delete, sender=ForumComment)
+def decrement_comments_on_comment_delete(sender, instance, **kwargs):
+    """Атомарно уменьшает ForumPost.comments_count (в т.ч. при каскадном удалении ответов)."""
+    PostCounters.add_comment(instance.post_id, -1)
 
 
 @receiver(post_save, sender=PostVote)
 def create_notification_on_vote(sender, instance, created, **kwargs):
     """
-    Создает уведомление автору поста, когда кто-то ставит лайк.
+    Уведомляет автора поста, когда кто-то ставит лайк (через очередь, см. PostNotifications).
     """
     if created and instance.vote_type == 'like':
-        post = instance.post
-        # Не уведомляем, если лайкнул сам себя
-        if instance.user != post.author:
-            Notification.objects.create(
-                recipient=post.author,
-                actor=instance.user,
-                verb='liked',
-                target_link=f"/post/{post.id}"
-            )
+        PostNotifications.post_liked(instance.post_id, instance.post.author_id, instance.user_id)
+
+@receiver(post_save, sender=ForumComment)
+def create_notification_on_comment(sender, instance, created, **kwargs):
+    """Уведомляет автора поста о комментарии, а автора родительского комментария - об ответе."""
+    if not created:
+        return
+    post_author_id = ForumPost.objects.filter(pk=instance.post_id).values_list('author_id', flat=True).first()
+    PostNotifications.post_commented(instance.post_id, post_author_id, instance.author_id)
+    if instance.parent_id:
+        parent_author_id = ForumComment.objects.filter(pk=instance.parent_id).values_list('author_id', flat=True).first()
+        if parent_author_id != post_author_id:
+            PostNotifications.comment_replied(instance.post_id, parent_author_id, instance.author_id)
+
 
 @receiver(post_save, sender=PostVote)
 def update_score_on_vote(sender, instance, created, **kwargs):
     """
     Обновляет trending score поста при добавлении/изменении голоса.
-    Запускает асинхронную Celery задачу.
+    Пост попадает в очередь пересчета, события по одному посту схлопываются.
+    Только после коммита: иначе пересчет может успеть раньше и не увидеть голос.
     """
     if instance.post_id:
-        # Запускаем задачу с задержкой 5 секунд для группировки нескольких изменений
-        update_single_post_trending_score.apply_async(
-            args=[instance.post_id],
-            countdown=5
-        )
+        post_id = instance.post_id
+        transaction.on_commit(lambda: TrendingUpdateQueue.mark_dirty(post_id))
 
 
 @receiver(post_delete, sender=PostVote)
@@ -40,10 +83,8 @@ def update_score_on_vote_delete(sender, instance, **kwargs):
     Обновляет trending score поста при удалении голоса.
     """
     if instance.post_id:
-        update_single_post_trending_score.apply_async(
-            args=[instance.post_id],
-            countdown=5
-        )
+        post_id = instance.post_id
+        transaction.on_commit(lambda: TrendingUpdateQueue.mark_dirty(post_id))
 
 
 @receiver(post_save, sender=ForumComment)
@@ -52,10 +93,8 @@ def update_score_on_comment(sender, instance, created, **kwargs):
     Обновляет trending score поста при добавлении комментария.
     """
     if created and instance.post_id:
-        update_single_post_trending_score.apply_async(
-            args=[instance.post_id],
-            countdown=5
-        )
+        post_id = instance.post_id
+        transaction.on_commit(lambda: TrendingUpdateQueue.mark_dirty(post_id))
 
 
 @receiver(post_delete, sender=ForumComment)
@@ -64,7 +103,108 @@ def update_score_on_comment_delete(sender, instance, **kwargs):
     Обновляет trending score поста при удалении комментария.
     """
     if instance.post_id:
-        update_single_post_trending_score.apply_async(
-            args=[instance.post_id],
-            countdown=5
-        )
+        post_id = instance.post_id
+        transaction.on_commit(lambda: TrendingUpdateQueue.mark_dirty(post_id))
+
+
+@receiver(post_save, sender=ForumPost)
+def refresh_feed_cache_on_post_save(sender, instance, update_fields=None, **kwargs):
+    """
+    Обновляет пост в кеше трендовой ленты после правки.
+    Сохранение одного trending_score делает задача пересчета, она патчит кеш сама.
+    """
+    if update_fields is not None and set(update_fields) == {'trending_score'}:
+        return
+    TrendingFeedCache.patch_post(instance)
+
+
+@receiver(post_delete, sender=ForumPost)
+def drop_from_feed_cache_on_post_delete(sender, instance, **kwargs):
+    """Убирает удаленный пост из кеша трендовой ленты."""
+    TrendingFeedCache.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=ForumPost)
+def sync_trending_index_on_post_save(sender, instance, update_fields=None, **kwargs):
+    """
+    Обновляет пост в ZSET-рейтингах (общий, по языку, по тегам).
+    Как и с кешем ленты, одиночный trending_score пишет в индекс сама задача.
+    """
+    if update_fields is not None and set(update_fields) == {'trending_score'}:
+        return
+    TrendingIndex.update_post(instance)
+
+
+@receiver(post_delete, sender=ForumPost)
+def drop_from_trending_index_on_post_delete(sender, instance, **kwargs):
+    TrendingIndex.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=ForumPost)
+def sync_code_index_on_post_save(sender, instance, update_fields=None, **kwargs):
+    """Переиндексирует code_snippet в запасном триграммном индексе (если он построен в этом процессе)."""
+    if update_fields is not None and 'code_snippet' not in update_fields:
+        return
+    CodeTrigramIndex.update_post(instance)
+
+
+@receiver(post_delete, sender=ForumPost)
+def drop_from_code_index_on_post_delete(sender, instance, **kwargs):
+    CodeTrigramIndex.remove_post(instance.pk)
+
+
+@receiver(pre_save, sender=ForumPost)
+def detach_edited_fork_content(sender, instance, **kwargs):
+    """Отредактированный форк получает свой текст и перестает ссылаться на общий ContentBlob."""
+    PostForks.detach_edited(instance)
+
+
+@receiver(pre_save, sender=ForumPost)
+def remember_language_for_facets(sender, instance, update_fields=None, **kwargs):
+    """Запоминает прежний язык поста, чтобы перенести его в счетчиках фасетов."""
+    if instance.pk is None or (update_fields is not None and 'language' not in update_fields):
+        return
+    instance._facet_old_language = (
+        ForumPost.objects.filter(pk=instance.pk).values_list('language', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=ForumPost)
+def update_facets_on_post_save(sender, instance, created, **kwargs):
+    if created:
+        PostFacets.post_created(instance)
+        return
+    old_language = getattr(instance, '_facet_old_language', None)
+    if old_language is not None and old_language != instance.language:
+        PostFacets.language_changed(instance, old_language)
+    instance._facet_old_language = instance.language
+
+
+@receiver(post_delete, sender=ForumPost)
+def update_facets_on_post_delete(sender, instance, **kwargs):
+    PostFacets.post_deleted(instance)
+
+
+def is_post_tag(tagged_item):
+    return ContentType.objects.get_for_id(tagged_item.content_type_id).model_class() is ForumPost
+
+
+@receiver(post_save, sender=TaggedItem)
+def update_facets_on_tag_add(sender, instance, created, **kwargs):
+    if created and is_post_tag(instance):
+        PostFacets.tag_changed(instance.object_id, instance.tag.name, 1)
+
+
+@receiver(pre_delete, sender=TaggedItem)
+def update_facets_on_tag_remove(sender, instance, **kwargs):
+    """pre_delete: при каскадном удалении поста его строка еще существует и язык можно прочитать."""
+    if is_post_tag(instance):
+        PostFacets.tag_changed(instance.object_id, instance.tag.name, -1)
+
+
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_delete, sender=TaggedItem)
+def sync_trending_index_on_tags_change(sender, instance, **kwargs):
+    """Теги поста изменились - переносим его между рейтингами тегов."""
+    if is_post_tag(instance):
+        TrendingIndex.update_post_by_id(instance.object_id)
@@ -1,6 +1,13 @@
 from celery import shared_task
-from django.utils import timezone
+from django.conf import settings
 from .models import ForumPost
+from .services.feed_cache import TrendingFeedCache
+from .services.notification_retention import NotificationRetention
+from .services.notifications import PostNotifications
+from .services.trending import TrendingScoreEngine
+from .services.trending_index import TrendingIndex
+from .services.trending_queue import TrendingUpdateQueue
+from .services.view_counter import PostViewCounter
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,24 +18,18 @@ def update_trending_scores():
     """
     Периодическая задача для пересчета trending_score всех постов.
     Запускается каждые 15 минут через Celery Beat.
+    Считает чанками через TrendingScoreEngine (агрегаты одним запросом + bulk_update).
     """
     try:
-        posts = ForumPost.objects.all()
-        updated_count = 0
+        stats = TrendingScoreEngine.recompute()
+        TrendingFeedCache.rebuild()
+        TrendingIndex.rebuild()
 
-        for post in posts:
-            old_score = post.trending_score
-            new_score = post.calculate_trending_score()
-
-            # Обновляем только если score изменился (оптимизация)
-            if old_score != new_score:
-                post.trending_score = new_score
-                # Используем update_fields чтобы не вызывать весь save() и избежать рекурсии
-                post.save(update_fields=['trending_score'])
-                updated_count += 1
-
-        logger.info(f"Updated trending scores for {updated_count}/{posts.count()} posts")
-        return f"Success: {updated_count} posts updated"
+        logger.info(
+            f"Updated trending scores for {stats['updated']}/{stats['total']} posts "
+            f"in {len(stats['chunks'])} chunks, {stats['elapsed_ms']}ms"
+        )
+        return f"Success: {stats['updated']} posts updated"
 
     except Exception as e:
         logger.error(f"Error updating trending scores: {str(e)}")
@@ -45,7 +46,7 @@ def update_single_post_trending_score(post_id):
         post_id: ID поста для обновления
     """
     try:
-        post = ForumPost.objects.get(id=post_id)
+        post = ForumPost.objects.select_related('author', 'description_blob', 'code_blob').get(id=post_id)
         new_score = post.calculate_trending_score()
 
         if post.trending_score != new_score:
@@ -53,6 +54,10 @@ def update_single_post_trending_score(post_id):
             post.save(update_fields=['trending_score'])
             logger.info(f"Updated trending score for post {post_id}: {new_score}")
 
+        # Счетчики могли измениться и без смены score - обновляем пост в кеше ленты
+        TrendingFeedCache.patch_post(post)
+        TrendingIndex.update_post(post)
+
         return f"Success: Post {post_id} score updated to {new_score}"
 
     except ForumPost.DoesNotExist:
@@ -61,3 +66,104 @@ def update_single_post_trending_score(post_id):
     except Exception as e:
         logger.error(f"Error updating post {post_id} trending score: {str(e)}")
         raise
+
+
+@shared_task
+def flush_dirty_trending_scores():
+    """
+    Пересчитывает trending score постов, накопившихся в очереди TrendingUpdateQueue.
+    Запускается Celery Beat раз в FORUM_TRENDING_FLUSH_INTERVAL секунд:
+    каждый пост пересчитывается один раз за окно, сколько бы лайков/комментариев
+    по нему ни пришло.
+    """
+    batch_size = getattr(settings, 'FORUM_TRENDING_FLUSH_BATCH', 500)
+    max_batches = getattr(settings, 'FORUM_TRENDING_FLUSH_MAX_BATCHES', 20)
+    recomputed = 0
+
+    try:
+        recovered = TrendingUpdateQueue.recover()
+        if recovered:
+            logger.warning(f"Requeued {recovered} trending posts left by an interrupted flush")
+
+        # Ограничиваем число пачек, чтобы задача не растягивалась дольше своего окна
+        for _ in range(max_batches):
+            post_ids = TrendingUpdateQueue.drain(batch_size)
+            if not post_ids:
+                break
+
+            try:
+                TrendingScoreEngine.recompute(post_ids=post_ids)
+                posts = list(
+                    ForumPost.objects.select_related('author', 'description_blob', 'code_blob')
+                    .prefetch_related('tags').filter(pk__in=post_ids)
+                )
+                TrendingFeedCache.patch_posts(posts)
+                TrendingIndex.update_posts(posts)
+            except Exception:
+                TrendingUpdateQueue.requeue(post_ids)
+                raise
+            TrendingUpdateQueue.ack(post_ids)
+            recomputed += len(post_ids)
+
+        if recomputed:
+            TrendingUpdateQueue.record_flush(recomputed)
+            logger.info(f"Flushed trending scores for {recomputed} dirty posts")
+        return f"Success: {recomputed} posts recomputed"
+
+    except Exception as e:
+        logger.error(f"Error flushing dirty trending scores: {str(e)}")
+        raise
+
+
+@shared_task
+def flush_post_views():
+    """
+    Переносит просмотры, накопленные PostViewCounter в Redis, в ForumPost.views.
+    Запускается Celery Beat раз в FORUM_VIEWS_FLUSH_INTERVAL секунд
+    и досрочно, когда в Redis набирается FORUM_VIEWS_MAX_PENDING просмотров.
+    """
+    try:
+        posts, views = PostViewCounter.flush()
+        if posts:
+            logger.info(f"Flushed {views} views for {posts} posts")
+        return f"Success: {views} views flushed"
+
+    except Exception as e:
+        logger.error(f"Error flushing post views: {str(e)}")
+        raise
+
+
+@shared_task
+def flush_notifications():
+    """
+    Записывает накопленные в Redis уведомления пачкой (PostNotifications).
+    Запускается Celery Beat раз в FORUM_NOTIFICATIONS_FLUSH_INTERVAL секунд.
+    """
+    try:
+        events, created, updated = PostNotifications.flush()
+        if events:
+            logger.info(f"Flushed {events} notification events: {created} created, {updated} aggregated")
+        return f"Success: {events} events flushed"
+
+    except Exception as e:
+        logger.error(f"Error flushing notifications: {str(e)}")
+        raise
+
+
+@shared_task
+def purge_old_notifications():
+    """
+    Переносит прочитанные уведомления старше FORUM_NOTIFICATIONS_RETENTION_DAYS
+    в NotificationArchive пачками (NotificationRetention). Запускается Celery Beat раз в сутки.
+    """
+    try:
+        result = NotificationRetention.purge(max_batches=getattr(settings, 'FORUM_NOTIFICATIONS_PURGE_MAX_BATCHES', 500))
+        if result['moved']:
+            logger.info(
+                f"Purged {result['moved']} old notifications in {result['batches']} batches, {result['elapsed_ms']}ms"
+            )
+        return f"Success: {result['moved']} notifications purged"
+
+    except Exception as e:
+        logger.error(f"Error purging old notifications: {str(e)}")
+        raise
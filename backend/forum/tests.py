@@ -1,3 +1,721 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import (
+    ContentBlob, ForumPost, ForumComment, Notification, NotificationArchive, PostFacetCount, PostVote,
+    SavedForumPost,
+)
+from .services.code_search import CodeTrigramIndex
+from .services.facets import PostFacets
+from .services.feed_cache import TrendingFeedCache
+from .services.live_events import LiveEvents, LiveHub
+from .services.notification_retention import NotificationRetention
+from .services.notifications import PostNotifications
+from .services.search import PostSearch
+from .services.votes import PostVotes
+from .views import ForumPostViewSet
+
+
+class ForumTestCase(TestCase):
+    """Общая база: пользователи, API-клиент и чистый кеш (троттлинг живет в кеше)"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.reader = User.objects.create_user(username='reader', password='pass')
+
+    def make_post(self, **kwargs):
+        post = ForumPost.objects.create(
+            author=kwargs.pop('author', self.author),
+            title=kwargs.pop('title', 'Post'),
+            description=kwargs.pop('description', 'Body'),
+            **kwargs,
+        )
+        post.tags.add('python', 'django')
+        return post
+
+
+class QueryBudgetTests(ForumTestCase):
+    """
+    Списки форума должны выполнять фиксированное число запросов,
+    независимо от количества строк на странице.
+    """
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertQueryBudget(self, url, budget, grow):
+        """Замеряет страницу с 1 строкой и с полной страницей: число запросов одинаково и <= budget"""
+        grow(1)
+        small = self.count_queries(url)
+        grow(9)
+        full = self.count_queries(url)
+        self.assertEqual(small, full, f"{url}: query count grows with page size ({small} -> {full})")
+        self.assertLessEqual(full, budget, f"{url}: {full} queries, budget is {budget}")
+
+    def test_posts_list(self):
+        def grow(n):
+            for _ in range(n):
+                post = self.make_post()
+                ForumComment.objects.create(post=post, author=self.reader, content='hi')
+        # страница + теги (keyset-пагинация без COUNT)
+        self.assertQueryBudget('/api/forum/posts/', 2, grow)
+
+    def test_comments_list(self):
+        post = self.make_post()
+
+        def grow(n):
+            for _ in range(n):
+                ForumComment.objects.create(post=post, author=self.reader, content='hi')
+        # страница (keyset-пагинация без COUNT)
+        self.assertQueryBudget(f'/api/forum/comments/?post={post.id}', 1, grow)
+
+    def test_bookmarks_list(self):
+        self.client.force_authenticate(self.reader)
+
+        def grow(n):
+            for _ in range(n):
+                SavedForumPost.objects.create(user=self.reader, post=self.make_post())
+        # COUNT + страница + теги + is_liked/is_saved
+        self.assertQueryBudget('/api/forum/bookmarks/', 4, grow)
+
+    def test_notifications_list(self):
+        self.client.force_authenticate(self.author)
+
+        def grow(n):
+            for _ in range(n):
+                Notification.objects.create(recipient=self.author, actor=self.reader, verb='liked')
+        # COUNT + страница
+        self.assertQueryBudget('/api/forum/notifications/', 2, grow)
+
+
+class KeysetPaginationTests(ForumTestCase):
+
+    def walk(self, url):
+        """Проходит все страницы по ссылкам next и возвращает id в порядке выдачи"""
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_feed_by_created_at(self):
+        posts = [self.make_post(title=f'p{i}') for i in range(7)]
+        expected = [p.id for p in sorted(posts, key=lambda p: (p.created_at, p.id), reverse=True)]
+        self.assertEqual(self.walk('/api/forum/posts/?page_size=3'), expected)
+
+    def test_feed_by_trending_score_with_ties(self):
+        posts = [self.make_post(title=f'p{i}') for i in range(7)]
+        for i, post in enumerate(posts):
+            ForumPost.objects.filter(pk=post.pk).update(trending_score=i % 3)
+        expected = list(
+            ForumPost.objects.order_by('-trending_score', '-pk').values_list('pk', flat=True)
+        )
+        self.assertEqual(self.walk('/api/forum/posts/?ordering=-trending_score&page_size=2'), expected)
+
+    def test_previous_link_returns_previous_page(self):
+        for i in range(5):
+            self.make_post(title=f'p{i}')
+        first = self.client.get('/api/forum/posts/?page_size=2').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual([p['id'] for p in back['results']], [p['id'] for p in first['results']])
+
+    def test_comments_in_thread_order(self):
+        post = self.make_post()
+        comments = [ForumComment.objects.create(post=post, author=self.reader, content=str(i)) for i in range(5)]
+        ids = self.walk(f'/api/forum/comments/?post={post.id}&page_size=2')
+        self.assertEqual(ids, [c.id for c in comments])
+
+    def test_page_number_opt_in(self):
+        for i in range(5):
+            self.make_post(title=f'p{i}')
+        response = self.client.get('/api/forum/posts/?page=2&page_size=2')
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/forum/posts/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+
+class TrendingFeedCacheTests(ForumTestCase):
+    url = '/api/forum/posts/?ordering=-trending_score'
+
+    def setUp(self):
+        super().setUp()
+        self.posts = [self.make_post(title=f'p{i}') for i in range(5)]
+        for i, post in enumerate(self.posts):
+            ForumPost.objects.filter(pk=post.pk).update(trending_score=i)
+
+    def ids(self, response):
+        return [item['id'] for item in response.data['results']]
+
+    def test_cached_pages_skip_database(self):
+        expected = [p.id for p in reversed(self.posts)]
+        self.assertEqual(self.ids(self.client.get(self.url)), expected)
+
+        with self.assertNumQueries(0):
+            first = self.client.get(self.url + '&page_size=2')
+            second = self.client.get(first.data['next'])
+        self.assertEqual(self.ids(first) + self.ids(second), expected[:4])
+
+    def test_single_post_update_patches_cache(self):
+        self.client.get(self.url)
+        # Пост ставится в очередь пересчета только после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            PostVote.objects.create(user=self.reader, post=self.posts[0], vote_type='like')
+
+        response = self.client.get(self.url)
+        self.assertEqual(self.ids(response)[0], self.posts[0].id)
+        self.assertEqual(response.data['results'][0]['likes_count'], 1)
+
+    def test_deleted_post_leaves_cache(self):
+        self.client.get(self.url)
+        self.posts[4].delete()
+        self.assertNotIn(self.posts[4].id, self.ids(self.client.get(self.url)))
+
+    def test_patch_during_rebuild_marks_stale_without_overwriting(self):
+        fresh = TrendingFeedCache.rebuild()
+        cache.add(TrendingFeedCache.LOCK_KEY, 1)
+        ForumPost.objects.filter(pk=self.posts[0].pk).update(trending_score=100)
+        TrendingFeedCache.patch_post(ForumPost.objects.get(pk=self.posts[0].pk))
+        # Запись ленты не тронута, правка отмечена флагом
+        self.assertEqual(cache.get(TrendingFeedCache.KEY), fresh)
+        self.assertTrue(cache.get(TrendingFeedCache.STALE_KEY))
+
+        # Следующее чтение пересобирает ленту и снимает флаг
+        cache.delete(TrendingFeedCache.LOCK_KEY)
+        self.assertEqual(self.ids(self.client.get(self.url))[0], self.posts[0].id)
+        self.assertIsNone(cache.get(TrendingFeedCache.STALE_KEY))
+
+    def test_filtered_feed_bypasses_cache(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url + '&language=Python')
+        self.assertGreater(len(ctx.captured_queries), 0)
+
+
+class PostViewCounterTests(ForumTestCase):
+    def test_retrieve_counts_view_without_redis(self):
+        post = self.make_post()
+        self.client.get(f'/api/forum/posts/{post.pk}/')
+        self.client.get(f'/api/forum/posts/{post.pk}/')
+        post.refresh_from_db()
+        self.assertEqual(post.views, 2)
+
+
+class PostSearchTests(ForumTestCase):
+    def test_search_falls_back_to_ilike(self):
+        match = self.make_post(title='Deadlock in celery worker')
+        self.make_post(title='Other', description='nothing here')
+
+        response = self.client.get('/api/forum/posts/?search=celery deadlock')
+        self.assertEqual([item['id'] for item in response.data['results']], [match.id])
+        self.assertIsNone(response.data['results'][0]['search_headline'])
+
+    def test_headline_escapes_description(self):
+        raw = f'<img src=x onerror=alert(1)> {PostSearch.START_SEL}deadlock{PostSearch.STOP_SEL} & more'
+        self.assertEqual(
+            PostSearch.render_headline(raw),
+            '&lt;img src=x onerror=alert(1)&gt; <mark>deadlock</mark> &amp; more',
+        )
+
+
+class CodeSearchTests(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        CodeTrigramIndex.reset()
+
+    def ids(self, response):
+        return [item['id'] for item in response.data['results']]
+
+    def test_fragment_search_ranks_whole_identifier_first(self):
+        partial = self.make_post(code_snippet='useEffectOnce(() => load())')
+        exact = self.make_post(code_snippet='useEffect(() => { load(); }, [])')
+        self.make_post(code_snippet='np.einsum("ij->i", a)')
+
+        self.assertEqual(self.ids(self.client.get('/api/forum/posts/?code=useEffect(')), [exact.id])
+        self.assertEqual(self.ids(self.client.get('/api/forum/posts/?code=useEffect')), [exact.id, partial.id])
+
+    def test_language_filter_applies_before_fallback_limit(self):
+        rust = self.make_post(code_snippet='fn main() { let v = vec![1]; }', language='Rust')
+        # Более свежий пост с тем же фрагментом занимает единственное место в ограничении
+        self.make_post(code_snippet='let v = vec![1];', language='Python')
+
+        with mock.patch('forum.services.code_search.CodeSearch.FALLBACK_LIMIT', 1):
+            response = self.client.get('/api/forum/posts/?code=vec![1]&language=Rust')
+        self.assertEqual(self.ids(response), [rust.id])
+
+    def test_index_follows_post_changes(self):
+        self.assertEqual(self.ids(self.client.get('/api/forum/posts/?code=np.einsum')), [])
+        post = self.make_post(code_snippet='np.einsum("ij->i", a)')
+        self.assertEqual(self.ids(self.client.get('/api/forum/posts/?code=np.einsum')), [post.id])
+
+        post.code_snippet = 'a.sum(axis=1)'
+        post.save()
+        self.assertEqual(self.ids(self.client.get('/api/forum/posts/?code=np.einsum')), [])
+
+
+class TagFilterTests(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.both = self.make_post(title='both')
+        self.react = ForumPost.objects.create(author=self.author, title='react', description='b')
+        self.react.tags.add('react')
+
+    def ids(self, url):
+        return sorted(item['id'] for item in self.client.get(url).data['results'])
+
+    def test_all_mode_requires_every_tag(self):
+        self.assertEqual(self.ids('/api/forum/posts/?tags=python,django'), [self.both.id])
+        self.assertEqual(self.ids('/api/forum/posts/?tags=python,react'), [])
+
+    def test_any_mode_matches_one_of_tags(self):
+        self.assertEqual(
+            self.ids('/api/forum/posts/?tags=python,react&tags_mode=any'), sorted([self.both.id, self.react.id])
+        )
+
+    def test_single_join_regardless_of_tag_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/forum/posts/?tags=python,django,react,hooks')
+        sql = next(q['sql'] for q in ctx.captured_queries if 'forum_forumpost' in q['sql'])
+        self.assertEqual(sql.count('JOIN "taggit_tag"'), 1)
+
+
+class PostFacetTests(ForumTestCase):
+    url = '/api/forum/posts/facets/'
+
+    def snapshot(self):
+        return sorted(PostFacetCount.objects.filter(count__gt=0).values_list('facet', 'scope', 'value', 'count'))
+
+    def test_counters_follow_posts_and_tags(self):
+        post = self.make_post(language='Python')
+        other = self.make_post(language='Go')
+        other.tags.add('grpc')
+
+        data = self.client.get(self.url).data
+        self.assertEqual({row['value']: row['count'] for row in data['languages']}, {'Python': 1, 'Go': 1})
+        self.assertEqual({row['value']: row['count'] for row in data['tags']}, {'python': 2, 'django': 2, 'grpc': 1})
+        scoped = self.client.get(self.url + '?language=Go').data['tags']
+        self.assertEqual({row['value']: row['count'] for row in scoped}, {'python': 1, 'django': 1, 'grpc': 1})
+
+        post.language = 'Go'
+        post.save()
+        other.tags.remove('python')
+        post.delete()
+
+        incremental = self.snapshot()
+        PostFacets.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_posts_added_without_signals_do_not_go_negative(self):
+        self.make_post(language='Python')
+        ForumPost.objects.bulk_create([ForumPost(author=self.reader, title='b', description='b', language='Python')])
+        ForumPost.objects.filter(author=self.reader).delete()
+        ForumPost.objects.filter(author=self.author).delete()
+        self.assertEqual(
+            list(PostFacetCount.objects.filter(facet=PostFacetCount.FACET_LANGUAGE).values_list('value', 'count')),
+            [('Python', 0)],
+        )
+
+    def test_facets_read_is_single_table(self):
+        self.make_post(language='Python')
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+
+class CommentTreeTests(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.make_post()
+        self.url = f'/api/forum/posts/{self.post.pk}/comment-tree/'
+
+    def comment(self, parent=None, **kwargs):
+        return ForumComment.objects.create(post=self.post, author=self.reader, content='c', parent=parent, **kwargs)
+
+    def test_nested_threads_paginated_by_root(self):
+        first, second = self.comment(), self.comment()
+        reply = self.comment(parent=first)
+        nested = self.comment(parent=reply)
+
+        response = self.client.get(self.url + '?page_size=1')
+        [thread] = response.data['results']
+        self.assertEqual(thread['id'], first.id)
+        self.assertEqual(thread['replies'][0]['id'], reply.id)
+        self.assertEqual(thread['replies'][0]['replies'][0]['id'], nested.id)
+
+        second_page = self.client.get(response.data['next']).data['results']
+        self.assertEqual([t['id'] for t in second_page], [second.id])
+
+    def test_missing_or_malformed_post_is_404(self):
+        self.assertEqual(self.client.get('/api/forum/posts/999999/comment-tree/').status_code, 404)
+        self.assertEqual(self.client.get('/api/forum/posts/abc/comment-tree/').status_code, 404)
+
+    def test_depth_cap_marks_truncated_branches(self):
+        root = self.comment()
+        reply = self.comment(parent=root)
+        self.comment(parent=reply)
+
+        [thread] = self.client.get(self.url + '?depth=1').data['results']
+        self.assertEqual(thread['replies'][0]['replies'], [])
+        self.assertTrue(thread['replies'][0]['more_replies'])
+        self.assertFalse(thread['more_replies'])
+
+    def test_query_count_does_not_grow_with_thread_size(self):
+        root = self.comment()
+        parent = root
+        for _ in range(5):
+            parent = self.comment(parent=parent)
+        # пост + страница корней + CTE
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+
+class ViewerStateTests(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.liked, self.saved, self.plain = self.make_post(), self.make_post(), self.make_post()
+        PostVote.objects.create(user=self.reader, post=self.liked, vote_type='like')
+        SavedForumPost.objects.create(user=self.reader, post=self.saved)
+        self.client.force_authenticate(self.reader)
+
+    def states(self, url):
+        return {
+            item['id']: (item['is_liked'], item['is_saved'])
+            for item in self.client.get(url).data['results']
+        }
+
+    def test_feed_page_resolves_state_in_one_query(self):
+        expected = {self.liked.id: (True, False), self.saved.id: (False, True), self.plain.id: (False, False)}
+        self.assertEqual(self.states('/api/forum/posts/'), expected)
+        # страница + теги + состояние пользователя
+        with self.assertNumQueries(3):
+            self.client.get('/api/forum/posts/')
+
+    def test_state_applied_on_top_of_cached_trending_feed(self):
+        url = '/api/forum/posts/?ordering=-trending_score'
+        self.client.get(url)
+        self.assertEqual(self.states(url)[self.liked.id], (True, False))
+
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.states(url)[self.liked.id], (False, False))
+
+
+class VoteToggleTests(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.make_post()
+        self.url = f'/api/forum/posts/{self.post.pk}/vote/'
+        self.client.force_authenticate(self.reader)
+
+    def test_toggle_updates_counter_and_notifies(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url)
+        self.assertEqual(response.data, {'status': 'liked', 'likes_count': 1})
+        self.assertEqual(Notification.objects.filter(recipient=self.author, verb='liked').count(), 1)
+
+        response = self.client.post(self.url)
+        self.assertEqual(response.data, {'status': 'unliked', 'likes_count': 0})
+        self.assertFalse(PostVote.objects.exists())
+
+    def test_missing_post(self):
+        self.assertEqual(self.client.post('/api/forum/posts/999999/vote/').status_code, 404)
+
+    def test_post_edit_keeps_concurrent_counters(self):
+        get_object = ForumPostViewSet.get_object
+
+        def load_then_like(view):
+            # Лайк и форк успевают между чтением поста и его сохранением
+            post = get_object(view)
+            ForumPost.objects.filter(pk=post.pk).update(likes_count=F('likes_count') + 5, forks_count=2)
+            return post
+
+        self.client.force_authenticate(self.author)
+        with mock.patch.object(ForumPostViewSet, 'get_object', load_then_like):
+            response = self.client.patch(f'/api/forum/posts/{self.post.pk}/', {'title': 'Edited', 'forks_count': 99})
+        self.assertEqual(response.status_code, 200)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.title, self.post.likes_count, self.post.forks_count), ('Edited', 5, 2))
+
+
+class VoteConcurrencyTests(TransactionTestCase):
+    """
+    Пул потоков долбит один пост: счетчик должен совпасть с реальным числом лайков.
+    На SQLite тестовая база - файл (settings.DATABASES TEST NAME), потоки пишут в нее по очереди.
+    """
+
+    USERS = 8
+    CLICKS = 5
+
+    def test_concurrent_toggles_keep_counter_consistent(self):
+        author = User.objects.create_user(username='author')
+        post = ForumPost.objects.create(author=author, title='hot', description='post')
+        users = [User.objects.create_user(username=f'u{i}') for i in range(self.USERS)]
+
+        def click(user):
+            try:
+                for _ in range(self.CLICKS):
+                    PostVotes.toggle_like(post.pk, user.pk)
+            finally:
+                connection.close()
+
+        # Агрегаты уведомлений без select_for_update (SQLite) тут не проверяются - только счетчик
+        with ThreadPoolExecutor(max_workers=self.USERS) as pool, mock.patch.object(PostNotifications, 'post_liked'):
+            # Каждый пользователь кликает из двух потоков сразу - как двойной клик
+            list(pool.map(click, users + users))
+
+        post.refresh_from_db()
+        likes = PostVote.objects.filter(post=post, vote_type='like').count()
+        self.assertEqual(post.likes_count, likes)
+        # 10 кликов на пользователя - четное число, все лайки сняты
+        self.assertEqual(likes, 0)
+
+
+class NotificationAggregationTests(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.make_post()
+        self.fans = [User.objects.create_user(username=f'fan{i}') for i in range(3)]
+
+    def test_repeated_likes_collapse_into_one_row(self):
+        for fan in self.fans:
+            PostVote.objects.create(user=fan, post=self.post, vote_type='like')
+
+        [notification] = Notification.objects.filter(recipient=self.author)
+        self.assertEqual((notification.actor, notification.actor_count), (self.fans[-1], 3))
+
+        notification.is_read = True
+        notification.save()
+        PostVote.objects.create(user=self.reader, post=self.post, vote_type='like')
+        self.assertEqual(Notification.objects.filter(recipient=self.author, is_read=False).get().actor_count, 1)
+
+    def test_batch_is_written_with_bulk_queries(self):
+        target = f'/post/{self.post.pk}'
+        events = [
+            {'recipient': self.author.pk, 'actor': fan.pk, 'verb': 'liked', 'target': target} for fan in self.fans
+        ] + [{'recipient': self.author.pk, 'actor': self.reader.pk, 'verb': 'commented', 'target': target}]
+        # SELECT агрегатов + bulk_create уведомлений и участников (и SAVEPOINT/RELEASE вокруг транзакции теста)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(PostNotifications.apply(events), (2, 0))
+        self.assertLessEqual(len([q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]), 3)
+        self.assertEqual(
+            dict(Notification.objects.values_list('verb', 'actor_count')), {'liked': 3, 'commented': 1}
+        )
+
+    def test_actor_count_is_distinct_across_batches(self):
+        target = f'/post/{self.post.pk}'
+
+        def events(*actors):
+            return [{'recipient': self.author.pk, 'actor': a.pk, 'verb': 'liked', 'target': target} for a in actors]
+
+        first, second = self.fans[:2]
+        PostNotifications.apply(events(first, second, first, second, first))
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertEqual((notification.actor, notification.actor_count), (first, 2))
+
+        # Те же люди в следующей пачке счетчик не меняют, новый - добавляется
+        self.assertEqual(PostNotifications.apply(events(second, first)), (0, 0))
+        PostNotifications.apply(events(second, self.fans[2]))
+        notification.refresh_from_db()
+        self.assertEqual((notification.actor, notification.actor_count), (self.fans[2], 3))
+
+    def test_comment_and_reply_notify_authors(self):
+        root = ForumComment.objects.create(post=self.post, author=self.reader, content='q')
+        ForumComment.objects.create(post=self.post, author=self.fans[0], content='a', parent=root)
+        self.assertEqual(
+            sorted(Notification.objects.values_list('recipient__username', 'verb', 'actor_count')),
+            [('author', 'commented', 2), ('reader', 'replied', 1)],
+        )
+
+
+class UnreadCounterTests(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+        self.target = f'/post/{self.make_post().pk}'
+
+    def notify(self, verb):
+        event = {'recipient': self.author.pk, 'actor': self.reader.pk, 'verb': verb, 'target': self.target}
+        with self.captureOnCommitCallbacks(execute=True):
+            PostNotifications.apply([event])
+
+    def unread_count(self):
+        return self.client.get('/api/forum/notifications/unread_count/').data['count']
+
+    def test_counter_is_served_from_cache_and_follows_changes(self):
+        self.notify('liked')
+        self.assertEqual(self.unread_count(), 1)
+        # Второй опрос - без COUNT(*) (остаются только запросы аутентификации/сессии)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.unread_count(), 1)
+        self.assertFalse([q for q in ctx.captured_queries if 'forum_notification' in q['sql']])
+
+        self.notify('commented')
+        self.notify('commented')  # тот же агрегат - новых непрочитанных нет
+        self.assertEqual(self.unread_count(), 2)
+
+        notification = Notification.objects.get(verb='liked')
+        for _ in range(2):
+            self.client.post(f'/api/forum/notifications/{notification.pk}/read/')
+        self.assertEqual(self.unread_count(), 1)
+
+    def test_mark_all_read_is_single_update(self):
+        self.notify('liked')
+        self.notify('commented')
+        self.assertEqual(self.unread_count(), 2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/forum/notifications/mark_all_read/')
+        self.assertEqual(response.data['updated'], 2)
+        writes = [q for q in ctx.captured_queries if 'forum_notification' in q['sql']]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0]['sql'].startswith('UPDATE'))
+        self.assertEqual(self.unread_count(), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+
+class LiveStreamTests(ForumTestCase):
+    def test_stream_requires_auth_and_redis(self):
+        self.assertEqual(self.client.get('/api/forum/live/').status_code, 401)
+        # В тестах кеш LocMem - живого канала нет, клиент остается на опросе
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get('/api/forum/live/').status_code, 503)
+
+    def test_hub_fans_out_frames_and_drops_for_slow_clients(self):
+        hub = LiveHub()
+        channel = LiveEvents.user_channel(self.author.pk)
+        first, second = hub.subscribe([channel]), hub.subscribe([channel, LiveEvents.post_channel(1)])
+        frame = LiveEvents.frame('unread', {'count': 1})
+        self.assertEqual(frame, 'event: unread\ndata: {"count":1}\n\n')
+
+        for _ in range(LiveHub.QUEUE_SIZE + 5):
+            hub.dispatch(channel, frame)
+        self.assertEqual((first.qsize(), second.qsize()), (LiveHub.QUEUE_SIZE, LiveHub.QUEUE_SIZE))
+
+        hub.unsubscribe(first, [channel])
+        hub.unsubscribe(second, [channel, LiveEvents.post_channel(1)])
+        self.assertEqual(dict(hub.listeners), {})
+
+    def test_counter_events_carry_absolute_counts(self):
+        post = self.make_post()
+        with mock.patch.object(LiveEvents, 'enabled', return_value=True), \
+                mock.patch.object(LiveEvents, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                PostVote.objects.create(user=self.reader, post=post, vote_type='like')
+                ForumComment.objects.create(post=post, author=self.reader, content='hi')
+            with self.captureOnCommitCallbacks(execute=True):
+                PostVote.objects.filter(post=post).delete()
+
+        events = [data for call in publish.call_args_list for _, event, data in call.args[0] if event == 'counters']
+        self.assertEqual(events, [
+            {'post': post.pk, 'likes_count': 1},
+            {'post': post.pk, 'comments_count': 1},
+            {'post': post.pk, 'likes_count': 0},
+        ])
+
+
+class NotificationRetentionTests(ForumTestCase):
+    def test_purge_archives_only_old_read_notifications_in_batches(self):
+        def notify(is_read, days_old):
+            notification = Notification.objects.create(
+                recipient=self.author, actor=self.reader, verb='liked', target_link='/post/1', is_read=is_read,
+            )
+            Notification.objects.filter(pk=notification.pk).update(timestamp=timezone.now() - timedelta(days=days_old))
+            return notification
+
+        old_read = [notify(True, 120) for _ in range(5)]
+        old_unread, fresh_read = notify(False, 120), notify(True, 1)
+
+        result = NotificationRetention.purge(days=90, batch_size=2)
+        self.assertEqual((result['moved'], result['batches']), (5, 3))
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), {old_unread.pk, fresh_read.pk})
+        self.assertEqual(
+            set(NotificationArchive.objects.values_list('pk', flat=True)), {n.pk for n in old_read}
+        )
+        self.assertEqual(NotificationRetention.purge(days=90)['moved'], 0)
+
+
+class PostForkTests(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.original = self.make_post(description='Long body', code_snippet='print("hi")', language='python')
+        self.client.force_authenticate(self.reader)
+
+    def fork(self, post):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/forum/posts/{post.pk}/fork/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_forks_share_content_until_edited(self):
+        data = self.fork(self.original)
+        self.assertEqual((data['description'], data['code_snippet']), ('Long body', 'print("hi")'))
+        fork_of_fork = self.fork(ForumPost.objects.get(pk=data['id']))
+        self.assertEqual(fork_of_fork['description'], 'Long body')
+
+        # Текст лежит в блобах один раз, колонки форков пустые
+        self.assertEqual(ContentBlob.objects.count(), 2)
+        self.assertEqual(
+            set(ForumPost.objects.filter(forked_from__isnull=False).values_list('description', 'code_snippet')),
+            {('', None)},
+        )
+        self.original.refresh_from_db()
+        self.assertEqual(self.original.forks_count, 1)
+
+        fork = ForumPost.objects.get(pk=data['id'])
+        fork.code_snippet = 'print("bye")'
+        fork.save()
+        fork = ForumPost.objects.get(pk=data['id'])
+        self.assertEqual((fork.description, fork.code_snippet), ('Long body', 'print("bye")'))
+        self.assertIsNone(fork.code_blob_id)
+        self.assertIsNotNone(fork.description_blob_id)
+
+    def test_fork_owner_can_clear_inherited_text(self):
+        data = self.fork(self.original)
+        url = f'/api/forum/posts/{data["id"]}/'
+
+        response = self.client.patch(url, {'code_snippet': ''}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['code_snippet'], '')
+        response = self.client.patch(url, {'description': 'Long body', 'code_snippet': None}, format='json')
+        self.assertIsNone(response.data['code_snippet'])
+
+        fork = ForumPost.objects.get(pk=data['id'])
+        self.assertIsNone(fork.code_blob_id)
+        self.assertIsNone(fork.code_snippet)
+        # Описание сохранили без изменений - оно по-прежнему общее
+        self.assertIsNotNone(fork.description_blob_id)
+        self.assertEqual(fork.description, 'Long body')
+
+    def test_forks_of_missing_post_is_404(self):
+        self.assertEqual(self.client.get('/api/forum/posts/999999/forks/').status_code, 404)
+        self.assertEqual(self.client.get('/api/forum/posts/abc/forks/').status_code, 404)
+
+    def test_forks_listing_and_query_budget(self):
+        for _ in range(3):
+            self.fork(self.original)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/forum/posts/{self.original.pk}/forks/')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertTrue(all(post['description'] == 'Long body' for post in response.data['results']))
+        # Оригинал + страница форков + теги + состояние is_liked/is_saved, тексты приходят JOIN-ом
+        self.assertLessEqual(len(ctx.captured_queries), 4)
+        self.original.refresh_from_db()
+        self.assertEqual(self.original.forks_count, 3)
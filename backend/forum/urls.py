@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ForumPostViewSet, ForumCommentViewSet, NotificationViewSet, SavedForumPostViewSet
+from .views import ForumPostViewSet, ForumCommentViewSet, NotificationViewSet, SavedForumPostViewSet, live_stream
 
 router = DefaultRouter()
 router.register(r'posts', ForumPostViewSet)
@@ -9,6 +9,7 @@ router.register(r'notifications', NotificationViewSet, basename='notification')
 router.register(r'bookmarks', SavedForumPostViewSet, basename='bookmark')
 
 urlpatterns = [
+    path('live/', live_stream, name='forum-live'),
     path('', include(router.urls)),
     path('accounts/', include('allauth.urls')),
 ]
\ No newline at end of file
@@ -1,30 +1,66 @@
-from rest_framework import viewsets, filters, permissions, status
+import asyncio
+from asgiref.sync import sync_to_async
+from rest_framework import viewsets, filters, generics, permissions, status, exceptions
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
 from rest_framework.response import Response
-from django.db.models import Count, Q
-from .models import ForumPost, ForumComment, PostVote, Notification, SavedForumPost
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from .filters import CodeSearchFilter, PostSearchFilter
+from .models import ForumPost, ForumComment, Notification, SavedForumPost
+from .pagination import PostFeedPagination, CommentPagination
 from .serializers import ForumPostSerializer, ForumCommentSerializer, NotificationSerializer, SavedForumPostSerializer
+from .services.comment_tree import CommentTree
+from .services.facets import PostFacets
+from .services.forks import PostForks
+from .services.live_events import LiveEvents, hub
+from .services.feed_cache import TrendingFeedCache
+from .services.trending_index import TrendingIndex
+from .services.unread_counter import UnreadCounter
+from .services.trending_queue import TrendingUpdateQueue
+from .services.tag_filter import TagFilter
+from .services.view_counter import PostViewCounter
+from .services.viewer_state import ViewerState
+from .services.votes import PostVotes
 
 class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        return Notification.objects.filter(recipient=self.request.user).select_related('actor')
 
     @action(detail=True, methods=['post'])
     def read(self, request, pk=None):
         """Пометить уведомление как прочитанное"""
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        # UPDATE только непрочитанной строки: повторный read не уменьшит счетчик дважды
+        if self.get_queryset().filter(pk=notification.pk, is_read=False).update(is_read=True):
+            UnreadCounter.add(request.user.pk, -1)
         return Response({'status': 'marked as read'})
 
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        """Пометить все уведомления прочитанными одним UPDATE"""
+        updated = Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+        UnreadCounter.reset(request.user.pk)
+        return Response({'status': 'marked as read', 'updated': updated})
+
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
-        """Получить количество непрочитанных уведомлений"""
-        count = self.get_queryset().filter(is_read=False).count()
-        return Response({'count': count})
+        """Получить количество непрочитанных уведомлений (из кеша, см. UnreadCounter)"""
+        return Response({'count': UnreadCounter.get(request.user.pk)})
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        UnreadCounter.invalidate(self.request.user.pk)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        if not instance.is_read:
+            UnreadCounter.add(self.request.user.pk, -1)
 
 class ForumPostViewSet(viewsets.ModelViewSet):
     """
@@ -32,17 +68,28 @@ class ForumPostViewSet(viewsets.ModelViewSet):
 
     Query params:
     - search: поиск по title, description, code_snippet
+      (на Postgres - полнотекстовый, с ранжированием и подсветкой в search_headline)
+    - code: поиск фрагмента кода в code_snippet (триграммы, ранжирование по сходству)
     - ordering: сортировка (trending_score, created_at, views)
     - language: фильтр по языку программирования
     - tags: фильтр по тегам (через django-taggit)
+    - tags_mode: all - пост должен иметь все теги (по умолчанию), any - хотя бы один
+    - cursor: курсор страницы (keyset по created_at/trending_score + id)
+    - page: номер страницы, включает классическую постраничную пагинацию
     """
-    queryset = ForumPost.objects.all().order_by('-created_at')
+    # author, общие тексты форков и теги подтягиваются заранее: список выполняет фиксированное число запросов
+    queryset = (
+        ForumPost.objects.select_related('author', 'description_blob', 'code_blob')
+        .prefetch_related('tags')
+        .order_by('-created_at')
+    )
     serializer_class = ForumPostSerializer
+    pagination_class = PostFeedPagination
     # Разрешаем чтение всем, изменение - только авторизованным (пока AllowAny для теста)
     permission_classes = [permissions.AllowAny]
 
     # Включаем поиск и сортировку
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [PostSearchFilter, CodeSearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'description', 'code_snippet']
     ordering_fields = ['created_at', 'views', 'trending_score', 'forks_count']
 
@@ -52,24 +99,86 @@ class ForumPostViewSet(viewsets.ModelViewSet):
         Examples:
         - /api/posts/?language=Python
         - /api/posts/?tags=react,hooks
+        - /api/posts/?tags=react,vue&tags_mode=any
         - /api/posts/?ordering=-trending_score
         """
         queryset = super().get_queryset()
 
         # Фильтр по языку программирования
-        language = self.request.query_params.get('language')
-        if language and language != 'All':
+        language = self.get_language_filter()
+        if language:
             queryset = queryset.filter(language=language)
 
-        # Фильтр по тегам (через django-taggit)
-        tags = self.request.query_params.get('tags')
-        if tags:
-            tag_list = [tag.strip() for tag in tags.split(',')]
-            for tag in tag_list:
-                queryset = queryset.filter(tags__name__in=[tag])
+        # Фильтр по тегам: один подзапрос GROUP BY/HAVING вместо JOIN на каждый тег
+        queryset = TagFilter.apply(queryset, self.get_tag_filter(), self.get_tag_mode())
 
         return queryset
 
+    def get_language_filter(self):
+        language = self.request.query_params.get('language')
+        return language if language and language != 'All' else None
+
+    def get_tag_filter(self):
+        tags = self.request.query_params.get('tags')
+        return TagFilter.normalize(tag.strip() for tag in tags.split(',') if tag.strip()) if tags else []
+
+    def get_tag_mode(self):
+        mode = self.request.query_params.get('tags_mode')
+        return mode if mode in TagFilter.MODES else TagFilter.ALL
+
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        trending = params.get('ordering') == '-trending_score' and not any(
+            params.get(name) for name in ('search', 'code', 'page')
+        )
+
+        if trending:
+            # Трендовая лента без фильтров отдается из кеша (первые N страниц)
+            if TrendingFeedCache.is_cacheable(request):
+                page = TrendingFeedCache.get_page(self.paginator, request)
+                if page is not None:
+                    # Кеш общий для всех, личные is_liked/is_saved накладываем поверх
+                    page = ViewerState.apply(page, ViewerState.get_user(request))
+                    return self.paginator.get_paginated_response(page)
+
+            # Дальше - ZREVRANGE по рейтингу в Redis и выборка постов по pk
+            page = self.paginator.paginate_with(request, ForumPost, 'trending_score', self.fetch_from_trending_index)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.paginator.get_paginated_response(serializer.data)
+
+        return super().list(request, *args, **kwargs)
+
+    def fetch_from_trending_index(self, cursor, page_size):
+        result = TrendingIndex.page(
+            language=self.get_language_filter(),
+            tags=self.get_tag_filter(),
+            tags_mode=self.get_tag_mode(),
+            cursor=cursor,
+            page_size=page_size,
+        )
+        if result is None:
+            return None
+        entries, has_more = result
+        posts = self.queryset.in_bulk([post_id for post_id, _ in entries])
+        page = []
+        for post_id, score in entries:
+            post = posts.get(post_id)
+            if post is not None:
+                # Курсор строим по score из индекса, чтобы следующая страница продолжила ZSET
+                post.trending_score = score
+                page.append(post)
+        return page, has_more
+
+    def retrieve(self, request, *args, **kwargs):
+        post = self.get_object()
+        # Просмотр копится в Redis и попадает в БД пачкой (flush_post_views)
+        PostViewCounter.record(post.pk, PostViewCounter.viewer_key(request))
+        data = self.get_serializer(post).data
+        # Показываем и еще не сброшенные в БД просмотры
+        data['views'] += PostViewCounter.pending(post.pk)
+        return Response(data)
+
     def perform_create(self, serializer):
         # Автоматически проставляем автора, если юзер залогинен
         # Если нет - то пока admin (для теста), в проде убрать!
@@ -78,44 +187,71 @@ class ForumPostViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def vote(self, request, pk=None):
-        """Лайкнуть пост"""
-        post = self.get_object()
-        user = request.user if request.user.is_authenticated else None
-
-        if user:
-            vote, created = PostVote.objects.get_or_create(
-                post=post,
-                user=user,
-                defaults={'vote_type': 'like'}
-            )
-            if not created:
-                vote.delete()
-                return Response({'status': 'unliked', 'likes_count': post.votes.filter(vote_type='like').count()})
-
-        return Response({'status': 'liked', 'likes_count': post.votes.filter(vote_type='like').count()})
+        """Лайкнуть пост / снять лайк (toggle) атомарным запросом, см. PostVotes"""
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise NotFound()
+        if not request.user.is_authenticated:
+            likes_count = ForumPost.objects.filter(pk=pk).values_list('likes_count', flat=True).first()
+            if likes_count is None:
+                raise NotFound()
+            return Response({'status': 'liked', 'likes_count': likes_count})
+
+        result = PostVotes.toggle_like(pk, request.user.pk)
+        if result is None:
+            raise NotFound()
+        liked, likes_count = result
+        return Response({'status': 'liked' if liked else 'unliked', 'likes_count': likes_count})
 
     @action(detail=True, methods=['post'])
     def fork(self, request, pk=None):
-        """Форкнуть пост (создать копию)"""
-        original = self.get_object()
-        user = request.user if request.user.is_authenticated else None
-
-        # Создаем копию поста
-        forked_post = ForumPost.objects.create(
-            author=user,
-            title=f"{original.title} (Fork)",
-            description=original.description,
-            code_snippet=original.code_snippet,
-            language=original.language,
-        )
-
-        # Увеличиваем счетчик форков оригинала
-        original.forks_count += 1
-        original.save(update_fields=['forks_count'])
-
+        """Форкнуть пост: новый пост ссылается на текст оригинала, пока его не отредактируют (PostForks)"""
+        if not request.user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+        forked_post = PostForks.fork(self.get_object(), request.user)
         serializer = self.get_serializer(forked_post)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def forks(self, request, pk=None):
+        """Форки поста, свежие первыми (индекс forked_from, -created_at)"""
+        # generics.get_object_or_404: нечисловой pk - 404, а не ValueError
+        post = generics.get_object_or_404(ForumPost.objects.only('pk'), pk=pk)
+        queryset = self.queryset.filter(forked_from=post).order_by('-created_at')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='comment-tree')
+    def comment_tree(self, request, pk=None):
+        """
+        Обсуждение поста деревом: страница веток верхнего уровня (курсор как у комментариев)
+        и все ответы в них до глубины ?depth= (не больше FORUM_COMMENT_TREE_MAX_DEPTH).
+        """
+        # Без select_related/prefetch основного queryset: нужен только факт существования поста
+        post = generics.get_object_or_404(ForumPost.objects.only('pk'), pk=pk)
+        paginator = CommentPagination()
+        roots = paginator.paginate_queryset(CommentTree.roots(post.pk), request, view=self)
+        depth = CommentTree.clamp_depth(request.query_params.get('depth'))
+        return paginator.get_paginated_response(CommentTree.build([root.pk for root in roots], depth))
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Счетчики для сайдбара: постов на язык и на тег (материализованы в PostFacetCount).
+        ?language= - теги считаются внутри языка.
+        """
+        return Response(PostFacets.get(language=self.get_language_filter()))
+
+    @action(detail=False, methods=['get'], url_path='trending-metrics', permission_classes=[permissions.IsAdminUser])
+    def trending_metrics(self, request):
+        """Метрики очереди пересчета trending score: сколько событий схлопнуто"""
+        metrics = TrendingUpdateQueue.get_metrics()
+        if metrics is None:
+            return Response({'error': 'Trending queue requires Redis cache'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(metrics)
+
     @action(detail=True, methods=['post'])
     def save_post(self, request, pk=None):
         """Добавить/удалить пост из закладок (toggle)"""
@@ -133,8 +269,9 @@ class ForumPostViewSet(viewsets.ModelViewSet):
         return Response({'status': 'saved', 'is_saved': True})
 
 class ForumCommentViewSet(viewsets.ModelViewSet):
-    queryset = ForumComment.objects.all()
+    queryset = ForumComment.objects.select_related('author')
     serializer_class = ForumCommentSerializer
+    pagination_class = CommentPagination
     permission_classes = [permissions.AllowAny]
 
     def get_queryset(self):
@@ -163,7 +300,12 @@ class SavedForumPostViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Возвращает только закладки текущего пользователя"""
-        return SavedForumPost.objects.filter(user=self.request.user).select_related('post', 'post__author')
+        return (
+            SavedForumPost.objects.filter(user=self.request.user)
+            .select_related('post', 'post__author', 'post__description_blob', 'post__code_blob')
+            .prefetch_related('post__tags')
+            .order_by('-created_at')
+        )
 
     def perform_create(self, serializer):
         """Автоматически присваиваем текущего пользователя"""
@@ -180,4 +322,62 @@ class SavedForumPostViewSet(viewsets.ModelViewSet):
         if existing:
             return Response({'error': 'Post already saved', 'id': existing.id}, status=status.HTTP_409_CONFLICT)
 
-        return super().create(request, *args, **kwargs)
\ No newline at end of file
+        return super().create(request, *args, **kwargs)
+
+def _live_user(request):
+    """Аутентификация теми же классами, что и у DRF API (JWT-кука, сессия, токен)"""
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except exceptions.APIException:
+        return None
+    return user if user.is_authenticated else None
+
+
+async def live_stream(request):
+    """
+    GET /api/forum/live/?posts=1,2,3 - живой канал (Server-Sent Events) вместо опроса unread_count.
+
+    События:
+    - unread - число непрочитанных сразу после подключения;
+    - notification - новое или обновленное уведомление (с новым unread);
+    - counters - изменение likes_count/comments_count постов из ?posts=.
+
+    Работает только под ASGI (сервис live в docker-compose): соединение держит
+    корутина, а не поток. Без Redis отвечает 503 - клиент остается на опросе.
+    """
+    user = await sync_to_async(_live_user)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    if hub.redis_url() is None:
+        return JsonResponse({'detail': 'Live updates are unavailable, poll unread_count.'}, status=503)
+
+    max_posts = getattr(settings, 'FORUM_LIVE_MAX_POSTS', 50)
+    post_ids = [pk for pk in request.GET.get('posts', '').split(',') if pk.isdigit()][:max_posts]
+    channels = [LiveEvents.user_channel(user.pk), *(LiveEvents.post_channel(pk) for pk in post_ids)]
+    unread = await sync_to_async(UnreadCounter.get)(user.pk)
+
+    hub.ensure_reader()
+    queue = hub.subscribe(channels)
+    heartbeat = getattr(settings, 'FORUM_LIVE_HEARTBEAT', 25.0)
+
+    async def events():
+        try:
+            # retry - через сколько мс браузер переподключится после обрыва
+            yield f"retry: 3000\n{LiveEvents.frame('unread', {'count': unread})}"
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # Комментарий SSE: не дает прокси закрыть простаивающее соединение
+                    yield ': ping\n\n'
+        finally:
+            hub.unsubscribe(queue, channels)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # GZipMiddleware пропускает ответы с Content-Encoding - иначе сжимал бы каждый кадр отдельно
+    response['Content-Encoding'] = 'identity'
+    # Отключает буферизацию в nginx для этого ответа
+    response['X-Accel-Buffering'] = 'no'
+    return response